@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Модуль низкоуровневой работы с ZIP архивом DOCX документа.
+Позволяет переносить части архива в выходной файл без распаковки и повторного сжатия.
+"""
+
+import copy
+import io
+import mmap
+import os
+import posixpath
+import struct
+import zipfile
+import xml.etree.ElementTree as ET
+
+# Часть с описанием типов содержимого, по стандарту OPC идет первой в архиве
+CONTENT_TYPES_XML = '[Content_Types].xml'
+
+# Основная часть документа с текстом
+MAIN_DOCUMENT_XML = 'word/document.xml'
+
+# Связи пакета верхнего уровня
+ROOT_RELS_XML = '_rels/.rels'
+
+# Типы содержимого частей, в которых хранится текст документа
+TEXT_CONTENT_TYPES = frozenset({
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.template.main+xml',
+    'application/vnd.ms-word.document.macroEnabled.main+xml',
+    'application/vnd.ms-word.template.macroEnabledTemplate.main+xml',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.header+xml',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.footer+xml',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.footnotes+xml',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.endnotes+xml',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.comments+xml',
+})
+
+# Типы связей, ведущих к частям с текстом (последний сегмент URI типа связи)
+TEXT_RELATIONSHIP_TYPES = frozenset({
+    'officeDocument', 'header', 'footer', 'footnotes', 'endnotes', 'comments',
+})
+
+# Пространства имен OPC
+_CONTENT_TYPES_NS = '{http://schemas.openxmlformats.org/package/2006/content-types}'
+_RELATIONSHIPS_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+# Уровень сжатия для переписанных частей (как у zlib по умолчанию)
+DEFAULT_COMPRESSLEVEL = 6
+
+# Размер блока при копировании сжатых данных
+RAW_COPY_BUFFER_SIZE = 1024 * 1024
+
+# Размер файла, начиная с которого архив читается через отображение в память
+# (mmap), если оно включено; меньшие файлы читаются через буферизованное чтение
+MMAP_MIN_SIZE = 32 * 1024 * 1024
+
+# Флаг "размеры и CRC записаны в дескрипторе после данных"
+_FLAG_DATA_DESCRIPTOR = 0x08
+
+# Индексы полей локального заголовка (см. zipfile.structFileHeader)
+_FH_FILENAME_LENGTH = 10
+_FH_EXTRA_FIELD_LENGTH = 11
+
+
+class MappedFile(io.RawIOBase):
+    """
+    Двоичный файл только для чтения поверх отображения файла в память (mmap).
+
+    Чтение берет данные прямо из страничного кэша ОС без системных вызовов read
+    и промежуточного буфера; copy_to переносит данные в другой поток без
+    копирования в объекты bytes. Отображение общее для всех этапов работы
+    с архивом: проверки, поиска частей, чтения и переноса частей.
+    """
+
+    def __init__(self, path):
+        """
+        Отображает файл в память.
+
+        Raises:
+            OSError: Если файл не открывается или не отображается в память
+            ValueError: Если файл пустой
+        """
+        super().__init__()
+        # Отображение не зависит от дескриптора файла, поэтому файл сразу закрывается
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._position = 0
+        self.name = os.fspath(path)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = len(self._map) + offset
+        else:
+            raise ValueError(f"Неверное значение whence: {whence}")
+        if position < 0:
+            raise ValueError(f"Отрицательная позиция в файле: {position}")
+        self._position = position
+        return position
+
+    def read(self, size=-1):
+        end = len(self._map) if size is None or size < 0 else min(self._position + size, len(self._map))
+        data = self._map[self._position:end]
+        self._position = max(self._position, end)
+        return data
+
+    def readall(self):
+        return self.read()
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def copy_to(self, target, size, chunk_size=None):
+        """
+        Записывает в target до size байт с текущей позиции прямо из отображения.
+
+        Args:
+            target (file): Двоичный поток для записи
+            size (int): Сколько байт записать
+            chunk_size (int, optional): Размер одной записи. По умолчанию - RAW_COPY_BUFFER_SIZE.
+
+        Returns:
+            int: Число записанных байт (меньше size, если файл закончился раньше)
+        """
+        chunk_size = chunk_size or RAW_COPY_BUFFER_SIZE
+        end = min(self._position + size, len(self._map))
+        start = self._position
+        with memoryview(self._map) as view:
+            for offset in range(start, end, chunk_size):
+                # Срез memoryview не копирует данные; его нужно освободить до закрытия отображения
+                with view[offset:min(offset + chunk_size, end)] as chunk:
+                    target.write(chunk)
+                self._position = min(offset + chunk_size, end)
+        return max(end - start, 0)
+
+    def close(self):
+        if not self.closed:
+            self._map.close()
+        super().close()
+
+
+def _use_mapping(source, use_mmap):
+    """Решает, читать ли архив через отображение в память."""
+    if not use_mmap or not isinstance(source, (str, os.PathLike)):
+        return False
+    try:
+        return os.path.getsize(source) >= MMAP_MIN_SIZE
+    except OSError:
+        return False
+
+
+class DocxPackage:
+    """
+    Открытый и проверенный DOCX архив.
+
+    Центральный каталог ZIP читается один раз при открытии, члены архива
+    индексируются в словаре по имени. Один и тот же объект используется для
+    проверки структуры, поиска частей с текстом, чтения и перезаписи архива.
+    """
+
+    # Части, без которых документ не считается DOCX
+    REQUIRED_PARTS = (CONTENT_TYPES_XML, MAIN_DOCUMENT_XML)
+
+    def __init__(self, source, name=None, use_mmap=False):
+        """
+        Открывает архив и проверяет его структуру.
+
+        Args:
+            source (str | file): Путь к файлу или двоичный файловый объект с поддержкой seek
+            name (str, optional): Имя документа для сообщений. По умолчанию - путь к файлу.
+            use_mmap (bool, optional): Читать файлы от MMAP_MIN_SIZE байт через отображение
+                                       в память (MappedFile). Если файл обрезают, пока
+                                       архив открыт, чтение отображения завершает процесс
+                                       сигналом SIGBUS, поэтому по умолчанию выключено.
+                                       Для файловых объектов не используется.
+
+        Raises:
+            ValueError: Если файл не является ZIP архивом или в нем нет обязательных частей
+        """
+        self.name = name if name is not None else str(source)
+        self.mapped = None
+        if _use_mapping(source, use_mmap):
+            try:
+                self.mapped = MappedFile(source)
+            except (OSError, ValueError):
+                # Пустой файл или файловая система без поддержки mmap: читаем как обычно
+                self.mapped = None
+        try:
+            self.zip = zipfile.ZipFile(self.mapped if self.mapped is not None else source, 'r')
+        except zipfile.BadZipFile:
+            self._close_mapping()
+            raise ValueError(f"Файл {self.name} не является валидным DOCX файлом")
+        except BaseException:
+            self._close_mapping()
+            raise
+
+        # Члены архива без записей каталогов: в исходном порядке и по имени
+        self.infos = [info for info in self.zip.infolist() if not info.is_dir()]
+        self.members = {info.filename: info for info in self.infos}
+        self._text_parts = None
+
+        for part in self.REQUIRED_PARTS:
+            if part not in self.members:
+                self.close()
+                raise ValueError(f"DOCX файл поврежден или имеет неверную структуру. Отсутствует {part}")
+
+    def __contains__(self, name):
+        return name in self.members
+
+    def read(self, name):
+        """Возвращает распакованное содержимое части архива."""
+        return self.zip.read(self.members[name])
+
+    def ordered_members(self):
+        """
+        Возвращает члены архива в исходном порядке, но с [Content_Types].xml первым.
+
+        Returns:
+            list: Список zipfile.ZipInfo без записей каталогов
+        """
+        members = list(self.infos)
+        members.sort(key=lambda info: info.filename != CONTENT_TYPES_XML)
+        return members
+
+    def text_parts(self):
+        """
+        Находит части архива, содержащие текст документа.
+
+        Части определяются по типам содержимого из [Content_Types].xml и по связям
+        основного документа (колонтитулы, сноски, примечания). Результат
+        запоминается, повторные вызовы архив не читают.
+
+        Returns:
+            list: Имена частей с текстом в порядке их следования в архиве
+        """
+        if self._text_parts is not None:
+            return list(self._text_parts)
+
+        parts = {MAIN_DOCUMENT_XML}
+
+        # 1. Части, объявленные в [Content_Types].xml с текстовым типом содержимого
+        root = self._parse_part(CONTENT_TYPES_XML)
+        defaults = {}
+        for element in root.iter(_CONTENT_TYPES_NS + 'Default'):
+            defaults[element.get('Extension', '').lower()] = element.get('ContentType')
+        overrides = {}
+        for element in root.iter(_CONTENT_TYPES_NS + 'Override'):
+            overrides[element.get('PartName', '').lstrip('/')] = element.get('ContentType')
+        for name in self.members:
+            content_type = overrides.get(name)
+            if content_type is None:
+                content_type = defaults.get(posixpath.splitext(name)[1].lstrip('.').lower())
+            if content_type in TEXT_CONTENT_TYPES:
+                parts.add(name)
+
+        # 2. Части, на которые ссылаются связи пакета и основного документа
+        for main_part in self._related_parts(ROOT_RELS_XML, ''):
+            parts.add(main_part)
+            rels_name = posixpath.join(posixpath.dirname(main_part), '_rels', posixpath.basename(main_part) + '.rels')
+            parts.update(self._related_parts(rels_name, posixpath.dirname(main_part)))
+
+        self._text_parts = [info.filename for info in self.infos if info.filename in parts]
+        return list(self._text_parts)
+
+    def _related_parts(self, rels_name, base_dir):
+        """Возвращает имена частей с текстом, на которые ссылается файл связей."""
+        if rels_name not in self.members:
+            return []
+        related = []
+        for element in self._parse_part(rels_name).iter(_RELATIONSHIPS_NS + 'Relationship'):
+            if element.get('TargetMode') == 'External':
+                continue
+            if element.get('Type', '').rsplit('/', 1)[-1] not in TEXT_RELATIONSHIP_TYPES:
+                continue
+            target = element.get('Target', '')
+            if target.startswith('/'):
+                name = posixpath.normpath(target.lstrip('/'))
+            else:
+                name = posixpath.normpath(posixpath.join(base_dir, target))
+            if name in self.members:
+                related.append(name)
+        return related
+
+    def _parse_part(self, name):
+        """Разбирает XML часть архива, сообщая о повреждении как об ошибке формата."""
+        try:
+            return ET.fromstring(self.read(name))
+        except (KeyError, ET.ParseError) as e:
+            raise ValueError(f"DOCX файл поврежден: не удалось прочитать {name} ({e})")
+
+    def close(self):
+        """Закрывает архив и отображение файла в память."""
+        self.zip.close()
+        self._close_mapping()
+
+    def _close_mapping(self):
+        if self.mapped is not None:
+            self.mapped.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def copy_member_raw(zin, zout, info):
+    """
+    Копирует сжатые байты члена архива без распаковки и повторного сжатия.
+
+    Сохраняются метод и параметры сжатия, дата и атрибуты исходной части.
+
+    Args:
+        zin (zipfile.ZipFile): Исходный архив, открытый на чтение
+        zout (zipfile.ZipFile): Выходной архив, открытый на запись
+        info (zipfile.ZipInfo): Копируемый член исходного архива
+    """
+    if zout.mode != 'w' or zout.fp is None:
+        raise ValueError("Выходной архив должен быть открыт на запись")
+
+    # Пропускаем локальный заголовок исходной части: длины имени и дополнительного
+    # поля в нем могут отличаться от записанных в центральном каталоге
+    source = zin.fp
+    source.seek(info.header_offset)
+    header = source.read(zipfile.sizeFileHeader)
+    if len(header) != zipfile.sizeFileHeader:
+        raise zipfile.BadZipFile(f"Обрезан локальный заголовок части {info.filename}")
+    fields = struct.unpack(zipfile.structFileHeader, header)
+    if fields[0] != zipfile.stringFileHeader:
+        raise zipfile.BadZipFile(f"Неверная сигнатура локального заголовка части {info.filename}")
+    source.seek(fields[_FH_FILENAME_LENGTH] + fields[_FH_EXTRA_FIELD_LENGTH], 1)
+
+    # Размеры и CRC известны из центрального каталога, поэтому пишем их сразу
+    # в локальный заголовок и обходимся без дескриптора данных
+    zinfo = copy.copy(info)
+    zinfo.flag_bits &= ~_FLAG_DATA_DESCRIPTOR
+    zinfo.header_offset = zout.fp.tell()
+    zout.fp.write(zinfo.FileHeader())
+
+    if isinstance(source, MappedFile):
+        # Данные переносятся прямо из отображения исходного файла, без копий в памяти
+        if source.copy_to(zout.fp, info.compress_size) != info.compress_size:
+            raise zipfile.BadZipFile(f"Обрезаны данные части {info.filename}")
+        remaining = 0
+    else:
+        remaining = info.compress_size
+    while remaining > 0:
+        chunk = source.read(min(RAW_COPY_BUFFER_SIZE, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"Обрезаны данные части {info.filename}")
+        zout.fp.write(chunk)
+        remaining -= len(chunk)
+
+    # Регистрируем часть так же, как это делает ZipFile.write, чтобы она попала
+    # в центральный каталог при закрытии архива
+    zout.filelist.append(zinfo)
+    zout.NameToInfo[zinfo.filename] = zinfo
+    zout.start_dir = zout.fp.tell()
+    zout._didModify = True
+
+
+def write_member(zout, info, data, compresslevel=DEFAULT_COMPRESSLEVEL):
+    """
+    Записывает переписанную часть архива со сжатием deflate.
+
+    Args:
+        zout (zipfile.ZipFile): Выходной архив, открытый на запись
+        info (zipfile.ZipInfo): Член исходного архива (берутся имя, дата и атрибуты)
+        data (bytes): Новое содержимое части
+        compresslevel (int): Уровень сжатия deflate от 0 до 9
+    """
+    zout.writestr(_rewritten_info(info), data, compress_type=zipfile.ZIP_DEFLATED, compresslevel=compresslevel)
+
+
+def open_member_writer(zout, info, compresslevel=DEFAULT_COMPRESSLEVEL):
+    """
+    Открывает переписываемую часть архива на потоковую запись со сжатием deflate.
+
+    Args:
+        zout (zipfile.ZipFile): Выходной архив, открытый на запись
+        info (zipfile.ZipInfo): Член исходного архива (берутся имя, дата и атрибуты)
+        compresslevel (int): Уровень сжатия deflate от 0 до 9
+
+    Returns:
+        file: Двоичный поток для записи содержимого части
+    """
+    zinfo = _rewritten_info(info)
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    if hasattr(zinfo, 'compress_level'):
+        zinfo.compress_level = compresslevel
+    else:
+        # До Python 3.13 уровень сжатия хранится в закрытом атрибуте
+        zinfo._compresslevel = compresslevel
+    # Размер результата заранее неизвестен: замена пробела на неразрывный добавляет
+    # байт в UTF-8, поэтому ZIP64 включаем с запасом
+    return zout.open(zinfo, 'w', force_zip64=info.file_size * 2 > zipfile.ZIP64_LIMIT)
+
+
+def _rewritten_info(info):
+    """Создает описание переписанной части с именем, датой и атрибутами исходной."""
+    zinfo = zipfile.ZipInfo(info.filename, info.date_time)
+    zinfo.external_attr = info.external_attr
+    zinfo.create_system = info.create_system
+    return zinfo
@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Модуль пакетной обработки DOCX документов.
+Распределяет файлы по пулу процессов и возвращает результаты по мере готовности.
+"""
+
+import logging
+import os
+import signal
+import sqlite3
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from cache import file_hash
+from logconfig import configure_worker, worker_config
+from logic import ProcessingCancelled, analyze_docx, get_typographer, process_bytes, process_docx
+from metrics import FileMetrics, worker_peak_memory
+
+# Результат обработки одного файла. error - исключение или None при успехе,
+# part_counts - число замен по правилам для каждой части документа,
+# skipped - файл пропущен, так как в кэше есть актуальный результат,
+# metrics - метрики обработки файла (FileMetrics)
+FileResult = namedtuple('FileResult', ['input_file', 'output_file', 'error', 'part_counts', 'skipped', 'metrics'],
+                        defaults=(None, False, None))
+
+# Результат анализа одного файла без его обработки. analysis - DocumentAnalysis
+# или None при ошибке, metrics - метрики анализа (FileMetrics)
+AnalysisResult = namedtuple('AnalysisResult', ['input_file', 'error', 'analysis', 'metrics'], defaults=(None, None))
+
+# Сколько задач держать в очереди пула на каждый рабочий процесс
+TASKS_PER_WORKER = 4
+
+# Набор правил, скомпилированный в рабочем процессе при его запуске
+_worker_typographer = None
+
+# Бюджет памяти на обработку одного файла в рабочем процессе
+_worker_memory_budget = None
+
+# Флаги паузы и остановки задания (JobControl) в рабочем процессе
+_worker_control = None
+
+
+def default_jobs():
+    """Возвращает число рабочих процессов по умолчанию (по числу ядер)."""
+    return os.cpu_count() or 1
+
+
+def _init_worker(prepositions, months, rules=None, memory_budget=None, control=None):
+    """Компилирует правила в рабочем процессе один раз для всех его файлов."""
+    global _worker_typographer, _worker_memory_budget, _worker_control
+    _worker_typographer = get_typographer(prepositions, months, rules)
+    _worker_memory_budget = memory_budget
+    _worker_control = control
+
+
+def _init_pool_worker(log_config, *args):
+    """
+    Инициализирует процесс пула.
+
+    Записи логов передаются в очередь главного процесса. Ctrl+C обрабатывает
+    главный процесс: он останавливает задание.
+    """
+    configure_worker(log_config)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _init_worker(*args)
+
+
+def create_pool(jobs=None, prepositions=None, months=None, rules=None, memory_budget=None, control=None):
+    """
+    Создает пул процессов, в каждом из которых правила скомпилированы при запуске.
+
+    Args:
+        jobs (int, optional): Число рабочих процессов. По умолчанию - число ядер.
+        prepositions (iterable, optional): Список предлогов. По умолчанию используется PREPOSITIONS.
+        months (iterable, optional): Список месяцев. По умолчанию используется MONTHS.
+        rules (dict, optional): Настройки правил (rules.normalize_rules). По умолчанию - из реестра правил.
+        memory_budget (int, optional): Примерный предел памяти на обработку одного файла в байтах
+        control (JobControl, optional): Флаги паузы и остановки задания
+
+    Returns:
+        ProcessPoolExecutor: Пул для задач process_file
+    """
+    return ProcessPoolExecutor(max_workers=jobs or default_jobs(), initializer=_init_pool_worker,
+                               initargs=(worker_config(), prepositions, months, rules, memory_budget, control))
+
+
+def process_file(input_file, output_file, with_hashes=False, hard_link=False, use_mmap=False):
+    """
+    Обрабатывает один файл в рабочем процессе пула create_pool().
+
+    Документ, в котором нечего заменять, сохраняется копией исходного файла
+    (или жесткой ссылкой на него при hard_link) без перепаковки архива.
+    При use_mmap большие файлы читаются через отображение в память.
+
+    Returns:
+        tuple: (число замен по частям, (хэш исходника, хэш результата) или None, метрики файла)
+    """
+    metrics = FileMetrics(input_file, output_file)
+    # Папка результата может повторять вложенную папку исходного дерева
+    output_dir = os.path.dirname(output_file)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    checkpoint = _worker_control.checkpoint if _worker_control is not None else None
+    part_counts = process_docx(input_file, output_file, _worker_typographer, metrics=metrics,
+                               memory_budget=_worker_memory_budget, checkpoint=checkpoint, hard_link=hard_link,
+                               use_mmap=use_mmap)
+    hashes = None
+    if with_hashes:
+        with metrics.stage('hash'):
+            hashes = (file_hash(input_file), file_hash(output_file))
+    metrics.worker_peak_memory = worker_peak_memory()
+    return part_counts, hashes, metrics
+
+
+def analyze_file(input_file, use_mmap=False):
+    """
+    Анализирует один файл в рабочем процессе пула create_pool(), не записывая результат.
+    При use_mmap большие файлы читаются через отображение в память.
+
+    Returns:
+        tuple: (DocumentAnalysis, метрики файла)
+    """
+    metrics = FileMetrics(input_file)
+    checkpoint = _worker_control.checkpoint if _worker_control is not None else None
+    try:
+        analysis = analyze_docx(input_file, _worker_typographer, metrics=metrics, checkpoint=checkpoint,
+                                use_mmap=use_mmap)
+    except ProcessingCancelled:
+        raise
+    except Exception as e:
+        # Как и process_docx при обработке, сообщаем об ошибке в лог
+        logging.error(f"Ошибка при анализе файла {input_file}: {e}")
+        raise
+    metrics.worker_peak_memory = worker_peak_memory()
+    return analysis, metrics
+
+
+def process_document(data):
+    """
+    Обрабатывает DOCX документ из памяти в рабочем процессе пула create_pool().
+
+    Args:
+        data (bytes): Содержимое исходного DOCX файла
+
+    Returns:
+        tuple: (содержимое обработанного DOCX файла, число замен по частям)
+    """
+    return process_bytes(data, _worker_typographer)
+
+
+def process_batch(tasks, prepositions=None, months=None, jobs=None, cache=None, metrics_sink=None,
+                  memory_budget=None, control=None, journal=None, hard_link=False, rules=None, use_mmap=False):
+    """
+    Обрабатывает набор файлов параллельно в пуле процессов.
+
+    Результаты возвращаются по мере завершения файлов, а не в порядке задач.
+    Ошибки обработки (FileNotFoundError, PermissionError, ValueError и прочие)
+    не прерывают пакет, а возвращаются в поле error результата.
+
+    Args:
+        tasks (iterable): Пары (исходный файл, выходной файл). Может быть генератором.
+        prepositions (iterable, optional): Список предлогов. По умолчанию используется PREPOSITIONS.
+        months (iterable, optional): Список месяцев. По умолчанию используется MONTHS.
+        jobs (int, optional): Число рабочих процессов. По умолчанию - число ядер.
+                              При значении 1 файлы обрабатываются в текущем процессе.
+        cache (ProcessingCache, optional): Кэш повторной обработки. Файлы с актуальной
+                                           записью в кэше пропускаются.
+        metrics_sink (MetricsSink, optional): Приемник метрик по каждому обработанному файлу
+        memory_budget (int, optional): Примерный предел памяти на обработку одного файла в байтах.
+                                       Большие части документа обрабатываются потоково.
+        control (JobControl, optional): Флаги паузы и остановки. Во время паузы новые файлы
+                                        не начинаются; после остановки начатые файлы прерываются,
+                                        а оставшиеся задачи не обрабатываются.
+        journal (BatchJournal, optional): Журнал завершенных файлов. Файлы из журнала
+                                          пропускаются, успешно обработанные - записываются в него.
+        hard_link (bool, optional): Файлы, в которых нечего заменять, сохранять жесткой ссылкой
+                                    на исходный файл вместо копии (если файловая система позволяет).
+        rules (dict, optional): Настройки правил (rules.normalize_rules). По умолчанию - из реестра правил.
+        use_mmap (bool, optional): Читать большие исходные файлы через отображение в память.
+                                   Файл, обрезанный во время чтения, завершает рабочий процесс
+                                   сигналом SIGBUS, поэтому включается только явно.
+
+    Yields:
+        FileResult: Результат обработки очередного файла
+    """
+    jobs = jobs or default_jobs()
+    prepositions = set(prepositions) if prepositions is not None else None
+    months = set(months) if months is not None else None
+    typographer = get_typographer(prepositions, months, rules)
+    fingerprint = typographer.fingerprint
+    # Хэши считаются в рабочих процессах: они нужны кэшу и журналу задания
+    with_hashes = cache is not None or journal is not None
+    # Набор правил один на весь пакет, поэтому выводится один раз, а не для каждого файла
+    log_rules(typographer)
+    skipped = 0
+
+    def finished(input_file, output_file, error, outcome):
+        result = collect_result(input_file, output_file, error, outcome, fingerprint, cache, metrics_sink)
+        if journal is not None and error is None:
+            hashes = outcome[1] if outcome is not None else None
+            journal.record(result, hashes[0] if hashes else None)
+        return result
+
+    def fresh_tasks():
+        """Отдает задачи, для которых нет актуального результата в кэше; остальные - как пропущенные."""
+        nonlocal skipped
+        for input_file, output_file in tasks:
+            if journal is not None and journal.is_done(input_file, output_file):
+                yield None, FileResult(input_file, output_file, None, skipped=True)
+            elif cache is not None and cache.is_fresh(input_file, output_file, fingerprint):
+                skipped += 1
+                yield None, FileResult(input_file, output_file, None, skipped=True)
+            else:
+                yield (input_file, output_file), None
+
+    runner = _run_tasks(process_file, fresh_tasks(), jobs, (prepositions, months, rules, memory_budget), control,
+                        with_hashes, hard_link, use_mmap)
+    try:
+        for task, error, outcome in runner:
+            yield outcome if task is None else finished(*task, error, outcome)
+    finally:
+        # Если обработку прервали, пул останавливается сразу, а не при сборке мусора
+        runner.close()
+        if skipped:
+            logging.info(f"Пропущено файлов с актуальным результатом в кэше: {skipped}")
+        if cache is not None:
+            cache.flush()
+
+
+def analyze_batch(files, prepositions=None, months=None, jobs=None, metrics_sink=None, control=None, rules=None,
+                  use_mmap=False):
+    """
+    Анализирует набор файлов параллельно в пуле процессов, ничего не записывая.
+
+    Файлы распределяются по тому же пулу, что и при обработке; результаты
+    возвращаются по мере готовности. Ошибки не прерывают пакет.
+
+    Args:
+        files (iterable): Пути к DOCX файлам. Может быть генератором.
+        prepositions (iterable, optional): Список предлогов. По умолчанию используется PREPOSITIONS.
+        months (iterable, optional): Список месяцев. По умолчанию используется MONTHS.
+        jobs (int, optional): Число рабочих процессов. По умолчанию - число ядер.
+        metrics_sink (MetricsSink, optional): Приемник метрик по каждому файлу
+        control (JobControl, optional): Флаги паузы и остановки
+        rules (dict, optional): Настройки правил (rules.normalize_rules). По умолчанию - из реестра правил.
+        use_mmap (bool, optional): Читать большие файлы через отображение в память
+
+    Yields:
+        AnalysisResult: Результат анализа очередного файла
+    """
+    jobs = jobs or default_jobs()
+    prepositions = set(prepositions) if prepositions is not None else None
+    months = set(months) if months is not None else None
+    log_rules(get_typographer(prepositions, months, rules))
+    queue = (((input_file,), None) for input_file in files)
+
+    runner = _run_tasks(analyze_file, queue, jobs, (prepositions, months, rules, None), control, use_mmap)
+    try:
+        for task, error, outcome in runner:
+            input_file = task[0]
+            if isinstance(error, ProcessingCancelled):
+                yield AnalysisResult(input_file, error)
+            elif error is not None:
+                metrics = FileMetrics(input_file)
+                metrics.error = str(error)
+                if metrics_sink is not None:
+                    metrics_sink.emit(metrics)
+                yield AnalysisResult(input_file, error, metrics=metrics)
+            else:
+                analysis, metrics = outcome
+                if metrics_sink is not None:
+                    metrics_sink.emit(metrics)
+                yield AnalysisResult(input_file, None, analysis, metrics)
+    finally:
+        runner.close()
+
+
+def log_rules(typographer):
+    """Выводит в лог набор правил пакета."""
+    logging.info(f"Правила: {', '.join(typographer.describe()) or 'нет включенных правил'}")
+    if 'preposition' in typographer.rules:
+        logging.info(f"Предлоги: {', '.join(sorted(typographer.prepositions))}")
+    if 'date' in typographer.rules:
+        logging.info(f"Месяцы в датах: {', '.join(sorted(typographer.months))}")
+
+
+def _run_tasks(function, queue, jobs, initargs, control=None, *extra):
+    """
+    Выполняет задачи в пуле процессов create_pool() или, при jobs == 1, в текущем процессе.
+
+    Задачи подаются в пул порциями по мере готовности процессов, поэтому queue
+    может быть генератором, который еще ищет файлы. Если рабочий процесс
+    аварийно завершился (нехватка памяти, сбой в библиотеке), все задачи пула
+    возвращаются с ошибкой BrokenProcessPool, а пул запускается заново для
+    оставшихся задач.
+
+    Args:
+        function (callable): Функция рабочего процесса (process_file, analyze_file)
+        queue (iterable): Пары (аргументы задачи, готовый результат). Если готовый
+                          результат не None, задача не выполняется.
+        jobs (int): Число рабочих процессов
+        initargs (tuple): (предлоги, месяцы, настройки правил, бюджет памяти) для инициализации
+                          рабочих процессов
+        control (JobControl, optional): Флаги паузы и остановки
+        *extra: Дополнительные аргументы function после аргументов задачи
+
+    Yields:
+        tuple: (аргументы задачи, ошибка или None, результат function) для выполненной
+               задачи или (None, None, готовый результат) для пропущенной
+    """
+    if jobs == 1:
+        _init_worker(*initargs, control)
+        for task, result in queue:
+            if result is not None:
+                yield None, None, result
+                continue
+            if control is not None:
+                control.wait()
+                if control.cancelled:
+                    break
+            try:
+                yield task, None, function(*task, *extra)
+            except Exception as e:
+                yield task, e, None
+        return
+
+    logging.info(f"Запуск пула из {jobs} процессов")
+    executor = create_pool(jobs, *initargs, control)
+    pending = {}
+    # Задачи сломанного пула, которые еще не возвращены: пул для них уже перезапущен
+    stale = set()
+    exhausted = False
+    try:
+        while True:
+            # Подаем задачи порциями, чтобы не держать в памяти весь список файлов.
+            # Во время паузы и после остановки новые задачи не подаются.
+            while not exhausted and len(pending) < jobs * TASKS_PER_WORKER \
+                    and (control is None or control.accepting()):
+                try:
+                    task, result = next(queue)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if result is not None:
+                    yield None, None, result
+                    continue
+                try:
+                    future = executor.submit(function, *task, *extra)
+                except BrokenProcessPool:
+                    # Пул сломался, пока мы подавали задачи: задачи в нем вернутся
+                    # с ошибкой при ожидании, а эта задача уйдет в новый пул
+                    stale.update(pending)
+                    executor = _restart_pool(executor, jobs, initargs, control)
+                    future = executor.submit(function, *task, *extra)
+                pending[future] = task
+
+            if not pending:
+                if exhausted or control is None or control.cancelled:
+                    break
+                # Пауза: все начатые файлы завершены, ждем продолжения
+                control.wait()
+                continue
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            broken = False
+            for future in done:
+                task = pending.pop(future)
+                error = future.exception()
+                if isinstance(error, BrokenProcessPool):
+                    broken = broken or future not in stale
+                    error = BrokenProcessPool("Рабочий процесс аварийно завершился (например, из-за нехватки "
+                                              "памяти) во время обработки этого или соседнего файла")
+                    # Ошибки внутри обработки документа выводит logic; об аварии процесса сообщаем здесь
+                    logging.error(f"Файл не обработан: {task[0]}: {error}")
+                stale.discard(future)
+                yield task, error, future.result() if error is None else None
+            if broken:
+                stale.update(pending)
+                executor = _restart_pool(executor, jobs, initargs, control)
+    finally:
+        # Если обработку прервали, не запускаем оставшиеся задачи
+        for future in pending:
+            future.cancel()
+        executor.shutdown()
+
+
+def _restart_pool(executor, jobs, initargs, control):
+    """
+    Заменяет сломанный пул новым.
+
+    Задачи старого пула завершены с ошибкой BrokenProcessPool; еще не возвращенные
+    из них возвращаются при следующем ожидании.
+    """
+    logging.warning("Рабочий процесс пула аварийно завершился, пул запускается заново")
+    executor.shutdown(wait=False)
+    return create_pool(jobs, *initargs, control)
+
+
+def collect_result(input_file, output_file, error, outcome, fingerprint=None, cache=None, metrics_sink=None):
+    """
+    Формирует результат обработки файла, передает метрики и запоминает успех в кэше.
+
+    Args:
+        input_file (str): Исходный файл
+        output_file (str): Выходной файл
+        error (Exception): Ошибка обработки или None
+        outcome (tuple): Результат process_file или None при ошибке
+        fingerprint (str, optional): Отпечаток набора правил для записи в кэш
+        cache (ProcessingCache, optional): Кэш повторной обработки
+        metrics_sink (MetricsSink, optional): Приемник метрик
+
+    Returns:
+        FileResult: Результат обработки файла
+    """
+    if isinstance(error, ProcessingCancelled):
+        # Прерванный остановкой файл - не ошибка: метрики и кэш не нужны
+        return FileResult(input_file, output_file, error)
+    if error is not None:
+        metrics = FileMetrics(input_file, output_file)
+        metrics.error = str(error)
+        if metrics_sink is not None:
+            metrics_sink.emit(metrics)
+        return FileResult(input_file, output_file, error, metrics=metrics)
+    part_counts, hashes, metrics = outcome
+    if metrics_sink is not None:
+        metrics_sink.emit(metrics)
+    if cache is not None and hashes is not None:
+        try:
+            cache.record(input_file, output_file, fingerprint, *hashes)
+        except (OSError, sqlite3.Error) as e:
+            # Без записи в кэше файл просто будет обработан заново при следующем запуске
+            logging.warning(f"Не удалось записать в кэш результат для {input_file}: {e}")
+    return FileResult(input_file, output_file, None, part_counts, metrics=metrics)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк сопоставления предлогов: плоская альтернатива из набора слов
+в сравнении с префиксным деревом (build_word_pattern) на 30, 300 и 3000 словах.
+
+Запуск:
+    python benchmarks/bench_matcher.py
+"""
+
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.docx_factory import build_document_xml
+from logic import PREPOSITIONS
+from rules import build_word_pattern
+
+# Буквы для генерации дополнительных слов
+ALPHABET = 'абвгдеёжзийклмнопрстуфхцчшщъыьэюя'
+
+
+def make_word_list(size, seed=0):
+    """Возвращает набор из size слов: стандартные предлоги и случайные короткие слова."""
+    rng = random.Random(seed)
+    words = set(PREPOSITIONS)
+    while len(words) < size:
+        length = rng.randint(2, 8)
+        word = ''.join(rng.choice(ALPHABET) for _ in range(length))
+        # Часть слов делаем составными, как "из-за"
+        if rng.random() < 0.1:
+            word += '-' + ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(2, 4)))
+        words.add(word)
+    return words
+
+
+def measure(pattern, text, repeat=5):
+    """Возвращает лучшее время замены в секундах и число совпадений."""
+    best = None
+    count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        _, count = pattern.subn('\\1\u00a0', text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, count
+
+
+def main():
+    text = build_document_xml(2 * 1024 * 1024).decode('utf-8')
+    size_mb = len(text.encode('utf-8')) / 1024 / 1024
+
+    print(f"Текст: {size_mb:.1f} МБ")
+    print(f"{'Слов':>6}{'Альтернатива, с':>18}{'Дерево, с':>12}{'Совпадений':>13}")
+    for size in (30, 300, 3000):
+        words = make_word_list(size)
+        flat = re.compile(r'\b(' + '|'.join(map(re.escape, words)) + r')\s')
+        trie = re.compile(r'\b(' + build_word_pattern(words) + r')\s')
+
+        flat_time, flat_count = measure(flat, text)
+        trie_time, trie_count = measure(trie, text)
+        if flat_count != trie_count:
+            raise AssertionError(f"Разное число совпадений: {flat_count} и {trie_count}")
+
+        print(f"{size:>6}{flat_time:>18.3f}{trie_time:>12.3f}{trie_count:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк чтения исходного архива через отображение в память (mmap)
+в сравнении с обычным буферизованным чтением файла.
+
+Для больших документов с медиа замеряет открытие и проверку архива, анализ
+и обработку (медиана по повторам) и пиковый объем памяти, выделенной Python
+(tracemalloc). Файлы читаются из страничного кэша ОС: первый прогон каждого
+документа прогревает кэш и не учитывается.
+
+Запуск:
+    python benchmarks/bench_mmap.py
+    python benchmarks/bench_mmap.py --media 100 400 --repeat 5 --output mmap.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archive import DocxPackage
+from benchmarks.docx_factory import build_docx
+from logic import analyze_docx, get_typographer, process_docx
+
+# Размер document.xml в документах бенчмарка
+DOCUMENT_SIZE = 4 * 1024 * 1024
+
+
+def build_large_docx(path, media_size):
+    """
+    Создает документ с медиа: половина медиа сжата deflate, половина хранится без сжатия.
+
+    Returns:
+        str: Путь к созданному файлу
+    """
+    build_docx(path, DOCUMENT_SIZE, media_size // 2, density=0.5)
+    with zipfile.ZipFile(path, 'a') as docx:
+        docx.writestr('word/media/image2.png', os.urandom(media_size - media_size // 2),
+                      compress_type=zipfile.ZIP_STORED)
+    return path
+
+
+def open_package(source, use_mmap):
+    """Открывает архив, проверяет структуру и находит части с текстом."""
+    with DocxPackage(source, use_mmap=use_mmap) as package:
+        package.text_parts()
+
+
+def scenarios(source, output, typographer):
+    """Возвращает замеряемые сценарии: {имя: функция(use_mmap)}."""
+    return {
+        'open': lambda use_mmap: open_package(source, use_mmap),
+        'analyze': lambda use_mmap: analyze_docx(source, typographer, use_mmap=use_mmap),
+        'process': lambda use_mmap: process_docx(source, output, typographer, use_mmap=use_mmap),
+    }
+
+
+def measure(func, repeat):
+    """
+    Замеряет функцию.
+
+    Returns:
+        dict: Медиана времени в мс и пик памяти Python в МБ (отдельный прогон под tracemalloc)
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'time_ms': round(statistics.median(times) * 1000, 2),
+        'peak_mb': round(peak / 1024 / 1024, 2),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Бенчмарк чтения архива через mmap")
+    parser.add_argument("--media", type=int, nargs="+", default=[100, 300], metavar="МБ",
+                        help="размеры медиа в документах, МБ")
+    parser.add_argument("--repeat", type=int, default=3, help="число повторов, берется медиана")
+    parser.add_argument("--output", help="файл для результатов в JSON")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.disable(logging.CRITICAL)
+    typographer = get_typographer()
+    work_dir = tempfile.mkdtemp()
+    results = []
+    try:
+        print(f"{'Документ':<14}{'Сценарий':<10}{'read, мс':>10}{'mmap, мс':>10}{'Ускорение':>11}"
+              f"{'read, МБ':>10}{'mmap, МБ':>10}")
+        for media_mb in args.media:
+            source = build_large_docx(os.path.join(work_dir, 'source.docx'), media_mb * 1024 * 1024)
+            output = os.path.join(work_dir, 'output.docx')
+            title = f"медиа {media_mb} МБ"
+            for name, func in scenarios(source, output, typographer).items():
+                # Прогрев страничного кэша и проверка, что оба пути дают одинаковый результат
+                func(False)
+                reference = open(output, 'rb').read() if name == 'process' else None
+                func(True)
+                if reference is not None and open(output, 'rb').read() != reference:
+                    raise RuntimeError("Результаты обработки через mmap и через чтение файла различаются")
+
+                buffered = measure(lambda: func(False), args.repeat)
+                mapped = measure(lambda: func(True), args.repeat)
+                speedup = buffered['time_ms'] / mapped['time_ms'] if mapped['time_ms'] else float('inf')
+                print(f"{title:<14}{name:<10}{buffered['time_ms']:>10.1f}{mapped['time_ms']:>10.1f}"
+                      f"{speedup:>10.2f}x{buffered['peak_mb']:>10.1f}{mapped['peak_mb']:>10.1f}")
+                results.append({'media_mb': media_mb, 'scenario': name, 'read': buffered, 'mmap': mapped})
+            os.remove(source)
+    finally:
+        shutil.rmtree(work_dir)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
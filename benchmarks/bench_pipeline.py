@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Воспроизводимый бенчмарк конвейера обработки DOCX.
+
+Создает синтетический набор документов (10 КБ, 1 МБ и 50 МБ document.xml, с
+изображением и без, с разной долей предлогов), замеряет время каждого этапа
+(проверка, распаковка, чтение, проход по предлогам, проход по датам, запись,
+упаковка) и сквозную пропускную способность, и сохраняет результаты в JSON.
+
+Запуск:
+    python benchmarks/bench_pipeline.py --sizes small medium --output results.json
+    python benchmarks/bench_pipeline.py --compare old_results.json
+"""
+
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archive import DocxPackage, copy_member_raw, write_member
+from benchmarks.docx_factory import CORPUS_DOCUMENT_SIZES, build_corpus, corpus_specs
+from logic import MONTHS, PREPOSITIONS, RULE_NAMES, Typographer, __version__, process_docx, process_xml
+
+# Этапы конвейера в порядке выполнения
+STAGES = ('validate', 'unzip', 'read', 'prepositions', 'dates', 'rules', 'write', 'zip')
+
+
+class StageTimer:
+    """Накапливает лучшее время по каждому этапу за несколько повторов."""
+
+    def __init__(self):
+        self.best = {}
+        self._current = {}
+
+    def start_run(self):
+        self._current = dict.fromkeys(STAGES, 0.0)
+
+    def add(self, stage, seconds):
+        self._current[stage] += seconds
+
+    def finish_run(self):
+        for stage, seconds in self._current.items():
+            self.best[stage] = min(self.best.get(stage, seconds), seconds)
+
+
+def timed(timer, stage, func, *args):
+    """Вызывает функцию и записывает ее время в этап."""
+    start = time.perf_counter()
+    result = func(*args)
+    timer.add(stage, time.perf_counter() - start)
+    return result
+
+
+def run_stages(path, timer, typographer, prepositions_only, dates_only):
+    """Проходит конвейер обработки по этапам, замеряя каждый из них."""
+    package = timed(timer, 'validate', DocxPackage, path)
+    with package:
+        text_parts = timed(timer, 'validate', package.text_parts)
+        processed = {}
+        for name in text_parts:
+            data = timed(timer, 'unzip', package.read, name)
+            content = timed(timer, 'read', data.decode, 'utf-8')
+            # Отдельные проходы показывают стоимость каждого правила
+            timed(timer, 'prepositions', process_xml, content, prepositions_only)
+            timed(timer, 'dates', process_xml, content, dates_only)
+            # Этот проход выполняется при реальной обработке
+            processed[name] = timed(timer, 'rules', process_xml, content, typographer)[0]
+
+        destination = io.BytesIO()
+        zout = zipfile.ZipFile(destination, 'w')
+        for info in package.ordered_members():
+            if info.filename in processed:
+                content = processed[info.filename]
+                timed(timer, 'write', lambda: write_member(zout, info, content.encode('utf-8')))
+            else:
+                timed(timer, 'zip', copy_member_raw, package.zip, zout, info)
+        timed(timer, 'zip', zout.close)
+
+
+def only_rule(name):
+    """Настройки правил, в которых включено только правило name."""
+    return {rule: {'enabled': rule == name} for rule in RULE_NAMES}
+
+
+def bench_case(spec, path, work_dir, repeat):
+    """Замеряет этапы и сквозное время обработки одного документа."""
+    typographer = Typographer(PREPOSITIONS, MONTHS)
+    prepositions_only = Typographer(PREPOSITIONS, (), only_rule('preposition'))
+    dates_only = Typographer((), MONTHS, only_rule('date'))
+
+    timer = StageTimer()
+    for _ in range(repeat):
+        timer.start_run()
+        run_stages(path, timer, typographer, prepositions_only, dates_only)
+        timer.finish_run()
+
+    output = os.path.join(work_dir, 'output.docx')
+    best_total = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process_docx(path, output, typographer)
+        elapsed = time.perf_counter() - start
+        best_total = elapsed if best_total is None else min(best_total, elapsed)
+
+    input_size = os.path.getsize(path)
+    # Пропускная способность считается по распакованному объему документа
+    with zipfile.ZipFile(path) as docx:
+        uncompressed_size = sum(info.file_size for info in docx.infolist())
+    return {
+        'name': spec['name'],
+        'document_size': spec['document_size'],
+        'media_size': spec['media_size'],
+        'density': spec['density'],
+        'input_size': input_size,
+        'uncompressed_size': uncompressed_size,
+        'output_size': os.path.getsize(output),
+        'stages': {stage: round(timer.best[stage], 6) for stage in STAGES},
+        'total': round(best_total, 6),
+        'mb_per_s': round(uncompressed_size / 1024 / 1024 / best_total, 3),
+        'files_per_s': round(1 / best_total, 3),
+    }
+
+
+def print_case(case, previous=None):
+    """Выводит результаты по документу и, если есть, изменение относительно прошлого запуска."""
+    line = (f"{case['name']:<22}{case['total']:>10.4f}{case['mb_per_s']:>10.1f}{case['files_per_s']:>10.1f}  "
+            + ' '.join(f"{stage}={case['stages'][stage]:.4f}" for stage in STAGES))
+    if previous is not None:
+        change = (case['total'] - previous['total']) / previous['total'] * 100
+        line += f"  ({change:+.1f}% к прошлому)"
+    print(line)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Бенчмарк конвейера обработки DOCX")
+    parser.add_argument("--sizes", nargs="+", choices=sorted(CORPUS_DOCUMENT_SIZES), default=['small', 'medium'],
+                        help="размеры document.xml (large - 50 МБ, по умолчанию не включен)")
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), 'docx_bench_corpus'),
+                        help="папка для синтетических документов (переиспользуется между запусками)")
+    parser.add_argument("--repeat", type=int, default=3, help="число повторов, берется лучшее время")
+    parser.add_argument("--output", default="benchmark_results.json", help="файл для результатов в JSON")
+    parser.add_argument("--compare", help="JSON с результатами прошлого запуска для сравнения")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.disable(logging.CRITICAL)
+
+    previous = {}
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            previous = {case['name']: case for case in json.load(f)['cases']}
+
+    corpus = build_corpus(args.corpus_dir, corpus_specs(args.sizes))
+    cases = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        print(f"{'Документ':<22}{'Время, с':>10}{'МБ/с':>10}{'Файл/с':>10}  Этапы, с")
+        for spec, path in corpus:
+            case = bench_case(spec, path, work_dir, args.repeat)
+            print_case(case, previous.get(case['name']))
+            cases.append(case)
+
+    results = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'version': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'cases': cases,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
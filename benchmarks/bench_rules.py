@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк набора типографских правил: все включенные правила за один проход
+по XML части в сравнении с отдельным проходом на каждое правило (так выглядела
+бы обработка, если бы каждое правило было отдельной заменой).
+
+Запуск:
+    python benchmarks/bench_rules.py --size 8
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.docx_factory import DOCUMENT_FOOTER, DOCUMENT_HEADER
+from logic import MONTHS, PREPOSITIONS, RULE_NAMES, Typographer, process_xml
+
+# Абзац, в котором срабатывает каждое правило
+SAMPLE = (
+    "Договор заключен в Москве 26 января 1994 г. между сторонами. "
+    "Подписали А. С. Иванов и П.П. Петров, приложение № 5 к § 12. "
+    "Масса груза 120 кг, скидка 15 %, стоимость 300 руб. за 2 шт. "
+    "Москва - столица, а срок - до конца года. "
+)
+
+
+def measure(func, repeat):
+    """Возвращает лучшее время выполнения функции в секундах и ее результат."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def build_xml(size):
+    """Строит document.xml примерно из size байт, абзацы разбиты на несколько run-ов."""
+    sentences = [sentence + '. ' for sentence in SAMPLE.split('. ') if sentence]
+    paragraph = '<w:p>' + ''.join(f'<w:r><w:t xml:space="preserve">{sentence}</w:t></w:r>'
+                                  for sentence in sentences) + '</w:p>'
+    return DOCUMENT_HEADER + paragraph * (size // len(paragraph.encode('utf-8')) + 1) + DOCUMENT_FOOTER
+
+
+def sequential(typographers, xml):
+    """Применяет правила по одному, каждое - отдельным проходом по XML."""
+    counts = {}
+    for typographer in typographers:
+        xml, rule_counts = process_xml(xml, typographer)
+        for rule, count in rule_counts.items():
+            counts[rule] = counts.get(rule, 0) + count
+    return xml, counts
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Бенчмарк набора типографских правил")
+    parser.add_argument("--size", type=int, default=4, help="размер document.xml в мегабайтах")
+    parser.add_argument("--repeat", type=int, default=3, help="число повторов, берется лучшее время")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    xml = build_xml(args.size * 1024 * 1024)
+    enabled = {rule: {'enabled': True} for rule in RULE_NAMES}
+
+    combined = Typographer(PREPOSITIONS, MONTHS, enabled)
+    separate = [Typographer(PREPOSITIONS, MONTHS, {rule: {'enabled': rule == name} for rule in RULE_NAMES})
+                for name in RULE_NAMES]
+
+    combined_time, (combined_xml, counts) = measure(lambda: process_xml(xml, combined), args.repeat)
+    separate_time, (separate_xml, _) = measure(lambda: sequential(separate, xml), args.repeat)
+
+    print(f"document.xml: {len(xml.encode('utf-8')) / 1024 / 1024:.1f} МБ, правил: {len(combined.rules)}")
+    print(f"Один проход:         {combined_time:.3f} с")
+    print(f"Проход на правило:   {separate_time:.3f} с ({separate_time / combined_time:.1f}x)")
+    print(f"Результаты совпадают: {'да' if combined_xml == separate_xml else 'нет'}")
+    print("Замен по правилам:")
+    for rule, count in counts.items():
+        print(f"  {rule:<14}{count:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Нагрузочный тест HTTP сервиса обработки (server.py).
+
+Отправляет синтетические документы с нескольких клиентских потоков и выводит
+число запросов в секунду, перцентили времени ответа и число отказов 429.
+Без --url сервис запускается в этом же процессе на свободном порту.
+
+Запуск:
+    python benchmarks/bench_server.py --requests 500 --concurrency 16
+    python benchmarks/bench_server.py --url http://127.0.0.1:8765 --document-size 1048576
+"""
+
+import argparse
+import http.client
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch import TASKS_PER_WORKER, default_jobs
+from benchmarks.docx_factory import build_docx
+from metrics import percentile
+from server import DOCX_CONTENT_TYPE, ProcessingServer, start_pool
+
+
+def run_load(url, payload, requests, concurrency):
+    """
+    Отправляет запросы на сервис и замеряет время ответа.
+
+    Args:
+        url (str): Адрес сервиса, например http://127.0.0.1:8765
+        payload (bytes): Отправляемый DOCX документ
+        requests (int): Общее число запросов
+        concurrency (int): Число клиентских потоков
+
+    Returns:
+        tuple: (время теста в секундах, Counter статусов ответов, список времени успешных ответов)
+    """
+    parts = urlsplit(url)
+    local = threading.local()
+    statuses = Counter()
+    latencies = []
+    lock = threading.Lock()
+
+    def send(_):
+        # У каждого потока свое постоянное соединение
+        connection = getattr(local, 'connection', None)
+        if connection is None:
+            connection = local.connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+        start = time.perf_counter()
+        try:
+            connection.request('POST', '/process', payload, {'Content-Type': DOCX_CONTENT_TYPE})
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+            if response.getheader('Connection', '').lower() == 'close':
+                connection.close()
+                local.connection = None
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            local.connection = None
+            status = 'error'
+        elapsed = time.perf_counter() - start
+        with lock:
+            statuses[status] += 1
+            if status == 200:
+                latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, range(requests)))
+    return time.perf_counter() - start, statuses, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест HTTP сервиса обработки DOCX")
+    parser.add_argument("--url", help="адрес запущенного сервиса; по умолчанию сервис запускается здесь же")
+    parser.add_argument("--requests", type=int, default=200, help="общее число запросов")
+    parser.add_argument("--concurrency", type=int, default=8, help="число клиентских потоков")
+    parser.add_argument("--document-size", type=int, default=64 * 1024, help="размер document.xml в байтах")
+    parser.add_argument("--jobs", type=int, default=default_jobs(), help="число процессов встроенного сервиса")
+    parser.add_argument("--max-pending", type=int, help="лимит одновременных документов встроенного сервиса")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'load.docx')
+        build_docx(path, args.document_size)
+        with open(path, 'rb') as f:
+            payload = f.read()
+
+    server = pool = None
+    url = args.url
+    if url is None:
+        pool = start_pool(args.jobs)
+        server = ProcessingServer(('127.0.0.1', 0), pool, args.max_pending or args.jobs * TASKS_PER_WORKER,
+                                  len(payload) * 2)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}"
+
+    try:
+        print(f"Сервис: {url}, документ: {len(payload)} байт, запросов: {args.requests}, "
+              f"клиентов: {args.concurrency}")
+        elapsed, statuses, latencies = run_load(url, payload, args.requests, args.concurrency)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+            pool.shutdown()
+
+    ok = statuses.get(200, 0)
+    print(f"Время: {elapsed:.2f} с")
+    print(f"Успешных запросов в секунду: {ok / elapsed:.1f}")
+    print(f"Ответы: {dict(statuses)}")
+    if latencies:
+        print(f"Время ответа: p50 {percentile(latencies, 0.5) * 1000:.1f} мс, "
+              f"p95 {percentile(latencies, 0.95) * 1000:.1f} мс, max {max(latencies) * 1000:.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк времени холодного запуска.
+
+Для каждого сценария запускает отдельный интерпретатор с -X importtime и
+замеряет общее время запуска и время импорта модулей (медиана по повторам).
+Выводит модули, дольше всего импортирующиеся сами по себе, и сохраняет
+результаты в JSON для сравнения между версиями.
+
+Сценарии:
+    core   - ядро обработки (logic)
+    worker - рабочий процесс пула при запуске методом spawn: повторный импорт
+             main.py, модуль batch и компиляция правил
+    cli    - консольный интерфейс
+    gui    - графический интерфейс (нужен ttkbootstrap)
+
+Запуск:
+    python benchmarks/bench_startup.py --repeat 20 --output startup.json
+    python benchmarks/bench_startup.py --compare startup.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Код каждого сценария; baseline - пустой интерпретатор, его время вычитается
+SCENARIOS = {
+    'baseline': "pass",
+    'core': "import logic",
+    'worker': "import main, batch; batch._init_worker(None, None)",
+    'cli': "import cli",
+    'gui': "import main, ui",
+}
+
+
+def parse_importtime(stderr):
+    """
+    Разбирает вывод -X importtime.
+
+    Returns:
+        tuple: (суммарное время импорта модулей верхнего уровня в мкс,
+                словарь {модуль: собственное время импорта в мкс})
+    """
+    total = 0
+    self_times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        module = name.strip()
+        self_times[module] = self_times.get(module, 0) + int(self_us)
+        # Модуль верхнего уровня записан без отступа после разделителя
+        if not name[1:].startswith(' '):
+            total += int(cumulative_us)
+    return total, self_times
+
+
+def run_scenario(code, repeat):
+    """
+    Запускает сценарий repeat раз в новых процессах.
+
+    Returns:
+        dict: Медианы общего времени запуска и времени импорта в мс и собственное
+              время импорта модулей из запуска с медианным временем, или None,
+              если сценарий не запускается (например, нет зависимостей)
+    """
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT,
+                                   capture_output=True, text=True)
+        wall = time.perf_counter() - start
+        if completed.returncode != 0:
+            error = completed.stderr.strip().splitlines()
+            return {'error': error[-1] if error else f"код завершения {completed.returncode}"}
+        imports, self_times = parse_importtime(completed.stderr)
+        runs.append((wall, imports, self_times))
+
+    runs.sort(key=lambda run: run[0])
+    median_run = runs[len(runs) // 2]
+    return {
+        'wall_ms': round(statistics.median(run[0] for run in runs) * 1000, 2),
+        'imports_ms': round(statistics.median(run[1] for run in runs) / 1000, 2),
+        'modules': median_run[2],
+    }
+
+
+def print_scenario(name, result, baseline, top, previous=None):
+    """Выводит результаты сценария и, если есть, изменение относительно прошлого запуска."""
+    if 'error' in result:
+        print(f"{name:<10} недоступен: {result['error']}")
+        return
+    line = f"{name:<10}{result['wall_ms']:>10.1f}{result['imports_ms']:>12.1f}"
+    if baseline is not None and name != 'baseline':
+        line += f"{result['wall_ms'] - baseline['wall_ms']:>12.1f}"
+    if previous is not None and 'wall_ms' in previous:
+        change = (result['wall_ms'] - previous['wall_ms']) / previous['wall_ms'] * 100
+        line += f"  ({change:+.1f}% к прошлому)"
+    print(line)
+    if name == 'baseline' or top <= 0:
+        return
+    modules = sorted(result['modules'].items(), key=lambda item: item[1], reverse=True)[:top]
+    print('          ' + ', '.join(f"{module} {microseconds / 1000:.1f}" for module, microseconds in modules))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Бенчмарк времени холодного запуска")
+    parser.add_argument("--scenarios", nargs="+", choices=[name for name in SCENARIOS if name != 'baseline'],
+                        default=[name for name in SCENARIOS if name != 'baseline'], help="сценарии запуска")
+    parser.add_argument("--repeat", type=int, default=10, help="число запусков каждого сценария, берется медиана")
+    parser.add_argument("--top", type=int, default=8, help="сколько самых долгих модулей выводить")
+    parser.add_argument("--output", default="startup_results.json", help="файл для результатов в JSON")
+    parser.add_argument("--compare", help="JSON с результатами прошлого запуска для сравнения")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    previous = {}
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            previous = json.load(f)['scenarios']
+
+    print(f"{'Сценарий':<10}{'Запуск, мс':>10}{'Импорт, мс':>12}{'Без базы':>12}")
+    print("          (самые долгие модули, собственное время импорта в мс)")
+    results = {}
+    baseline = None
+    for name in ['baseline'] + args.scenarios:
+        result = run_scenario(SCENARIOS[name], args.repeat)
+        if name == 'baseline':
+            baseline = result
+        print_scenario(name, result, baseline, args.top, previous.get(name))
+        results[name] = result
+
+    output = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'repeat': args.repeat,
+        'scenarios': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Бенчмарк потоковой перезаписи DOCX в сравнении с прежней схемой
+"распаковка во временную директорию -> обработка -> упаковка".
+
+Запуск:
+    python benchmarks/bench_streaming.py
+"""
+
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.docx_factory import build_docx
+from logic import fix_hanging_prepositions_and_dates, _process_part, get_typographer
+
+
+def legacy_process(input_file, output_file):
+    """
+    Повторяет прежний алгоритм через временную директорию.
+
+    Returns:
+        int: Количество байт, записанных на диск во временную директорию
+    """
+    temp_dir = tempfile.mkdtemp()
+    try:
+        with zipfile.ZipFile(input_file, 'r') as zip_ref:
+            zip_ref.extractall(temp_dir)
+
+        document_xml_path = os.path.join(temp_dir, 'word', 'document.xml')
+        with open(document_xml_path, 'rb') as file:
+            content, _ = _process_part('word/document.xml', file.read(), get_typographer())
+        with open(document_xml_path, 'wb') as file:
+            file.write(content)
+
+        temp_bytes = 0
+        with zipfile.ZipFile(output_file, 'w') as outzip:
+            for root, _, files in os.walk(temp_dir):
+                for file in files:
+                    file_path = os.path.join(root, file)
+                    temp_bytes += os.path.getsize(file_path)
+                    outzip.write(file_path, os.path.relpath(file_path, temp_dir))
+        return temp_bytes
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+def measure(func, repeat=3):
+    """Возвращает лучшее время выполнения функции в секундах и ее результат."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    logging.disable(logging.CRITICAL)
+    work_dir = tempfile.mkdtemp()
+    try:
+        cases = [
+            ("без медиа", 0),
+            ("медиа 20 МБ", 20 * 1024 * 1024),
+            ("медиа 100 МБ", 100 * 1024 * 1024),
+        ]
+        print(f"{'Документ':<16}{'Старый, с':>12}{'Потоковый, с':>15}{'Временные файлы, МБ':>22}"
+              f"{'Старый размер, МБ':>20}{'Новый размер, МБ':>19}")
+        for title, media_size in cases:
+            source = build_docx(os.path.join(work_dir, 'source.docx'), 1024 * 1024, media_size)
+            legacy_out = os.path.join(work_dir, 'legacy.docx')
+            stream_out = os.path.join(work_dir, 'stream.docx')
+
+            legacy_time, temp_bytes = measure(lambda: legacy_process(source, legacy_out))
+            stream_time, _ = measure(lambda: fix_hanging_prepositions_and_dates(source, stream_out))
+
+            legacy_size = os.path.getsize(legacy_out) / 1024 / 1024
+            stream_size = os.path.getsize(stream_out) / 1024 / 1024
+            print(f"{title:<16}{legacy_time:>12.3f}{stream_time:>15.3f}{temp_bytes / 1024 / 1024:>22.1f}"
+                  f"{legacy_size:>20.2f}{stream_size:>19.2f}")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Генератор синтетических DOCX документов для бенчмарков.
+Создает минимально валидные DOCX архивы с заданным объемом текста и медиа.
+"""
+
+import os
+import zipfile
+
+CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Default Extension="png" ContentType="image/png"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+
+ROOT_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+DOCUMENT_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+)
+DOCUMENT_FOOTER = '</w:body></w:document>'
+
+# Абзац с предлогами и датой
+PARAGRAPH_WITH_MATCHES = (
+    '<w:p><w:r><w:t xml:space="preserve">Договор заключен в Москве 26 января 1994 года '
+    'между сторонами и вступает в силу со дня подписания без оговорок.</w:t></w:r></w:p>'
+)
+
+# Абзац без предлогов и дат
+PARAGRAPH_WITHOUT_MATCHES = (
+    '<w:p><w:r><w:t xml:space="preserve">Quarterly revenue: 1234.56; margin: 78.9; '
+    'total assets: 456789.01; headcount: 321.</w:t></w:r></w:p>'
+)
+
+
+def build_document_xml(target_size, density=1.0):
+    """
+    Строит содержимое document.xml заданного размера.
+
+    Args:
+        target_size (int): Примерный размер document.xml в байтах
+        density (float): Доля абзацев, содержащих предлоги и даты (от 0.0 до 1.0)
+
+    Returns:
+        bytes: Содержимое document.xml
+    """
+    paragraphs = []
+    size = len(DOCUMENT_HEADER.encode('utf-8')) + len(DOCUMENT_FOOTER)
+    accumulated = 0.0
+    while size < target_size:
+        accumulated += density
+        if accumulated >= 1.0:
+            accumulated -= 1.0
+            paragraph = PARAGRAPH_WITH_MATCHES
+        else:
+            paragraph = PARAGRAPH_WITHOUT_MATCHES
+        paragraphs.append(paragraph)
+        size += len(paragraph.encode('utf-8'))
+    return (DOCUMENT_HEADER + ''.join(paragraphs) + DOCUMENT_FOOTER).encode('utf-8')
+
+
+def build_docx(path, document_size=10 * 1024, media_size=0, density=1.0):
+    """
+    Создает синтетический DOCX файл.
+
+    Args:
+        path (str): Путь для сохранения файла
+        document_size (int): Примерный размер document.xml в байтах
+        media_size (int): Размер несжимаемого изображения в байтах (0 - без медиа)
+        density (float): Доля абзацев, содержащих предлоги и даты
+
+    Returns:
+        str: Путь к созданному файлу
+    """
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr('[Content_Types].xml', CONTENT_TYPES_XML)
+        docx.writestr('_rels/.rels', ROOT_RELS_XML)
+        docx.writestr('word/document.xml', build_document_xml(document_size, density))
+        if media_size:
+            # Случайные байты не сжимаются, как и реальные изображения
+            docx.writestr('word/media/image1.png', os.urandom(media_size))
+    return path
+
+
+# Размеры document.xml в наборе для бенчмарков
+CORPUS_DOCUMENT_SIZES = {
+    'small': 10 * 1024,
+    'medium': 1024 * 1024,
+    'large': 50 * 1024 * 1024,
+}
+
+# Размер изображения в документах "с медиа"
+CORPUS_MEDIA_SIZE = 20 * 1024 * 1024
+
+# Доли абзацев с предлогами и датами
+CORPUS_DENSITIES = (0.0, 0.5, 1.0)
+
+
+def corpus_specs(sizes=None, densities=CORPUS_DENSITIES, media=(False, True)):
+    """
+    Описывает набор синтетических документов.
+
+    Args:
+        sizes (iterable, optional): Имена размеров из CORPUS_DOCUMENT_SIZES. По умолчанию - все.
+        densities (iterable): Доли абзацев с предлогами и датами
+        media (iterable): Варианты наличия изображения
+
+    Returns:
+        list: Словари с полями name, document_size, media_size, density
+    """
+    specs = []
+    for size_name in (sizes or CORPUS_DOCUMENT_SIZES):
+        for with_media in media:
+            for density in densities:
+                specs.append({
+                    'name': f"{size_name}-{'media' if with_media else 'text'}-d{int(density * 100)}",
+                    'document_size': CORPUS_DOCUMENT_SIZES[size_name],
+                    'media_size': CORPUS_MEDIA_SIZE if with_media else 0,
+                    'density': density,
+                })
+    return specs
+
+
+def build_corpus(directory, specs):
+    """
+    Создает синтетические документы по описаниям из corpus_specs.
+
+    Уже существующие файлы не пересоздаются, поэтому набор можно переиспользовать
+    между запусками. Содержимое текста детерминировано, изображения - случайные байты.
+
+    Args:
+        directory (str): Папка для документов
+        specs (list): Описания документов
+
+    Returns:
+        list: Пары (описание, путь к файлу)
+    """
+    os.makedirs(directory, exist_ok=True)
+    corpus = []
+    for spec in specs:
+        path = os.path.join(directory, spec['name'] + '.docx')
+        if not os.path.exists(path):
+            build_docx(path, spec['document_size'], spec['media_size'], spec['density'])
+        corpus.append((spec, path))
+    return corpus
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Модуль кэша повторной обработки.
+Хранит в SQLite сведения об уже обработанных файлах, чтобы при повторном запуске
+пропускать файлы, у которых не изменились ни исходник, ни набор правил, ни версия программы.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+
+from logic import __version__
+
+# Имя файла кэша в папке с выходными файлами
+CACHE_FILENAME = ".processing_cache.sqlite3"
+
+# Максимальное число записей в кэше; при превышении удаляются давно не использованные
+DEFAULT_MAX_ENTRIES = 100000
+
+# Максимальный объем данных кэша в байтах; при превышении удаляются давно не использованные записи
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# До какой доли max_bytes сокращается кэш при превышении, чтобы не вытеснять записи на каждой фиксации
+EVICT_TARGET = 0.9
+
+# Примерный объем записи: текстовые поля и служебные данные строки и индекса по пути
+_ROW_SIZE = ("2 * length(source_path) + length(output_path) + length(source_hash) + length(output_hash) "
+             "+ length(fingerprint) + length(version) + 64")
+
+# Через сколько новых записей фиксировать транзакцию
+COMMIT_EVERY = 50
+
+# Размер блока при вычислении хэша файла
+HASH_BUFFER_SIZE = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    source_path TEXT PRIMARY KEY,
+    source_size INTEGER NOT NULL,
+    source_mtime_ns INTEGER NOT NULL,
+    source_hash TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    version TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    output_size INTEGER NOT NULL,
+    output_mtime_ns INTEGER NOT NULL,
+    output_hash TEXT NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+
+
+def file_hash(path):
+    """
+    Вычисляет SHA-256 содержимого файла.
+
+    Args:
+        path (str): Путь к файлу
+
+    Returns:
+        str: Хэш в шестнадцатеричном виде
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_BUFFER_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def open_cache(output_dir, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Открывает кэш, хранящийся в папке с выходными файлами.
+
+    Args:
+        output_dir (str): Папка с выходными файлами
+        max_entries (int): Максимальное число записей в кэше
+        max_bytes (int): Максимальный объем данных кэша в байтах
+
+    Returns:
+        ProcessingCache: Кэш или None, если его не удалось открыть (обработка идет без кэша)
+    """
+    path = os.path.join(output_dir, CACHE_FILENAME)
+    try:
+        return ProcessingCache(path, max_entries, max_bytes)
+    except (OSError, sqlite3.Error) as e:
+        logging.warning(f"Не удалось открыть кэш обработки {path}, файлы будут обработаны заново: {e}")
+        return None
+
+
+class ProcessingCache:
+    """
+    Кэш результатов обработки, ключ - (хэш исходника, отпечаток правил, версия программы).
+
+    Проверка актуальности обычно обходится двумя вызовами stat: если размер и время
+    изменения исходного и выходного файлов совпадают с записанными, файл пропускается
+    без чтения. Хэш исходника пересчитывается, только если файл был перезаписан
+    без изменения размера (например, скопирован заново).
+
+    Размер кэша ограничен и числом записей, и объемом данных: при превышении
+    любого предела удаляются записи, которые дольше всего не использовались.
+
+    Объект нужно использовать из того потока, в котором он создан.
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        Args:
+            path (str): Путь к файлу кэша
+            max_entries (int): Максимальное число записей в кэше
+            max_bytes (int): Максимальный объем данных кэша в байтах (занятые страницы базы)
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._pending = 0
+        self._connection = sqlite3.connect(path)
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(_SCHEMA)
+        self._connection.commit()
+        logging.info(f"Открыт кэш обработки: {path}")
+
+    def is_fresh(self, source, output, fingerprint):
+        """
+        Проверяет, что выходной файл получен из текущего исходника текущими правилами.
+
+        Args:
+            source (str): Путь к исходному файлу
+            output (str): Путь к выходному файлу
+            fingerprint (str): Отпечаток набора правил
+
+        Returns:
+            bool: True, если файл можно не обрабатывать
+        """
+        source = os.path.abspath(source)
+        row = self._connection.execute(
+            "SELECT source_size, source_mtime_ns, source_hash, fingerprint, version, "
+            "output_path, output_size, output_mtime_ns FROM entries WHERE source_path = ?",
+            (source,)
+        ).fetchone()
+        if row is None:
+            return False
+
+        (source_size, source_mtime_ns, source_hash, cached_fingerprint, version,
+         output_path, output_size, output_mtime_ns) = row
+        if (cached_fingerprint != fingerprint or version != __version__
+                or output_path != os.path.abspath(output)):
+            return False
+
+        try:
+            source_stat = os.stat(source)
+            output_stat = os.stat(output)
+        except OSError:
+            return False
+
+        # Выходной файл должен остаться таким, каким мы его записали
+        if output_stat.st_size != output_size or output_stat.st_mtime_ns != output_mtime_ns:
+            return False
+
+        if source_stat.st_size != source_size:
+            return False
+        if source_stat.st_mtime_ns != source_mtime_ns:
+            # Время изменилось, а размер нет: сверяем содержимое по хэшу
+            if file_hash(source) != source_hash:
+                return False
+            self._connection.execute(
+                "UPDATE entries SET source_mtime_ns = ? WHERE source_path = ?",
+                (source_stat.st_mtime_ns, source)
+            )
+
+        self._connection.execute("UPDATE entries SET last_used = ? WHERE source_path = ?", (time.time(), source))
+        self._count_change()
+        return True
+
+    def record(self, source, output, fingerprint, source_hash=None, output_hash=None):
+        """
+        Запоминает результат успешной обработки файла.
+
+        Args:
+            source (str): Путь к исходному файлу
+            output (str): Путь к выходному файлу
+            fingerprint (str): Отпечаток набора правил
+            source_hash (str, optional): Хэш исходника, если уже вычислен
+            output_hash (str, optional): Хэш выходного файла, если уже вычислен
+        """
+        source_stat = os.stat(source)
+        output_stat = os.stat(output)
+        self._connection.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                os.path.abspath(source), source_stat.st_size, source_stat.st_mtime_ns,
+                source_hash or file_hash(source), fingerprint, __version__,
+                os.path.abspath(output), output_stat.st_size, output_stat.st_mtime_ns,
+                output_hash or file_hash(output), time.time(),
+            )
+        )
+        self._count_change()
+
+    def _count_change(self):
+        """Фиксирует изменения порциями и ограничивает размер кэша."""
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.flush()
+
+    def flush(self):
+        """Удаляет лишние записи и фиксирует изменения на диске."""
+        excess = self._connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._connection.execute(
+                "DELETE FROM entries WHERE source_path IN "
+                "(SELECT source_path FROM entries ORDER BY last_used LIMIT ?)",
+                (excess,)
+            )
+            logging.info(f"Из кэша удалено давно не использованных записей: {excess}")
+        self._evict_bytes()
+        self._connection.commit()
+        self._pending = 0
+
+    def used_bytes(self):
+        """Возвращает объем занятых страниц базы кэша в байтах (без свободных страниц)."""
+        page_count = self._connection.execute("PRAGMA page_count").fetchone()[0]
+        freelist_count = self._connection.execute("PRAGMA freelist_count").fetchone()[0]
+        page_size = self._connection.execute("PRAGMA page_size").fetchone()[0]
+        return (page_count - freelist_count) * page_size
+
+    def _evict_bytes(self):
+        """Удаляет давно не использованные записи, пока объем кэша больше max_bytes."""
+        used = self.used_bytes()
+        if used <= self.max_bytes:
+            return
+        # Занятые страницы включают служебные данные, поэтому освобождаемый объем
+        # оценивается по размеру записей: удаляются самые старые записи, суммарный
+        # размер которых покрывает превышение над EVICT_TARGET * max_bytes
+        excess = used - int(self.max_bytes * EVICT_TARGET)
+        removed = self._connection.execute(
+            "DELETE FROM entries WHERE source_path IN ("
+            "SELECT source_path FROM (SELECT source_path, " + _ROW_SIZE + " AS size, "
+            "SUM(" + _ROW_SIZE + ") OVER (ORDER BY last_used, source_path) AS total FROM entries) "
+            "WHERE total - size < ?)",
+            (excess,)
+        ).rowcount
+        logging.info(f"Кэш превысил предельный объем, удалено давно не использованных записей: {removed}")
+
+    def close(self):
+        """Сохраняет изменения и закрывает кэш."""
+        if self._connection is not None:
+            self.flush()
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
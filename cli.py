@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Консольный интерфейс для пакетной обработки висячих предлогов в DOCX документах.
+Работает без графической оболочки, поэтому подходит для серверов и контейнеров.
+
+Примеры:
+    python cli.py report.docx -o output_files
+    python -m cli docs/ "archive/**/*.docx" --jobs 8 --quiet
+    python cli.py docs/ --recursive --exclude "черновики" -o output_files
+    python cli.py docs/ --recursive --analyze --report report.csv
+"""
+
+import argparse
+import glob
+import itertools
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+
+from batch import analyze_batch, default_jobs
+from cache import DEFAULT_MAX_BYTES, open_cache
+from discovery import is_temporary_file, iter_docx_files
+from job import BatchJob, JobControl
+from logconfig import add_logging_arguments, setup_logging, verbosity_level
+from metrics import JsonLinesSink, MetricsAggregator, TeeSink
+from logic import MONTHS, PREPOSITIONS, ProcessingCancelled, format_counts
+from report import STATUS_ERROR, file_entry, summarize, write_report
+from rules import load_prepositions_file, load_rules_file
+
+# Коды завершения
+EXIT_OK = 0
+EXIT_FAILURES = 1
+EXIT_USAGE = 2
+EXIT_CANCELLED = 130
+
+
+def parse_args(argv=None):
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(
+        description="Заменяет пробелы после предлогов и в датах на неразрывные в DOCX документах."
+    )
+    parser.add_argument(
+        "inputs", nargs="+",
+        help="DOCX файлы, папки или шаблоны путей (например, 'docs/**/*.docx')"
+    )
+    parser.add_argument(
+        "-o", "--output-dir", default="output_files",
+        help="папка для обработанных файлов (по умолчанию: output_files)"
+    )
+    parser.add_argument(
+        "-r", "--recursive", action="store_true",
+        help="искать файлы во вложенных папках; структура папок повторяется в папке результатов"
+    )
+    parser.add_argument(
+        "--include", action="append", metavar="ШАБЛОН",
+        help="обрабатывать в папках только файлы, подходящие под шаблон (можно указать несколько раз)"
+    )
+    parser.add_argument(
+        "--exclude", action="append", metavar="ШАБЛОН",
+        help="пропускать в папках файлы и вложенные папки, подходящие под шаблон (можно указать несколько раз)"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=default_jobs(),
+        help="число рабочих процессов (по умолчанию: число ядер)"
+    )
+    parser.add_argument(
+        "--prepositions-file",
+        help="JSON файл со списком предлогов (по умолчанию используется встроенный список)"
+    )
+    parser.add_argument(
+        "--rules-file",
+        help="JSON файл с настройками правил (какие правила включены и их параметры)"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="обрабатывать все файлы заново, не используя кэш в папке результатов"
+    )
+    parser.add_argument(
+        "--cache-size", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024), metavar="МБ",
+        help="предельный объем кэша в мегабайтах; при превышении удаляются давно не использованные записи "
+             "(по умолчанию %(default)s, кроме того кэш хранит не больше 100 000 записей)"
+    )
+    parser.add_argument(
+        "--no-resume", action="store_true",
+        help="не продолжать прерванное задание по журналу в папке результатов, а начать заново"
+    )
+    parser.add_argument(
+        "--memory-budget", type=int, metavar="МБ",
+        help="примерный предел памяти на обработку одного файла в мегабайтах; "
+             "большие части документа обрабатываются потоково"
+    )
+    parser.add_argument(
+        "--hard-link", action="store_true",
+        help="файлы, в которых нечего заменять, сохранять жесткой ссылкой на исходный файл вместо копии"
+    )
+    parser.add_argument(
+        "--mmap", action="store_true",
+        help="читать файлы от 32 МБ через отображение в память; файлы не должны меняться во время обработки"
+    )
+    parser.add_argument(
+        "--analyze", "--dry-run", action="store_true", dest="analyze",
+        help="только анализ: посчитать будущие замены по правилам и предлогам, ничего не записывая"
+    )
+    parser.add_argument(
+        "--report", metavar="ФАЙЛ",
+        help="отчет анализа в формате CSV или JSON (по расширению файла)"
+    )
+    parser.add_argument(
+        "--metrics",
+        help="файл JSON Lines для метрик по каждому файлу (время этапов, объем данных, число замен)"
+    )
+    parser.add_argument(
+        "-q", "--quiet", action="store_true",
+        help="выводить только ошибки обработки файлов"
+    )
+    add_logging_arguments(parser)
+    args = parser.parse_intermixed_args(argv)
+    if args.jobs < 1:
+        parser.error("число процессов должно быть не меньше 1")
+    if args.memory_budget is not None and args.memory_budget < 1:
+        parser.error("бюджет памяти должен быть не меньше 1 МБ")
+    if args.cache_size < 1:
+        parser.error("объем кэша должен быть не меньше 1 МБ")
+    if args.report and not args.analyze:
+        parser.error("--report используется только вместе с --analyze")
+    return args
+
+
+def glob_root(pattern):
+    """
+    Возвращает начало шаблона пути без подстановочных символов: "in/**/*.docx" -> "in".
+
+    Args:
+        pattern (str): Шаблон пути
+
+    Returns:
+        str: Папка, от которой строятся пути найденных по шаблону файлов
+    """
+    root = pattern
+    while glob.has_magic(root):
+        root = os.path.dirname(root)
+    return root or os.curdir
+
+
+def iter_inputs(inputs, output_dir, recursive=False, include=None, exclude=None, missing=None,
+                collisions=None):
+    """
+    Раскрывает файлы, папки и шаблоны путей в задачи обработки.
+
+    Задачи отдаются по мере нахождения файлов, поэтому обработка начинается до
+    окончания обхода больших папок. Для файлов из папок и шаблонов структура
+    вложенных папок (от папки или от начала шаблона без подстановочных символов)
+    повторяется в output_dir, отдельные файлы сохраняются в output_dir по имени.
+    Файл, выходной путь которого уже занят другим исходным файлом, не обрабатывается.
+
+    Args:
+        inputs (list): Пути и шаблоны из командной строки
+        output_dir (str): Папка для результатов
+        recursive (bool, optional): Искать файлы во вложенных папках
+        include (list, optional): Шаблоны файлов в папках, которые нужно обработать
+        exclude (list, optional): Шаблоны файлов и папок, которые нужно пропустить
+        missing (list, optional): Сюда добавляются входные пути, для которых ничего не найдено
+        collisions (list, optional): Сюда добавляются тройки (исходный файл, выходной файл,
+                                     исходный файл, который уже записывается в этот выходной файл)
+
+    Yields:
+        tuple: (исходный файл, выходной файл)
+    """
+    seen = set()
+    destinations = {}
+    for item in inputs:
+        if os.path.isdir(item):
+            found = ((path, os.path.relpath(path, item))
+                     for path in iter_docx_files(item, recursive, include, exclude, skip_dirs=[output_dir]))
+        elif glob.has_magic(item):
+            root = glob_root(item)
+            found = ((path, os.path.relpath(path, root)) for path in sorted(glob.iglob(item, recursive=True))
+                     if os.path.isfile(path) and path.lower().endswith(".docx")
+                     and not is_temporary_file(os.path.basename(path)))
+        else:
+            # Отдельный файл передаем как есть: ошибки формата сообщит логика обработки
+            found = [(item, os.path.basename(item))]
+
+        empty = True
+        for path, relative in found:
+            empty = False
+            # Убираем повторы, сохраняя порядок
+            key = os.path.normcase(os.path.abspath(path))
+            if key in seen:
+                continue
+            seen.add(key)
+            output_file = os.path.join(output_dir, relative)
+            destination = os.path.normcase(os.path.abspath(output_file))
+            if destination in destinations:
+                if collisions is not None:
+                    collisions.append((path, output_file, destinations[destination]))
+                continue
+            destinations[destination] = path
+            yield path, output_file
+
+        if empty and missing is not None:
+            missing.append(item)
+
+
+def report_failure(args, result):
+    """
+    Выводит ошибку файла в stderr, если лог на консоль отключен (--quiet).
+
+    Иначе ошибка уже выведена в лог на уровне ERROR там, где она произошла
+    (logic.process_docx, batch), и повторно не печатается.
+    """
+    if args.quiet:
+        print(f"ОШИБКА {result.input_file}: {result.error}", file=sys.stderr)
+
+
+def run_analysis(args, tasks, prepositions, missing, rules=None):
+    """
+    Анализирует файлы без записи результатов и выводит итог.
+
+    Args:
+        args (argparse.Namespace): Аргументы командной строки
+        tasks (iterable): Пары (исходный файл, выходной файл); выходной файл не используется
+        prepositions (set): Список предлогов
+        missing (list): Входные пути, для которых ничего не найдено
+        rules (dict, optional): Настройки правил
+
+    Returns:
+        int: Код завершения
+    """
+    control = JobControl()
+
+    def interrupt(signum, frame):
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        print("Остановка... (повторный Ctrl+C прервет немедленно)", file=sys.stderr)
+        control.cancel()
+
+    previous_handler = signal.signal(signal.SIGINT, interrupt)
+    metrics_sink = JsonLinesSink(args.metrics) if args.metrics else None
+
+    entries = []
+    try:
+        files = (input_file for input_file, _ in tasks)
+        for result in analyze_batch(files, prepositions, MONTHS, args.jobs, metrics_sink, control, rules,
+                                    args.mmap):
+            if isinstance(result.error, ProcessingCancelled):
+                continue
+            entry = file_entry(result)
+            entries.append(entry)
+            if entry['status'] == STATUS_ERROR:
+                report_failure(args, result)
+            elif not args.quiet:
+                print(f"{entry['status'].upper():<9} {result.input_file} (замен: {entry['replacements']})")
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+        if metrics_sink is not None:
+            metrics_sink.close()
+
+    for item in missing:
+        print(f"Не найдено .docx файлов: {item}", file=sys.stderr)
+
+    summary = summarize(entries)
+    if args.report:
+        try:
+            write_report(entries, args.report)
+        except OSError as e:
+            print(f"Не удалось записать отчет: {e}", file=sys.stderr)
+            return EXIT_FAILURES
+
+    if not args.quiet:
+        statuses = summary['statuses']
+        print(f"Файлов: {summary['files']}, требуют обработки: {statuses['pending']}, "
+              f"уже обработаны: {statuses['processed']}, без мест для замены: {statuses['clean']}, "
+              f"с ошибками: {statuses[STATUS_ERROR]}")
+        print(f"Будет замен: {summary['replacements']} ({format_counts(summary['counts'])})")
+        if args.report:
+            print(f"Отчет: {args.report}")
+
+    if control.cancelled:
+        return EXIT_CANCELLED
+    return EXIT_FAILURES if summary['statuses'][STATUS_ERROR] or missing else EXIT_OK
+
+
+def main(argv=None):
+    """
+    Точка входа консольного интерфейса.
+
+    Returns:
+        int: Код завершения (0 - успех, 1 - есть ошибки обработки, 2 - ошибка параметров,
+             130 - обработка остановлена по Ctrl+C)
+    """
+    args = parse_args(argv)
+
+    # Записи из рабочих процессов пула выводятся через общую очередь
+    setup_logging(logging.CRITICAL if args.quiet else verbosity_level(args.verbose), args.log_file, sys.stderr,
+                  args.log_format)
+
+    prepositions = PREPOSITIONS
+    if args.prepositions_file:
+        try:
+            prepositions = load_prepositions_file(args.prepositions_file)
+        except (OSError, ValueError) as e:
+            print(f"Не удалось загрузить список предлогов: {e}", file=sys.stderr)
+            return EXIT_USAGE
+
+    rules = None
+    if args.rules_file:
+        try:
+            rules = load_rules_file(args.rules_file)
+        except (OSError, ValueError) as e:
+            print(f"Не удалось загрузить настройки правил: {e}", file=sys.stderr)
+            return EXIT_USAGE
+
+    missing = []
+    # В режиме анализа результаты не записываются, поэтому совпадение выходных путей не мешает
+    collisions = None if args.analyze else []
+    tasks = iter_inputs(args.inputs, args.output_dir, args.recursive, args.include, args.exclude, missing,
+                        collisions)
+    first = next(tasks, None)
+    if first is None:
+        for item in missing:
+            print(f"Не найдено .docx файлов: {item}", file=sys.stderr)
+        return EXIT_USAGE
+    tasks = itertools.chain([first], tasks)
+
+    if args.analyze:
+        return run_analysis(args, tasks, prepositions, missing, rules)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    cache = None if args.no_cache else open_cache(args.output_dir, max_bytes=args.cache_size * 1024 * 1024)
+    aggregator = MetricsAggregator()
+    metrics_sink = TeeSink(aggregator, JsonLinesSink(args.metrics)) if args.metrics else aggregator
+
+    memory_budget = args.memory_budget * 1024 * 1024 if args.memory_budget is not None else None
+    job = BatchJob(tasks, args.output_dir, prepositions, MONTHS, args.jobs, cache, metrics_sink, memory_budget,
+                   resume=not args.no_resume, hard_link=args.hard_link, rules=rules, use_mmap=args.mmap)
+
+    def interrupt(signum, frame):
+        # Первый Ctrl+C останавливает задание, сохраняя журнал; второй прерывает сразу
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+        print("Остановка... (повторный Ctrl+C прервет немедленно)", file=sys.stderr)
+        job.cancel()
+
+    previous_handler = signal.signal(signal.SIGINT, interrupt)
+
+    succeeded = 0
+    failed = 0
+    skipped = 0
+    try:
+        for result in job.run():
+            if isinstance(result.error, ProcessingCancelled):
+                continue
+            if result.skipped:
+                skipped += 1
+                if not args.quiet:
+                    print(f"SKIP   {result.input_file} (результат актуален)")
+            elif result.error is None:
+                succeeded += 1
+                if not args.quiet:
+                    replacements = sum(sum(counts.values()) for counts in result.part_counts.values())
+                    note = ", без изменений" if result.metrics is not None and result.metrics.unchanged else ""
+                    print(f"OK     {result.input_file} -> {result.output_file} (замен: {replacements}{note})")
+            else:
+                failed += 1
+                report_failure(args, result)
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+        if cache is not None:
+            cache.close()
+        metrics_sink.close()
+
+    for item in missing:
+        print(f"Не найдено .docx файлов: {item}", file=sys.stderr)
+    for input_file, output_file, other in collisions:
+        print(f"ОШИБКА {input_file}: выходной файл {output_file} уже занят файлом {other}, "
+              f"файл не обработан", file=sys.stderr)
+
+    if not args.quiet:
+        print(f"Обработано успешно: {succeeded}, пропущено: {skipped}, с ошибками: {failed + len(collisions)}")
+        summary = aggregator.summary()
+        if any(summary['replacements'].values()):
+            print(f"Замены по правилам: {format_counts(summary['replacements'])}")
+        if summary['unchanged']:
+            print(f"Сохранено без изменений (нечего заменять): {summary['unchanged']}")
+        if summary['latency_p50'] is not None:
+            print(f"Время на файл: p50 {summary['latency_p50']:.3f} с, p95 {summary['latency_p95']:.3f} с, "
+                  f"max {summary['latency_max']:.3f} с")
+
+    if job.cancelled:
+        print("Обработка остановлена. Повторный запуск с той же папкой результатов продолжит с места остановки.",
+              file=sys.stderr)
+        return EXIT_CANCELLED
+    return EXIT_FAILURES if failed or missing or collisions else EXIT_OK
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Модуль поиска DOCX файлов в папках.
+Обходит дерево папок через os.scandir и отдает пути по мере нахождения,
+поэтому обработка первых файлов начинается до окончания обхода большого дерева.
+
+Обход последовательный и ленивый: записи папки читаются, только когда пул
+процессов запрашивает следующие задачи. Параллельный обход не нужен - чтение
+записи каталога на порядки быстрее обработки документа, и пул все равно
+забирает файлы медленнее, чем один обход их находит.
+"""
+
+import fnmatch
+import logging
+import os
+
+# Расширения обрабатываемых файлов (сравниваются без учета регистра)
+DOCX_SUFFIXES = ('.docx',)
+
+# Начала имен файлов блокировки и временных файлов: "~$отчет.docx" (Word),
+# ".~lock.отчет.docx#" (LibreOffice), скрытые файлы
+_TEMPORARY_PREFIXES = ('~$', '.')
+
+# Окончания имен временных файлов
+_TEMPORARY_SUFFIXES = ('.tmp', '.temp', '~')
+
+
+def is_temporary_file(name):
+    """Проверяет, является ли файл файлом блокировки, временным или скрытым."""
+    return name.startswith(_TEMPORARY_PREFIXES) or name.lower().endswith(_TEMPORARY_SUFFIXES)
+
+
+def iter_docx_files(root, recursive=True, include=None, exclude=None, skip_dirs=(), suffixes=DOCX_SUFFIXES,
+                    sort=False):
+    """
+    Находит DOCX файлы в папке.
+
+    Файлы отдаются по мере того, как os.scandir читает папку, поэтому в большой
+    плоской папке обработка начинается до окончания ее чтения. Папки обходятся
+    в глубину, в порядке имен, после всех файлов текущей папки. Символические
+    ссылки на папки не обходятся. Шаблоны сравниваются без учета регистра
+    с путем относительно root (через "/") и с именем файла; исключающий шаблон,
+    совпавший с папкой, исключает ее целиком.
+
+    Args:
+        root (str): Папка для поиска
+        recursive (bool, optional): Искать во вложенных папках
+        include (list, optional): Шаблоны файлов, которые нужно обработать (например, "отчеты/*.docx")
+        exclude (list, optional): Шаблоны файлов и папок, которые нужно пропустить (например, "архив")
+        skip_dirs (iterable, optional): Папки, которые не нужно обходить (например, папка с результатами)
+        suffixes (tuple, optional): Расширения файлов в нижнем регистре
+        sort (bool, optional): Отдавать файлы каждой папки в порядке имен. Папка тогда
+                               читается целиком до первого файла.
+
+    Yields:
+        str: Путь к очередному найденному файлу
+    """
+    include = [pattern.lower() for pattern in include or ()]
+    exclude = [pattern.lower() for pattern in exclude or ()]
+    skip = {_normalize(path) for path in skip_dirs}
+
+    # Стек папок: (путь, путь относительно root)
+    stack = [(root, '')]
+    while stack:
+        directory, relative = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(directory) as iterator:
+                for entry in sorted(iterator, key=lambda entry: entry.name) if sort else iterator:
+                    name = entry.name
+                    entry_relative = relative + name
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if recursive and not is_temporary_file(name) and _normalize(entry.path) not in skip \
+                                    and not _matches(entry_relative, name, exclude):
+                                subdirs.append((entry.path, entry_relative + '/'))
+                            continue
+                        if not entry.is_file():
+                            continue
+                    except OSError:
+                        continue
+
+                    if is_temporary_file(name) or not name.lower().endswith(suffixes):
+                        continue
+                    if include and not _matches(entry_relative, name, include):
+                        continue
+                    if exclude and _matches(entry_relative, name, exclude):
+                        continue
+                    yield entry.path
+        except OSError as e:
+            logging.warning(f"Не удалось прочитать папку {directory}: {e}")
+
+        # Вложенные папки обходим в порядке имен; их немного, сортировка не задерживает файлы
+        subdirs.sort()
+        stack.extend(reversed(subdirs))
+
+
+def iter_tasks(root, output_dir, **options):
+    """
+    Находит DOCX файлы в папке и сопоставляет им пути результатов.
+
+    Структура вложенных папок повторяется в output_dir. Если output_dir лежит
+    внутри root, она не обходится.
+
+    Args:
+        root (str): Папка для поиска
+        output_dir (str): Папка для результатов
+        **options: Параметры iter_docx_files (recursive, include, exclude, skip_dirs, suffixes, sort)
+
+    Yields:
+        tuple: (исходный файл, выходной файл)
+    """
+    options['skip_dirs'] = list(options.get('skip_dirs', ())) + [output_dir]
+    for path in iter_docx_files(root, **options):
+        yield path, os.path.join(output_dir, os.path.relpath(path, root))
+
+
+def _matches(relative, name, patterns):
+    """Проверяет относительный путь и имя на совпадение с одним из шаблонов."""
+    relative = relative.lower()
+    name = name.lower()
+    return any(fnmatch.fnmatchcase(relative, pattern) or fnmatch.fnmatchcase(name, pattern)
+               for pattern in patterns)
+
+
+def _normalize(path):
+    """Приводит путь к виду для сравнения."""
+    return os.path.normcase(os.path.abspath(path))
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Модуль управляемых пакетных заданий.
+Задание можно приостановить, продолжить или остановить; завершенные файлы
+записываются в журнал, и прерванное задание при повторном запуске продолжается
+с того места, где остановилось.
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+
+from batch import process_batch
+from cache import file_hash
+from logic import ProcessingCancelled, __version__, get_typographer
+
+# Имя файла журнала в папке результатов
+JOURNAL_FILENAME = '.batch_journal.jsonl'
+
+# Через сколько записей журнал сбрасывается на диск (fsync)
+JOURNAL_SYNC_EVERY = 50
+
+
+class JobControl:
+    """
+    Флаги паузы и остановки задания.
+
+    Основаны на multiprocessing.Event, поэтому передаются в рабочие процессы пула
+    при их запуске и проверяются там между этапами обработки файла.
+    """
+
+    def __init__(self):
+        self._cancelled = multiprocessing.Event()
+        self._running = multiprocessing.Event()
+        self._running.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set() and not self._cancelled.is_set()
+
+    def cancel(self):
+        """Останавливает задание; приостановленное задание тоже останавливается."""
+        self._cancelled.set()
+        self._running.set()
+
+    def pause(self):
+        """Приостанавливает задание: новые файлы не начинаются, начатые ждут на ближайшем этапе."""
+        self._running.clear()
+
+    def resume(self):
+        """Продолжает приостановленное задание."""
+        self._running.set()
+
+    def accepting(self):
+        """Можно ли начинать обработку следующего файла."""
+        return self._running.is_set() and not self._cancelled.is_set()
+
+    def wait(self):
+        """Ждет, пока задание приостановлено."""
+        self._running.wait()
+
+    def checkpoint(self):
+        """
+        Точка проверки между этапами: ждет во время паузы и прерывает обработку при остановке.
+
+        Raises:
+            ProcessingCancelled: Если задание остановлено
+        """
+        if not self._running.is_set():
+            self._running.wait()
+        if self._cancelled.is_set():
+            raise ProcessingCancelled("Обработка остановлена")
+
+
+class BatchJournal:
+    """
+    Журнал завершенных файлов задания (JSON Lines).
+
+    Первая строка хранит отпечаток набора правил и версию программы: журнал,
+    записанный с другими правилами, не используется. Каждая следующая строка -
+    успешно обработанный файл; строка дописывается сразу после его завершения.
+    Вместе с путями записываются размер, время изменения и хэш исходника: файл,
+    измененный после остановки задания, при продолжении обрабатывается заново.
+    """
+
+    def __init__(self, path, fingerprint):
+        """
+        Открывает журнал, загружая записи прерванного задания с теми же правилами.
+
+        Args:
+            path (str): Путь к файлу журнала
+            fingerprint (str): Отпечаток набора правил
+        """
+        self.path = path
+        self.resumed = 0
+        # (исходный файл, выходной файл) -> (размер, время изменения, хэш исходника)
+        self._completed = {}
+        self._unsynced = 0
+        header = {'fingerprint': fingerprint, 'version': __version__}
+
+        if self._load(header):
+            logging.info(f"Найден журнал прерванного задания: {path}, завершено файлов: {len(self._completed)}")
+            self._file = open(path, 'a', encoding='utf-8')
+        else:
+            self._completed.clear()
+            self._file = open(path, 'w', encoding='utf-8')
+            self._write(header)
+
+    def _load(self, header):
+        """Загружает записи журнала; False, если журнала нет или он записан с другими правилами."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = iter(f)
+                if json.loads(next(lines, 'null')) != header:
+                    return False
+                for line in lines:
+                    try:
+                        entry = json.loads(line)
+                        self._completed[(entry['input'], entry['output'])] = (
+                            entry['source_size'], entry['source_mtime_ns'], entry['source_hash'])
+                    except (ValueError, KeyError, TypeError):
+                        # Недописанная последняя строка после аварийного завершения
+                        continue
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logging.warning(f"Журнал {self.path} не прочитан и будет создан заново: {e}")
+            return False
+        return True
+
+    def is_done(self, input_file, output_file):
+        """
+        Проверяет, обработан ли файл в прерванном задании, не изменился ли с тех пор
+        исходник и на месте ли результат.
+
+        Как и в ProcessingCache.is_fresh, хэш исходника пересчитывается, только если
+        время изменения другое, а размер тот же.
+        """
+        entry = self._completed.get((_key(input_file), _key(output_file)))
+        if entry is None or not os.path.exists(output_file):
+            return False
+        size, mtime_ns, source_hash = entry
+        try:
+            stat = os.stat(input_file)
+            if stat.st_size != size:
+                return False
+            if stat.st_mtime_ns != mtime_ns and file_hash(input_file) != source_hash:
+                return False
+        except OSError:
+            return False
+        self.resumed += 1
+        return True
+
+    def record(self, result, source_hash=None):
+        """
+        Записывает успешно обработанный файл.
+
+        Args:
+            result (FileResult): Результат обработки
+            source_hash (str, optional): Хэш исходника, если уже вычислен в рабочем процессе
+        """
+        try:
+            stat = os.stat(result.input_file)
+            source_hash = source_hash or file_hash(result.input_file)
+        except OSError as e:
+            # Без записи файл просто будет обработан заново при продолжении задания
+            logging.warning(f"Не удалось записать в журнал результат для {result.input_file}: {e}")
+            return
+        self._write({
+            'input': _key(result.input_file), 'output': _key(result.output_file),
+            'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns, 'source_hash': source_hash,
+        })
+        self._unsynced += 1
+        if self._unsynced >= JOURNAL_SYNC_EVERY:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self, remove=False):
+        """
+        Закрывает журнал.
+
+        Args:
+            remove (bool, optional): Удалить журнал (задание завершено полностью)
+        """
+        self._file.close()
+        if remove:
+            try:
+                os.remove(self.path)
+            except OSError as e:
+                logging.warning(f"Не удалось удалить журнал {self.path}: {e}")
+
+
+class BatchJob:
+    """
+    Пакетное задание с паузой, остановкой и продолжением после перезапуска.
+
+    Между файлами и между этапами обработки файла проверяются флаги JobControl.
+    Пока задание не завершено полностью, в папке результатов лежит журнал
+    завершенных файлов; при повторном запуске эти файлы пропускаются.
+    Когда все файлы обработаны, журнал удаляется.
+    """
+
+    def __init__(self, tasks, output_dir, prepositions=None, months=None, jobs=None, cache=None,
+                 metrics_sink=None, memory_budget=None, resume=True, hard_link=False, rules=None, use_mmap=False):
+        """
+        Args:
+            tasks (iterable): Пары (исходный файл, выходной файл). Может быть генератором.
+            output_dir (str): Папка результатов, в ней хранится журнал
+            prepositions (iterable, optional): Список предлогов. По умолчанию используется PREPOSITIONS.
+            months (iterable, optional): Список месяцев. По умолчанию используется MONTHS.
+            jobs (int, optional): Число рабочих процессов. По умолчанию - число ядер.
+            cache (ProcessingCache, optional): Кэш повторной обработки
+            metrics_sink (MetricsSink, optional): Приемник метрик по каждому обработанному файлу
+            memory_budget (int, optional): Примерный предел памяти на обработку одного файла в байтах
+            resume (bool, optional): Продолжить прерванное задание по журналу. Если False,
+                                     журнал начинается заново.
+            hard_link (bool, optional): Файлы, в которых нечего заменять, сохранять жесткой ссылкой
+                                        на исходный файл вместо копии.
+            rules (dict, optional): Настройки правил (rules.normalize_rules). По умолчанию - из реестра правил.
+            use_mmap (bool, optional): Читать большие исходные файлы через отображение в память.
+        """
+        self.tasks = tasks
+        self.journal_path = os.path.join(output_dir, JOURNAL_FILENAME)
+        self.prepositions = set(prepositions) if prepositions is not None else None
+        self.months = set(months) if months is not None else None
+        self.jobs = jobs
+        self.cache = cache
+        self.metrics_sink = metrics_sink
+        self.memory_budget = memory_budget
+        self.resume_journal = resume
+        self.hard_link = hard_link
+        self.rules = rules
+        self.use_mmap = use_mmap
+        self.control = JobControl()
+        self.resumed = 0
+
+    @property
+    def cancelled(self):
+        return self.control.cancelled
+
+    @property
+    def paused(self):
+        return self.control.paused
+
+    def cancel(self):
+        """Останавливает задание. Можно вызывать из любого потока."""
+        self.control.cancel()
+
+    def pause(self):
+        """Приостанавливает задание. Можно вызывать из любого потока."""
+        self.control.pause()
+
+    def resume(self):
+        """Продолжает приостановленное задание. Можно вызывать из любого потока."""
+        self.control.resume()
+
+    def run(self):
+        """
+        Выполняет задание.
+
+        Yields:
+            FileResult: Результат очередного файла. Файлы, завершенные в прерванном
+                        задании, возвращаются как пропущенные. У файлов, прерванных
+                        остановкой, в поле error - ProcessingCancelled.
+        """
+        fingerprint = get_typographer(self.prepositions, self.months, self.rules).fingerprint
+        os.makedirs(os.path.dirname(self.journal_path) or '.', exist_ok=True)
+        if not self.resume_journal and os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        journal = BatchJournal(self.journal_path, fingerprint)
+        completed = False
+        try:
+            yield from process_batch(self.tasks, self.prepositions, self.months, self.jobs, self.cache,
+                                     self.metrics_sink, self.memory_budget, self.control, journal,
+                                     self.hard_link, self.rules, self.use_mmap)
+            completed = not self.control.cancelled
+        finally:
+            self.resumed = journal.resumed
+            # Журнал остается, если задание прервано: по нему следующий запуск продолжит работу
+            journal.close(remove=completed)
+            if self.resumed:
+                logging.info(f"Пропущено файлов, завершенных в прерванном задании: {self.resumed}")
+
+
+def _key(path):
+    """Приводит путь к виду для сравнения."""
+    return os.path.normcase(os.path.abspath(path))
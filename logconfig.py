@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Модуль настройки логирования.
+Записи из всех потоков и из рабочих процессов пула попадают в одну очередь,
+а в файл и на консоль их выводит отдельный поток (QueueListener), поэтому
+обработка файлов не ждет записи на диск или вывода в консоль.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import multiprocessing
+import sys
+from datetime import datetime
+
+# Поддерживаемые форматы записей: текст или JSON Lines (одна запись - один объект JSON)
+LOG_FORMATS = ('text', 'json')
+
+# Формат текстовых записей
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Очередь записей, поток вывода и уровень логирования; None, пока логирование не настроено
+_queue = None
+_listener = None
+_level = None
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Выводит запись одной строкой JSON: время, уровень, процесс, источник и сообщение."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'process': record.processName,
+            'pid': record.process,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Передает записи в очередь без форматирования.
+
+    Стандартный QueueHandler склеивает сообщение с трассировкой исключения;
+    здесь трассировка сохраняется отдельно в exc_text, чтобы формат записи
+    (текст или JSON) выбирался только при выводе.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        # Исключение и аргументы сообщения превращаются в текст: между процессами
+        # передаются только записи, которые можно сериализовать
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging(level=logging.WARNING, log_file=None, stream=sys.stderr, fmt='text'):
+    """
+    Настраивает логирование через очередь с отдельным потоком вывода.
+
+    Повторный вызов заменяет прежние настройки. Перед завершением программы
+    оставшиеся записи выводятся автоматически (stop_logging).
+
+    Args:
+        level (int, optional): Уровень логирования (logging.DEBUG, logging.INFO, ...)
+        log_file (str, optional): Файл, в который дописываются записи
+        stream (file, optional): Поток для вывода записей на консоль; None - не выводить
+        fmt (str, optional): Формат записей: 'text' или 'json'
+
+    Returns:
+        logging.handlers.QueueListener: Поток вывода записей
+    """
+    if fmt not in LOG_FORMATS:
+        raise ValueError(f"Неизвестный формат логов: {fmt}")
+    global _queue, _listener, _level
+    stop_logging()
+
+    formatter = JsonLinesFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT)
+    handlers = []
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding='utf-8'))
+    if stream is not None:
+        handlers.append(logging.StreamHandler(stream))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    # Очередь между процессами: в нее же пишут рабочие процессы пула (worker_config)
+    _queue = multiprocessing.Queue()
+    _listener = logging.handlers.QueueListener(_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    _level = level
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_QueueHandler(_queue))
+    root.setLevel(level)
+    return _listener
+
+
+def stop_logging():
+    """Выводит оставшиеся записи и останавливает поток вывода."""
+    global _queue, _listener, _level
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        if isinstance(handler, _QueueHandler):
+            root.removeHandler(handler)
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _queue.close()
+    _queue.join_thread()
+    _queue = _listener = _level = None
+
+
+def worker_config():
+    """
+    Возвращает настройки логирования для рабочих процессов пула.
+
+    Returns:
+        tuple: (очередь записей, уровень) или None, если логирование не настроено через setup_logging
+    """
+    if _queue is None:
+        return None
+    return _queue, _level
+
+
+def configure_worker(config):
+    """
+    Направляет записи рабочего процесса в очередь главного процесса.
+
+    Args:
+        config (tuple): Результат worker_config() в главном процессе. Если None,
+                        настройки логирования процесса не меняются.
+    """
+    if config is None:
+        return
+    queue, level = config
+    root = logging.getLogger()
+    # Обработчики, унаследованные от главного процесса при запуске через fork, не нужны
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_QueueHandler(queue))
+    root.setLevel(level)
+
+
+def add_logging_arguments(parser):
+    """Добавляет в разбор аргументов параметры подробности и формата логов."""
+    parser.add_argument(
+        "-v", "--verbose", action="count", default=0,
+        help="подробнее выводить ход работы (-v - сведения, -vv - отладка)"
+    )
+    parser.add_argument(
+        "--log-format", choices=LOG_FORMATS, default='text',
+        help="формат логов: text или json (JSON Lines, одна запись - одна строка)"
+    )
+    parser.add_argument(
+        "--log-file",
+        help="файл, в который дописываются логи"
+    )
+
+
+def verbosity_level(verbose, default=logging.WARNING):
+    """
+    Возвращает уровень логирования по числу флагов -v.
+
+    Args:
+        verbose (int): Число флагов -v
+        default (int, optional): Уровень без флагов
+
+    Returns:
+        int: Уровень логирования, не ниже logging.DEBUG
+    """
+    return max(logging.DEBUG, default - 10 * verbose)
+
+
+atexit.register(stop_logging)
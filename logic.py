@@ -1,13 +1,28 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import codecs
+import hashlib
+import io
+import json
 import zipfile
 import re
 import os
-import tempfile
 import shutil
+from bisect import bisect_right
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import lru_cache
 from pathlib import Path
 import logging
+import time
+
+from archive import DEFAULT_COMPRESSLEVEL, DocxPackage, copy_member_raw, open_member_writer, write_member
+from rules import RULES, normalize_rules
+
+# Версия алгоритма обработки; меняется, если при тех же правилах меняется результат
+__version__ = "1.2.0"
 
 # Список предлогов, которые нужно обработать
 PREPOSITIONS = {
@@ -27,8 +42,447 @@ MONTHS = {
     'июль', 'август', 'сентябрь', 'октябрь', 'ноябрь', 'декабрь'
 }
 
+# Сколько частей с текстом обрабатывать параллельно в пределах одного документа
+PART_WORKERS = 4
+
+# Во сколько раз память на обработку части целиком превышает ее распакованный размер
+# (исходные байты, строка, результат и его байты)
+PART_MEMORY_FACTOR = 4
+
+# Размер куска распакованных данных при потоковой обработке части, в байтах
+STREAM_CHUNK_SIZE = 1024 * 1024
+MIN_STREAM_CHUNK_SIZE = 64 * 1024
+
+# Сколько скомпилированных наборов правил держать в кэше
+TYPOGRAPHER_CACHE_SIZE = 16
+
+# Имена всех зарегистрированных правил (rules.RULES) в порядке их применения
+RULE_NAMES = tuple(RULES)
+
+# Токены WordprocessingML, важные для обработки текста: открывающий и закрывающий
+# теги текста run-а, разрывы внутри абзаца и границы абзаца
+_XML_TOKEN_RE = re.compile(
+    r'(?P<text_open><w:t(?:\s[^>]*)?(?<!/)>)'
+    r'|(?P<text_close></w:t>)'
+    r'|(?P<separator><w:(?:tab|br|cr|noBreakHyphen|softHyphen|sym)\b[^>]*>)'
+    r'|(?P<paragraph></?w:p[\s>/])'
+)
+
+# Символ, которым в склеенном тексте абзаца обозначается разрыв (w:tab, w:br и т.п.)
+_TEXT_BREAK = '\x00'
+
+# Текст элементов w:t, разрывы внутри абзаца и границы абзацев для быстрой
+# предварительной проверки частей (те же токены, что и в _XML_TOKEN_RE)
+_PRESCAN_TOKEN_RE = re.compile(
+    r'<w:t(?:\s[^>]*)?(?<!/)>([^<]*)</w:t>'
+    r'|(<w:(?:tab|br|cr|noBreakHyphen|softHyphen|sym)\b|</?w:p[\s>/])'
+)
+
+# Открывающий тег w:t (для поиска незавершенного элемента в конце куска)
+_TEXT_OPEN_RE = re.compile(r'<w:t(?:\s[^>]*)?(?<!/)>')
+
+# Способы сохранения документа, в котором нечего заменять: копия или жесткая ссылка
+UNCHANGED_COPY = 'copy'
+UNCHANGED_LINK = 'link'
+
+# Состояния документа по результатам анализа: есть что заменить,
+# все найденные места уже обработаны, мест для замены нет
+STATUS_PENDING = 'pending'
+STATUS_PROCESSED = 'processed'
+STATUS_CLEAN = 'clean'
+
+
+class ProcessingCancelled(Exception):
+    """Обработка остановлена по запросу пользователя."""
 
-def fix_hanging_prepositions_and_dates(input_file, output_file, prepositions=None, months=None, progress_callback=None):
+
+class Typographer:
+    """
+    Скомпилированный набор правил.
+
+    Все включенные правила из реестра rules.RULES объединены в одно регулярное
+    выражение с именованной группой на каждое правило, поэтому текст просматривается
+    за один проход при любом числе правил. Объект не хранит состояния между
+    вызовами и может использоваться повторно для любого числа файлов.
+    """
+
+    def __init__(self, prepositions, months, rules=None):
+        """
+        Args:
+            prepositions (iterable): Предлоги, после которых ставится неразрывный пробел
+            months (iterable): Названия месяцев для обработки дат
+            rules (dict, optional): Настройки правил (см. rules.normalize_rules).
+                                    По умолчанию - настройки из реестра правил.
+        """
+        self.prepositions = frozenset(word for word in prepositions if word)
+        self.months = frozenset(word for word in months if word)
+        self.settings = normalize_rules(rules)
+
+        # Включенные правила, которым есть что искать: {имя: Rule}
+        self.rules = {}
+        for name, options in self.settings.items():
+            if options['enabled']:
+                rule = RULES[name].build(self.prepositions, self.months, options)
+                if rule is not None:
+                    self.rules[name] = rule
+
+        self.pattern = None
+        # Для каждого правила: (номера групп заменяемых фрагментов, замены)
+        self._groups = {}
+        if self.rules:
+            self.pattern = re.compile('|'.join(f'(?P<{name}>{rule.pattern})' for name, rule in self.rules.items()))
+            for name, rule in self.rules.items():
+                # Группы правила идут в общем выражении сразу за его именованной группой
+                first = self.pattern.groupindex[name] + 1
+                self._groups[name] = tuple(zip(range(first, first + len(rule.replacements)), rule.replacements))
+
+        # Наибольшая длина совпадения: столько символов текста нужно видеть
+        # за позицией, чтобы совпадение, начинающееся в ней, было найдено верно
+        self.max_match_length = max([0] + [rule.max_length for rule in self.rules.values()])
+
+        # Отпечаток набора правил: совпадает у наборов с одинаковыми предлогами,
+        # месяцами и настройками правил
+        digest = hashlib.sha256()
+        for words in (self.prepositions, self.months):
+            digest.update('\n'.join(sorted(words)).encode('utf-8'))
+            digest.update(b'\0')
+        digest.update(json.dumps(self.settings, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+        self.fingerprint = digest.hexdigest()
+
+    def iter_matches(self, text, pos=0):
+        """
+        Находит в тексте места для замены.
+
+        Args:
+            text (str): Исходный текст
+            pos (int, optional): Позиция, с которой начинается поиск. Символы перед ней
+                                 учитываются при проверке границы слова и в проверках назад.
+
+        Yields:
+            tuple: (имя правила, начало, конец совпадения, список правок), где правка -
+                   кортеж (начало, конец, замена). У совпадений, в которых все фрагменты
+                   уже заменены (например, стоят неразрывные пробелы), список правок пуст.
+        """
+        if self.pattern is None:
+            return
+
+        groups = self._groups
+        for match in self.pattern.finditer(text, pos):
+            rule = match.lastgroup
+            edits = []
+            for group, replacement in groups[rule]:
+                start, end = match.span(group)
+                if start < end and text[start:end] != replacement:
+                    edits.append((start, end, replacement))
+            yield rule, match.start(), match.end(), edits
+
+    def apply(self, text):
+        """
+        Применяет включенные правила к тексту.
+
+        Args:
+            text (str): Исходный текст
+
+        Returns:
+            tuple: (обработанный текст, словарь с числом замен по каждому правилу)
+        """
+        counts = dict.fromkeys(RULE_NAMES, 0)
+        pieces = []
+        last = 0
+        for rule, _, _, edits in self.iter_matches(text):
+            if not edits:
+                continue
+            counts[rule] += 1
+            for start, end, replacement in edits:
+                pieces.append(text[last:start])
+                pieces.append(replacement)
+                last = end
+        if not pieces:
+            return text, counts
+        pieces.append(text[last:])
+        return ''.join(pieces), counts
+
+    def describe(self):
+        """Возвращает описания включенных правил для логов."""
+        return [RULES[name].title for name in self.rules]
+
+
+def get_typographer(prepositions=None, months=None, rules=None):
+    """
+    Возвращает скомпилированный набор правил из кэша или создает новый.
+
+    Кэш ограничен по размеру и вытесняет давно не использованные наборы.
+
+    Args:
+        prepositions (iterable, optional): Список предлогов. По умолчанию используется PREPOSITIONS.
+        months (iterable, optional): Список месяцев. По умолчанию используется MONTHS.
+        rules (dict, optional): Настройки правил (см. rules.normalize_rules). По умолчанию -
+                                настройки из реестра правил.
+
+    Returns:
+        Typographer: Скомпилированный набор правил
+    """
+    if prepositions is None:
+        prepositions = PREPOSITIONS
+    if months is None:
+        months = MONTHS
+    # Словарь настроек не хешируется, поэтому ключом кэша служит его запись в JSON
+    settings = json.dumps(normalize_rules(rules), ensure_ascii=False, sort_keys=True)
+    return _cached_typographer(frozenset(prepositions), frozenset(months), settings)
+
+
+@lru_cache(maxsize=TYPOGRAPHER_CACHE_SIZE)
+def _cached_typographer(prepositions, months, settings):
+    return Typographer(prepositions, months, json.loads(settings))
+
+
+def process_xml(content, typographer):
+    """
+    Применяет правила только к тексту внутри элементов w:t части WordprocessingML.
+
+    XML просматривается один раз. Текст всех run-ов абзаца склеивается, поэтому
+    предлог в конце одного run-а обрабатывается, даже если пробел после него стоит
+    в начале следующего run-а. Разметка (имена тегов, атрибуты, пространства имен)
+    правилами не затрагивается. Элементы w:tab, w:br и подобные разрывают текст,
+    и совпадения через них не ищутся.
+
+    Args:
+        content (str): Содержимое XML части (document.xml, header1.xml и т.п.)
+        typographer (Typographer): Скомпилированный набор правил
+
+    Returns:
+        tuple: (обработанное содержимое, словарь с числом замен по каждому правилу)
+    """
+    rewriter = XmlTextRewriter(typographer)
+    head = rewriter.feed(content)
+    return head + rewriter.finish(), rewriter.counts
+
+
+class XmlTextRewriter:
+    """
+    Потоковое применение правил к XML части WordprocessingML.
+
+    Содержимое подается кусками произвольного размера через feed(), обработанный
+    XML возвращается по мере готовности. В памяти остается только необработанный
+    хвост: незавершенный тег и текст текущего абзаца. Если задан размер окна
+    и хвост его превышает, уже проверенное начало длинного абзаца фиксируется,
+    а для продолжения поиска сохраняется max_match_length символов текста.
+    Результат не зависит от того, как содержимое разбито на куски.
+    """
+
+    def __init__(self, typographer, window=None, analysis=None):
+        """
+        Args:
+            typographer (Typographer): Скомпилированный набор правил
+            window (int, optional): Размер необработанного хвоста в символах, после которого
+                                    фиксируется начало абзаца. None - абзац всегда целиком.
+            analysis (DocumentAnalysis, optional): Режим анализа: найденные места передаются
+                                                   в analysis, а XML возвращается без изменений.
+        """
+        self.typographer = typographer
+        self.window = window
+        self.analysis = analysis
+        self.counts = dict.fromkeys(RULE_NAMES, 0)
+        self._buffer = ''
+        # Позиция начала буфера во всем XML; все остальные позиции - тоже во всем XML
+        self._base = 0
+        # До какой позиции разобраны токены
+        self._scanned = 0
+        # Начало текста открытого элемента w:t или None
+        self._text_start = None
+        # Необработанные фрагменты текста текущего абзаца: [позиция, длина] или None для разрыва
+        self._segments = []
+        # Последний уже обработанный символ текста абзаца (нужен для проверки границы слова)
+        self._context = ''
+        # Правки, еще не перенесенные в результат: (начало, конец, замена)
+        self._edits = []
+
+    def feed(self, chunk):
+        """
+        Принимает очередной кусок XML.
+
+        Args:
+            chunk (str): Продолжение содержимого части
+
+        Returns:
+            str: Обработанный XML, который больше не может измениться (возможно, пустой)
+        """
+        self._buffer += chunk
+        # Токен, начавшийся до последнего '<', в буфере уже целиком; если и последний
+        # тег закрыт (или тегов в буфере нет), дальше может идти только текст
+        last = self._buffer.rfind('<')
+        if last == -1 or self._buffer.find('>', last) != -1:
+            last = len(self._buffer)
+        limit = self._base + last
+        if limit > self._scanned:
+            self._scan(limit)
+
+        if self.window is not None and self._base + len(self._buffer) - self._safe_position() > self.window:
+            self._commit_partial()
+        return self._emit(self._safe_position())
+
+    def finish(self):
+        """
+        Завершает обработку.
+
+        Returns:
+            str: Оставшийся обработанный XML
+        """
+        self._scan(self._base + len(self._buffer))
+        self._text_start = None
+        if self._segments:
+            self._apply_rules(final=True)
+        return self._emit(self._base + len(self._buffer))
+
+    def _scan(self, limit):
+        """Разбирает токены XML от уже разобранной позиции до limit."""
+        base = self._base
+        buffer = self._buffer
+        for token in _XML_TOKEN_RE.finditer(buffer, self._scanned - base, limit - base):
+            kind = token.lastgroup
+            if kind == 'text_open':
+                self._text_start = base + token.end()
+            elif kind == 'text_close':
+                start = self._text_start
+                self._text_start = None
+                # Текстом считается только содержимое w:t без вложенной разметки
+                if start is not None and base + token.start() > start \
+                        and buffer.find('<', start - base, token.start()) == -1:
+                    self._segments.append([start, base + token.start() - start])
+            elif kind == 'separator':
+                if self._segments and self._segments[-1] is not None:
+                    self._segments.append(None)
+            else:
+                if self._segments:
+                    self._apply_rules(final=True)
+                self._context = ''
+        self._scanned = limit
+
+    def _commit_partial(self):
+        """Фиксирует начало длинного абзаца, не дожидаясь его конца."""
+        if self._text_start is not None:
+            # Текст открытого w:t, который еще не закрыт в пределах буфера
+            end = self._buffer.find('<', self._text_start - self._base)
+            end = self._base + (len(self._buffer) if end == -1 else end)
+            if end > self._text_start:
+                self._segments.append([self._text_start, end - self._text_start])
+                self._text_start = end
+        if self._segments:
+            self._apply_rules(final=False)
+
+    def _apply_rules(self, final):
+        """
+        Применяет правила к накопленному тексту абзаца и переносит правки в координаты XML.
+
+        Args:
+            final (bool): Абзац закончился. Иначе обрабатываются только совпадения,
+                          начинающиеся не ближе max_match_length символов к концу текста.
+        """
+        segments = self._segments
+        parts = [self._context]
+        # Для каждого фрагмента: позиция начала в склеенном тексте
+        text_starts = []
+        position = len(self._context)
+        for segment in segments:
+            text_starts.append(position)
+            if segment is None:
+                parts.append(_TEXT_BREAK)
+                position += 1
+            else:
+                xml_start, length = segment
+                parts.append(self._buffer[xml_start - self._base:xml_start - self._base + length])
+                position += length
+        text = ''.join(parts)
+
+        # Совпадение, начавшееся до cut, не зависит от еще не полученного текста
+        # (+1 символ на проверку границы слова после совпадения)
+        cut = len(text) if final else len(text) - self.typographer.max_match_length - 1
+        if cut <= len(self._context):
+            return
+
+        resume = len(self._context)
+        analysis = self.analysis
+        for rule, start, end, edits in self.typographer.iter_matches(text, len(self._context)):
+            if start >= cut:
+                break
+            resume = end
+            if not edits:
+                if analysis is not None:
+                    analysis.add_match(rule, text[start:end], pending=False)
+                continue
+            mapped = []
+            for edit_start, edit_end, replacement in edits:
+                index = bisect_right(text_starts, edit_start) - 1
+                # Правка должна целиком лежать в одном фрагменте текста
+                segment = segments[index]
+                if segment is None or edit_end > text_starts[index] + segment[1]:
+                    break
+                shift = segment[0] - text_starts[index]
+                mapped.append((edit_start + shift, edit_end + shift, replacement))
+            else:
+                self.counts[rule] += 1
+                if analysis is None:
+                    self._edits.extend(mapped)
+                else:
+                    analysis.add_match(rule, text[start:end], pending=True)
+
+        if final:
+            self._segments = []
+            self._context = ''
+            return
+
+        # Отбрасываем обработанный текст, оставляя фрагменты начиная с позиции resume
+        resume = max(resume, cut)
+        self._context = text[resume - 1]
+        if resume >= len(text):
+            self._segments = []
+            return
+        index = bisect_right(text_starts, resume) - 1
+        segment = segments[index]
+        rest = segments[index + 1:]
+        if segment is not None:
+            offset = resume - text_starts[index]
+            segment = [segment[0] + offset, segment[1] - offset]
+        self._segments = [segment] + rest
+
+    def _safe_position(self):
+        """Возвращает позицию, до которой XML уже не изменится."""
+        position = self._scanned
+        for segment in self._segments:
+            if segment is not None:
+                position = min(position, segment[0])
+                break
+        if self._text_start is not None:
+            position = min(position, self._text_start)
+        return position
+
+    def _emit(self, position):
+        """Возвращает XML до позиции position с примененными правками и убирает его из буфера."""
+        size = position - self._base
+        if size <= 0:
+            return ''
+        if not self._edits:
+            pieces = [self._buffer[:size]]
+        else:
+            pieces = []
+            last = 0
+            applied = 0
+            for start, end, replacement in self._edits:
+                if start >= position:
+                    break
+                pieces.append(self._buffer[last:start - self._base])
+                pieces.append(replacement)
+                last = end - self._base
+                applied += 1
+            pieces.append(self._buffer[last:size])
+            del self._edits[:applied]
+        self._buffer = self._buffer[size:]
+        self._base = position
+        return ''.join(pieces)
+
+
+def fix_hanging_prepositions_and_dates(input_file, output_file, prepositions=None, months=None, progress_callback=None,
+                                       compresslevel=DEFAULT_COMPRESSLEVEL, typographer=None):
     """
     Заменяет обычные пробелы после предлогов и в датах на неразрывные в DOCX документе.
 
@@ -39,16 +493,58 @@ def fix_hanging_prepositions_and_dates(input_file, output_file, prepositions=Non
         months (list, optional): Список месяцев для обработки дат. По умолчанию None (используется MONTHS).
         progress_callback (callable, optional): Функция обратного вызова для отображения прогресса.
                                               Принимает значение от 0.0 до 1.0.
+        compresslevel (int, optional): Уровень сжатия deflate (0-9) для переписанных XML частей.
+                                       Остальные части копируются без повторного сжатия.
+        typographer (Typographer, optional): Готовый набор правил. Если указан, prepositions и months
+                                             не используются, а правила не компилируются заново.
 
     Returns:
         bool: True если обработка успешна, иначе False
     """
-    # Проверяем, были ли предоставлены предлоги и месяцы, иначе используем значения по умолчанию
-    if prepositions is None:
-        prepositions = PREPOSITIONS
+    # Берем готовый набор правил или получаем его из кэша по спискам предлогов и месяцев
+    if typographer is None:
+        typographer = get_typographer(prepositions, months)
 
-    if months is None:
-        months = MONTHS
+    process_docx(input_file, output_file, typographer, progress_callback, compresslevel)
+    return True
+
+
+def process_docx(input_file, output_file, typographer, progress_callback=None, compresslevel=DEFAULT_COMPRESSLEVEL,
+                 metrics=None, memory_budget=None, checkpoint=None, prescan=True, hard_link=False,
+                 use_mmap=False):
+    """
+    Обрабатывает все части DOCX документа с текстом за одну перезапись архива.
+
+    Кроме основного документа обрабатываются колонтитулы, сноски, концевые сноски
+    и примечания. Части с текстом обрабатываются параллельно, пока остальные части
+    копируются в выходной архив. Если задан бюджет памяти, части обрабатываются
+    по очереди, а слишком большие - потоково, кусками ограниченного размера.
+
+    Args:
+        input_file (str): Путь к исходному DOCX файлу
+        output_file (str): Путь для сохранения обработанного файла
+        typographer (Typographer): Скомпилированный набор правил
+        progress_callback (callable, optional): Функция обратного вызова для отображения прогресса
+        compresslevel (int, optional): Уровень сжатия deflate (0-9) для переписанных XML частей
+        metrics (FileMetrics, optional): Объект для сбора времени этапов, объема данных и числа замен
+        memory_budget (int, optional): Примерный предел памяти на обработку частей в байтах.
+                                       По умолчанию части обрабатываются целиком в памяти.
+        checkpoint (callable, optional): Вызывается между этапами обработки; может приостановить
+                                         обработку или прервать ее исключением ProcessingCancelled.
+                                         Недописанный выходной файл при этом удаляется.
+        prescan (bool, optional): Сначала быстро проверить, есть ли в документе что заменять.
+                                  Если нет, исходный файл копируется без перепаковки архива.
+        hard_link (bool, optional): Документ, в котором нечего заменять, сохранить жесткой ссылкой
+                                    на исходный файл вместо копии (если файловая система позволяет).
+                                    Изменение такого результата изменит и исходный файл.
+        use_mmap (bool, optional): Читать исходный архив от archive.MMAP_MIN_SIZE байт
+                                   через отображение в память (см. DocxPackage).
+
+    Returns:
+        dict: Число замен по правилам для каждой обработанной части, {имя части: {правило: число}}.
+              Если документ сохранен без изменений, в metrics.unchanged - UNCHANGED_COPY или UNCHANGED_LINK.
+    """
+    start_time = time.perf_counter()
 
     # Проверяем входной файл
     input_path = Path(input_file)
@@ -60,120 +556,552 @@ def fix_hanging_prepositions_and_dates(input_file, output_file, prepositions=Non
         logging.error(f"Ошибка: Файл должен иметь расширение .docx: {input_file}")
         raise ValueError(f"Файл должен иметь расширение .docx: {input_file}")
 
-    logging.info(f"Обработка файла: {input_file}")
-    logging.info(f"Будет сохранено как: {output_file}")
-    logging.info(f"Используемые предлоги: {', '.join(prepositions)}")
-    logging.info(f"Обработка дат с месяцами: {', '.join(months)}")
+    logging.debug(f"Обработка файла: {input_file} -> {output_file}")
+
+    # Потоковая перезапись не позволяет писать результат поверх исходного файла
+    if Path(output_file).resolve() == input_path.resolve():
+        logging.error(f"Ошибка: Выходной файл совпадает с исходным: {output_file}")
+        raise ValueError(f"Выходной файл совпадает с исходным: {output_file}")
+
+    # Результат прошлого запуска может быть жесткой ссылкой на исходный файл:
+    # запись в него изменила бы исходник, поэтому ссылка удаляется
+    if os.path.exists(output_file) and os.path.samefile(output_file, input_file):
+        os.remove(output_file)
 
-    # Создаем временную директорию
-    temp_dir = tempfile.mkdtemp()
-    logging.info(f"Создана временная директория: {temp_dir}")
+    output_created = False
 
     try:
-        # Проверяем, является ли файл валидным ZIP архивом (DOCX - это ZIP файл)
-        try:
-            with zipfile.ZipFile(input_file, 'r') as zip_check:
-                # Проверяем, есть ли в нём основные компоненты DOCX
-                file_list = zip_check.namelist()
-                required_files = ['[Content_Types].xml', 'word/document.xml']
-                for req_file in required_files:
-                    if not any(f == req_file or f.endswith('/' + req_file) for f in file_list):
-                        logging.error(
-                            f"Ошибка: DOCX файл поврежден или имеет неверную структуру. Отсутствует {req_file}")
-                        raise ValueError(f"DOCX файл поврежден или имеет неверную структуру. Отсутствует {req_file}")
-        except zipfile.BadZipFile:
-            logging.error(f"Ошибка: Файл {input_file} не является валидным DOCX файлом (поврежден ZIP архив)")
-            raise ValueError(f"Файл {input_file} не является валидным DOCX файлом")
-
-        # Сообщаем о прогрессе (10%)
-        if progress_callback:
-            progress_callback(0.1)
+        # Архив открывается и проверяется один раз; тот же объект используется
+        # для поиска частей с текстом, чтения и перезаписи
+        with _stage(metrics, 'validate'):
+            package = DocxPackage(input_file, use_mmap=use_mmap)
+        if package.mapped is not None:
+            logging.debug(f"Исходный архив читается через отображение в память: {input_file}")
+        with package:
+            candidates = True
+            if prescan:
+                with _stage(metrics, 'prescan'):
+                    candidates = has_candidates(package, typographer, checkpoint)
+            output_created = True
+            if candidates:
+                with open(output_file, 'wb') as destination:
+                    part_counts = _rewrite_package(package, destination, typographer, progress_callback,
+                                                   compresslevel, metrics, memory_budget, checkpoint)
+            else:
+                with _stage(metrics, 'copy'):
+                    unchanged = _save_unchanged(input_file, output_file, hard_link)
+                part_counts = {name: dict.fromkeys(RULE_NAMES, 0) for name in package.text_parts()}
+                if metrics is not None:
+                    metrics.unchanged = unchanged
+                logging.debug(f"Заменять нечего, исходный файл сохранен без изменений ({unchanged}): {output_file}")
 
-        # Распаковываем DOCX во временную директорию
-        logging.info("Распаковка документа...")
-        with zipfile.ZipFile(input_file, 'r') as zip_ref:
-            zip_ref.extractall(temp_dir)
+        if metrics is not None:
+            metrics.bytes_read = os.path.getsize(input_file)
+            metrics.bytes_written = os.path.getsize(output_file)
+            metrics.add_part_counts(part_counts)
+            metrics.total = time.perf_counter() - start_time
 
-        # Сообщаем о прогрессе (20%)
+        total = sum(sum(counts.values()) for counts in part_counts.values())
+        logging.info(f"Документ обработан: {input_file} -> {output_file}, замен: {total}")
+
+        # Сообщаем о завершении (100%)
         if progress_callback:
-            progress_callback(0.2)
+            progress_callback(1.0)
 
-        # Путь к document.xml
-        document_xml_path = os.path.join(temp_dir, 'word', 'document.xml')
+        return part_counts
 
-        if not os.path.exists(document_xml_path):
-            logging.error("Ошибка: Структура DOCX файла повреждена: не найден document.xml")
-            raise ValueError("Структура DOCX файла повреждена: не найден document.xml")
+    except ProcessingCancelled:
+        logging.info(f"Обработка файла остановлена: {input_file}")
+        if output_created and os.path.exists(output_file):
+            os.remove(output_file)
+        raise
+
+    except Exception as e:
+        logging.error(f"Ошибка при обработке файла {input_file}: {str(e)}")
+        # Расширенная информация об ошибке для отладки (-vv)
+        logging.debug("Трассировка ошибки", exc_info=True)
+        # Не оставляем после себя недописанный архив
+        if output_created and os.path.exists(output_file):
+            os.remove(output_file)
+        raise e
+
+
+def process_stream(source, destination, typographer=None, progress_callback=None,
+                   compresslevel=DEFAULT_COMPRESSLEVEL, name='<stream>', metrics=None, memory_budget=None,
+                   prescan=True):
+    """
+    Обрабатывает DOCX документ из двоичного потока и записывает результат в другой поток.
 
-        logging.info("Чтение и обработка document.xml...")
-        # Читаем document.xml
+    Диск не используется: если исходный поток не поддерживает произвольный доступ
+    (например, сетевой ответ), он целиком читается в память.
+
+    Args:
+        source (file): Двоичный поток для чтения с исходным документом
+        destination (file): Двоичный поток для записи результата
+        typographer (Typographer, optional): Набор правил. По умолчанию - правила для PREPOSITIONS и MONTHS.
+        progress_callback (callable, optional): Функция обратного вызова для отображения прогресса
+        compresslevel (int, optional): Уровень сжатия deflate (0-9) для переписанных XML частей
+        name (str, optional): Имя документа для сообщений
+        metrics (FileMetrics, optional): Объект для сбора времени этапов, объема данных и числа замен
+        memory_budget (int, optional): Примерный предел памяти на обработку частей в байтах
+        prescan (bool, optional): Сначала быстро проверить, есть ли в документе что заменять.
+                                  Если нет, исходный документ копируется в выходной поток как есть.
+
+    Returns:
+        dict: Число замен по правилам для каждой обработанной части, {имя части: {правило: число}}
+    """
+    start_time = time.perf_counter()
+    if typographer is None:
+        typographer = get_typographer()
+
+    seekable = getattr(source, 'seekable', None)
+    if seekable is None or not seekable():
+        source = io.BytesIO(source.read())
+
+    logging.debug(f"Обработка документа из потока: {name}")
+    start_position = source.tell()
+    with _stage(metrics, 'validate'):
+        package = DocxPackage(source, name)
+    with package:
+        candidates = True
+        if prescan:
+            with _stage(metrics, 'prescan'):
+                candidates = has_candidates(package, typographer)
+        if candidates:
+            part_counts = _rewrite_package(package, destination, typographer, progress_callback, compresslevel,
+                                           metrics, memory_budget)
+        else:
+            with _stage(metrics, 'copy'):
+                source.seek(start_position)
+                shutil.copyfileobj(source, destination)
+            part_counts = {part: dict.fromkeys(RULE_NAMES, 0) for part in package.text_parts()}
+            if metrics is not None:
+                metrics.unchanged = UNCHANGED_COPY
+
+    if metrics is not None:
+        metrics.bytes_read = source.seek(0, io.SEEK_END)
+        metrics.bytes_written = _stream_position(destination)
+        metrics.add_part_counts(part_counts)
+        metrics.total = time.perf_counter() - start_time
+
+    if progress_callback:
+        progress_callback(1.0)
+    return part_counts
+
+
+def process_bytes(data, typographer=None, compresslevel=DEFAULT_COMPRESSLEVEL, name='<bytes>'):
+    """
+    Обрабатывает DOCX документ, переданный в памяти.
+
+    Args:
+        data (bytes): Содержимое исходного DOCX файла
+        typographer (Typographer, optional): Набор правил. По умолчанию - правила для PREPOSITIONS и MONTHS.
+        compresslevel (int, optional): Уровень сжатия deflate (0-9) для переписанных XML частей
+        name (str, optional): Имя документа для сообщений
+
+    Returns:
+        tuple: (содержимое обработанного DOCX файла, число замен по частям)
+    """
+    destination = io.BytesIO()
+    part_counts = process_stream(io.BytesIO(data), destination, typographer, compresslevel=compresslevel, name=name)
+    return destination.getvalue(), part_counts
+
+
+class DocumentAnalysis:
+    """
+    Результат анализа документа без его изменения.
+
+    Хранит число будущих замен по правилам и по частям документа, число замен
+    после каждого предлога и число мест, где неразрывные пробелы уже стоят.
+    """
+
+    def __init__(self):
+        # Число будущих замен по правилам для каждой части, {имя части: {правило: число}}
+        self.part_counts = {}
+        # Число будущих замен после каждого предлога
+        self.prepositions = Counter()
+        # Число мест, где неразрывные пробелы уже стоят, по правилам
+        self.processed = dict.fromkeys(RULE_NAMES, 0)
+
+    def add_match(self, rule, text, pending):
+        """
+        Учитывает найденное место.
+
+        Args:
+            rule (str): Имя правила
+            text (str): Текст совпадения
+            pending (bool): Пробелы будут заменены; иначе неразрывные пробелы уже стоят
+        """
+        if not pending:
+            self.processed[rule] += 1
+        elif rule == 'preposition':
+            # Совпадение - предлог и пробел после него
+            self.prepositions[text[:-1]] += 1
+
+    @property
+    def counts(self):
+        """Число будущих замен по правилам во всем документе."""
+        totals = dict.fromkeys(RULE_NAMES, 0)
+        for counts in self.part_counts.values():
+            for rule, count in counts.items():
+                totals[rule] += count
+        return totals
+
+    @property
+    def replacements(self):
+        """Общее число будущих замен."""
+        return sum(self.counts.values())
+
+    @property
+    def status(self):
+        """
+        Состояние документа: STATUS_PENDING - есть что заменить, STATUS_PROCESSED -
+        документ уже обработан (все найденные места с неразрывными пробелами),
+        STATUS_CLEAN - мест для замены нет.
+        """
+        if self.replacements:
+            return STATUS_PENDING
+        if any(self.processed.values()):
+            return STATUS_PROCESSED
+        return STATUS_CLEAN
+
+
+def analyze_docx(source, typographer=None, name=None, metrics=None, checkpoint=None, use_mmap=False):
+    """
+    Анализирует DOCX документ без записи результата.
+
+    Части с текстом распаковываются и просматриваются потоково, кусками
+    ограниченного размера; выходной архив не создается. Число замен совпадает
+    с тем, что сделала бы обработка документа с тем же набором правил.
+
+    Args:
+        source (str | file): Путь к DOCX файлу или двоичный поток с поддержкой seek
+        typographer (Typographer, optional): Набор правил. По умолчанию - правила для PREPOSITIONS и MONTHS.
+        name (str, optional): Имя документа для сообщений
+        metrics (FileMetrics, optional): Объект для сбора времени этапов и объема данных
+        checkpoint (callable, optional): Вызывается перед каждым куском; может прервать
+                                         анализ исключением ProcessingCancelled
+        use_mmap (bool, optional): Читать файл от archive.MMAP_MIN_SIZE байт через
+                                   отображение в память (см. DocxPackage).
+
+    Returns:
+        DocumentAnalysis: Результат анализа
+    """
+    start_time = time.perf_counter()
+    if typographer is None:
+        typographer = get_typographer()
+
+    analysis = DocumentAnalysis()
+    with _stage(metrics, 'validate'):
+        package = DocxPackage(source, name, use_mmap)
+    with package:
+        with _stage(metrics, 'validate'):
+            text_parts = package.text_parts()
+        for part in text_parts:
+            rewriter = XmlTextRewriter(typographer, window=STREAM_CHUNK_SIZE, analysis=analysis)
+            decoder = codecs.getincrementaldecoder('utf-8')()
+            try:
+                with package.zip.open(package.members[part]) as stream:
+                    while True:
+                        if checkpoint is not None:
+                            checkpoint()
+                        with _stage(metrics, 'read'):
+                            data = stream.read(STREAM_CHUNK_SIZE)
+                        with _stage(metrics, 'rules'):
+                            rewriter.feed(decoder.decode(data, final=not data))
+                            if not data:
+                                rewriter.finish()
+                        if not data:
+                            break
+            except UnicodeDecodeError:
+                logging.error(f"Ошибка: Невозможно прочитать файл {part}, возможно файл поврежден")
+                raise ValueError(f"Невозможно прочитать файл {part}, возможно файл поврежден")
+            analysis.part_counts[part] = rewriter.counts
+
+    if metrics is not None:
+        if isinstance(source, (str, os.PathLike)):
+            metrics.bytes_read = os.path.getsize(source)
+        metrics.add_part_counts(analysis.part_counts)
+        metrics.total = time.perf_counter() - start_time
+    return analysis
+
+
+def has_candidates(package, typographer, checkpoint=None):
+    """
+    Быстро проверяет, есть ли в документе пробелы для замены.
+
+    Части с текстом читаются потоково. Из XML берется только текст элементов w:t,
+    склеенный в пределах абзаца так же, как при обработке, и в нем ищется хотя бы
+    одно совпадение с обычным (не неразрывным) пробелом. Проверка может найти место,
+    которое обработка пропустит (например, пробел на границе фрагментов с разрывом
+    между ними), но не наоборот: если проверка ничего не нашла, обработка ничего не изменит.
+
+    Args:
+        package (DocxPackage): Открытый исходный архив
+        typographer (Typographer): Скомпилированный набор правил
+        checkpoint (callable, optional): Вызывается перед каждым куском
+
+    Returns:
+        bool: True, если в документе есть хотя бы одно место для замены
+    """
+    if typographer.pattern is None:
+        return False
+    # Сколько символов текста сохранять между кусками: совпадение может начаться
+    # в конце предыдущего куска, и еще один символ нужен для проверки границы слова
+    overlap = typographer.max_match_length + 1
+
+    for part in package.text_parts():
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        pending = ''
+        context = ''
+        with package.zip.open(package.members[part]) as stream:
+            while True:
+                if checkpoint is not None:
+                    checkpoint()
+                data = stream.read(STREAM_CHUNK_SIZE)
+                try:
+                    xml = pending + decoder.decode(data, final=not data)
+                except UnicodeDecodeError:
+                    # Поврежденную часть проверит обработка и сообщит об ошибке
+                    return True
+                cut = _complete_prefix(xml) if data else len(xml)
+                pending = xml[cut:]
+
+                text = context + ''.join(content or (_TEXT_BREAK if separator else '')
+                                         for content, separator in _PRESCAN_TOKEN_RE.findall(xml, 0, cut))
+                for _, _, _, edits in typographer.iter_matches(text, min(len(context), 1)):
+                    if edits:
+                        return True
+                context = text[-overlap:]
+                if not data:
+                    break
+    return False
+
+
+def _complete_prefix(xml):
+    """
+    Возвращает длину начала куска XML, в котором нет незавершенных тегов и элементов w:t.
+
+    Конец куска может обрывать тег или текст элемента w:t; такой хвост переносится
+    в следующий кусок.
+    """
+    last = xml.rfind('<')
+    if last == -1:
+        # Весь кусок - продолжение текста; без открывающего тега он проверке не нужен
+        return len(xml)
+    if xml.find('>', last) != -1:
+        # Последний тег завершен; если это открывающий w:t, его текст может продолжиться
+        return last if _TEXT_OPEN_RE.match(xml, last) else len(xml)
+    # Последний тег оборван; если перед ним открывающий w:t с текстом, переносим и его
+    previous = xml.rfind('<', 0, last)
+    if previous != -1 and _TEXT_OPEN_RE.match(xml, previous):
+        return previous
+    return last
+
+
+def _save_unchanged(input_file, output_file, hard_link=False):
+    """
+    Сохраняет исходный файл как результат без перепаковки архива.
+
+    Returns:
+        str: UNCHANGED_LINK, если создана жесткая ссылка, иначе UNCHANGED_COPY
+    """
+    if os.path.exists(output_file):
+        os.remove(output_file)
+    if hard_link:
         try:
-            with open(document_xml_path, 'r', encoding='utf-8') as file:
-                content = file.read()
-        except UnicodeDecodeError:
-            logging.error("Ошибка: Невозможно прочитать файл document.xml, возможно файл поврежден")
-            raise ValueError("Невозможно прочитать файл document.xml, возможно файл поврежден")
+            os.link(input_file, output_file)
+            return UNCHANGED_LINK
+        except OSError as e:
+            # Другая файловая система или ссылки не поддерживаются
+            logging.debug(f"Не удалось создать жесткую ссылку {output_file}, файл будет скопирован: {e}")
+    shutil.copyfile(input_file, output_file)
+    return UNCHANGED_COPY
 
-        # Сообщаем о прогрессе (40%)
-        if progress_callback:
-            progress_callback(0.4)
 
-        # Неразрывный пробел
-        non_breaking_space = chr(160)  # Символ NO-BREAK SPACE (Unicode 00A0)
+def _rewrite_package(package, destination, typographer, progress_callback=None, compresslevel=DEFAULT_COMPRESSLEVEL,
+                     metrics=None, memory_budget=None, checkpoint=None):
+    """
+    Переписывает открытый DOCX архив в выходной поток, обрабатывая части с текстом.
 
-        # 1. Заменяем пробелы после предлогов на неразрывные
-        pattern_prepositions = r'\b(' + '|'.join(map(re.escape, prepositions)) + r')\s'
-        content, count_prepositions = re.subn(pattern_prepositions, r'\1' + non_breaking_space, content)
-        logging.info(f"Заменено {count_prepositions} обычных пробелов после предлогов на неразрывные")
+    Args:
+        package (DocxPackage): Открытый и проверенный исходный архив
+        destination (file): Двоичный поток для записи результата
+        typographer (Typographer): Скомпилированный набор правил
+        progress_callback (callable, optional): Функция обратного вызова для отображения прогресса
+        compresslevel (int, optional): Уровень сжатия deflate (0-9) для переписанных XML частей
+        metrics (FileMetrics, optional): Объект для сбора времени этапов
+        memory_budget (int, optional): Примерный предел памяти на обработку частей в байтах
+        checkpoint (callable, optional): Вызывается перед каждой частью архива
 
-        # Сообщаем о прогрессе (60%)
-        if progress_callback:
-            progress_callback(0.6)
+    Returns:
+        dict: Число замен по правилам для каждой обработанной части
+    """
+    # Находим части с текстом: основной документ, колонтитулы, сноски, примечания
+    with _stage(metrics, 'validate'):
+        text_parts = package.text_parts()
+    logging.debug(f"Части с текстом: {', '.join(text_parts)}")
+
+    # Части, которые не помещаются в бюджет памяти целиком, обрабатываются потоково
+    streamed = set()
+    if memory_budget is not None:
+        streamed = {name for name in text_parts
+                    if package.members[name].file_size * PART_MEMORY_FACTOR > memory_budget}
+        if streamed:
+            logging.debug(f"Потоковая обработка частей: {', '.join(sorted(streamed))}")
 
-        # 2. Заменяем пробелы в датах формата "26 января 1994" на неразрывные
-        # Создаем регулярное выражение для дат: число + пробел + месяц + пробел + год
-        pattern_dates = r'(\b\d{1,2})\s(' + '|'.join(map(re.escape, months)) + r')\s(\d{4})\b'
+    # Сообщаем о прогрессе (10%)
+    if progress_callback:
+        progress_callback(0.1)
 
-        # В замене сохраняем число, месяц и год, но меняем обычные пробелы на неразрывные
-        content, count_dates = re.subn(pattern_dates,
-                                       r'\1' + non_breaking_space + r'\2' + non_breaking_space + r'\3',
-                                       content)
-        logging.info(f"Заменено {count_dates} обычных пробелов в датах на неразрывные")
+    # Части архива переписываются напрямую из исходного ZIP в выходной,
+    # без распаковки во временную директорию
+    with zipfile.ZipFile(destination, 'w') as zout, \
+            ThreadPoolExecutor(max_workers=min(len(text_parts), PART_WORKERS)) as executor:
+        # Части с текстом обрабатываются в фоне, пока копируются остальные части.
+        # С бюджетом памяти части обрабатываются по очереди, чтобы не держать их все сразу
+        if len(text_parts) > 1 and memory_budget is None:
+            processed = {}
+            for name in text_parts:
+                with _stage(metrics, 'read'):
+                    data = package.read(name)
+                processed[name] = executor.submit(_process_part, name, data, typographer, metrics)
+        else:
+            processed = {}
+
+        # Сообщаем о прогрессе (20%)
+        if progress_callback:
+            progress_callback(0.2)
+
+        part_counts = {}
+        for info in package.ordered_members():
+            if checkpoint is not None:
+                checkpoint()
+            if info.filename in processed:
+                content, part_counts[info.filename] = processed[info.filename].result()
+                with _stage(metrics, 'write'):
+                    write_member(zout, info, content, compresslevel)
+            elif info.filename in streamed:
+                part_counts[info.filename] = _stream_part(package, zout, info, typographer, compresslevel,
+                                                          memory_budget, metrics, checkpoint)
+            elif info.filename in text_parts:
+                with _stage(metrics, 'read'):
+                    data = package.read(info.filename)
+                content, part_counts[info.filename] = _process_part(info.filename, data, typographer, metrics)
+                with _stage(metrics, 'write'):
+                    write_member(zout, info, content, compresslevel)
+            else:
+                # Неизменяемые части (изображения, стили, шрифты) копируются
+                # в сжатом виде, без распаковки и повторного сжатия
+                with _stage(metrics, 'copy'):
+                    copy_member_raw(package.zip, zout, info)
 
         # Сообщаем о прогрессе (80%)
         if progress_callback:
             progress_callback(0.8)
 
-        # Записываем обратно измененный document.xml
-        with open(document_xml_path, 'w', encoding='utf-8') as file:
-            file.write(content)
+    return part_counts
 
-        logging.info("Создание нового DOCX файла...")
-        # Создаем новый DOCX файл
-        with zipfile.ZipFile(output_file, 'w') as outzip:
-            for root, _, files in os.walk(temp_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, temp_dir)
-                    outzip.write(file_path, arcname)
 
-        logging.info(f"Документ успешно обработан и сохранен как {output_file}")
-        logging.info(f"Всего заменено пробелов: {count_prepositions + count_dates * 2}")
+def _process_part(name, data, typographer, metrics=None):
+    """
+    Заменяет пробелы после предлогов и в датах в XML части с текстом.
 
-        # Сообщаем о завершении (100%)
-        if progress_callback:
-            progress_callback(1.0)
+    Args:
+        name (str): Имя части в архиве (для сообщений)
+        data (bytes): Исходное содержимое части
+        typographer (Typographer): Скомпилированный набор правил
+        metrics (FileMetrics, optional): Объект для сбора времени этапов
+
+    Returns:
+        tuple: (обработанное содержимое в байтах, словарь с числом замен по каждому правилу)
+    """
+    try:
+        content = data.decode('utf-8')
+    except UnicodeDecodeError:
+        logging.error(f"Ошибка: Невозможно прочитать файл {name}, возможно файл поврежден")
+        raise ValueError(f"Невозможно прочитать файл {name}, возможно файл поврежден")
 
-        return True
+    # Все правила применяются за один проход, и только к тексту документа
+    with _stage(metrics, 'rules'):
+        content, counts = process_xml(content, typographer)
+    logging.debug(f"{name}: {format_counts(counts)}")
 
-    except Exception as e:
-        logging.error(f"Ошибка при обработке файла: {str(e)}")
-        # Выведем расширенную информацию об ошибке для отладки
-        import traceback
-        traceback.print_exc()
-        raise e
+    return content.encode('utf-8'), counts
+
+
+def _stream_part(package, zout, info, typographer, compresslevel, memory_budget, metrics=None, checkpoint=None):
+    """
+    Обрабатывает часть с текстом кусками, не распаковывая ее в память целиком.
+
+    Распаковка, применение правил и сжатие идут одновременно; в памяти остаются
+    текущий кусок и необработанный хвост XML (см. XmlTextRewriter). Результат
+    совпадает с обработкой части целиком.
+
+    Args:
+        package (DocxPackage): Открытый исходный архив
+        zout (zipfile.ZipFile): Выходной архив, открытый на запись
+        info (zipfile.ZipInfo): Обрабатываемая часть исходного архива
+        typographer (Typographer): Скомпилированный набор правил
+        compresslevel (int): Уровень сжатия deflate (0-9)
+        memory_budget (int): Примерный предел памяти в байтах
+        metrics (FileMetrics, optional): Объект для сбора времени этапов
+        checkpoint (callable, optional): Вызывается перед каждым куском
+
+    Returns:
+        dict: Число замен по каждому правилу
+    """
+    name = info.filename
+    chunk_size = max(min(STREAM_CHUNK_SIZE, memory_budget // 8), MIN_STREAM_CHUNK_SIZE)
+    rewriter = XmlTextRewriter(typographer, window=max(memory_budget // 4, chunk_size))
+    decoder = codecs.getincrementaldecoder('utf-8')()
+
+    try:
+        with package.zip.open(info) as source, open_member_writer(zout, info, compresslevel) as target:
+            while True:
+                if checkpoint is not None:
+                    checkpoint()
+                with _stage(metrics, 'read'):
+                    data = source.read(chunk_size)
+                with _stage(metrics, 'rules'):
+                    content = rewriter.feed(decoder.decode(data, final=not data))
+                    if not data:
+                        content += rewriter.finish()
+                with _stage(metrics, 'write'):
+                    target.write(content.encode('utf-8'))
+                if not data:
+                    break
+    except UnicodeDecodeError:
+        logging.error(f"Ошибка: Невозможно прочитать файл {name}, возможно файл поврежден")
+        raise ValueError(f"Невозможно прочитать файл {name}, возможно файл поврежден")
 
-    finally:
-        # Удаляем временную директорию
-        logging.info(f"Удаление временной директории: {temp_dir}")
-        shutil.rmtree(temp_dir)
\ No newline at end of file
+    counts = rewriter.counts
+    logging.debug(f"{name}: {format_counts(counts)}")
+    return counts
+
+
+def format_counts(counts):
+    """
+    Описывает число замен по правилам для вывода.
+
+    Args:
+        counts (dict): Число замен по каждому правилу
+
+    Returns:
+        str: Например, "пробел после предлога: 12, пробелы в дате: 2" или "замен нет"
+    """
+    described = [f"{RULES[rule].title}: {count}" for rule, count in counts.items() if count]
+    return ', '.join(described) if described else "замен нет"
+
+
+def _stage(metrics, name):
+    """Возвращает замер этапа name или пустой контекст, если метрики не собираются."""
+    return metrics.stage(name) if metrics is not None else nullcontext()
+
+
+def _stream_position(stream):
+    """Возвращает текущую позицию потока или None, если поток ее не сообщает."""
+    try:
+        return stream.tell()
+    except (AttributeError, OSError):
+        return None
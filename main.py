@@ -4,48 +4,72 @@
 """
 Главный модуль программы для запуска приложения обработки висячих предлогов в DOCX документах.
 Настраивает логирование и запускает пользовательский интерфейс.
+
+Модули интерфейса (tkinter, ttkbootstrap) загружаются только при запуске интерфейса:
+рабочие процессы пула при запуске методом spawn заново импортируют этот модуль,
+и им графическая оболочка не нужна.
 """
 
+import argparse
 import logging
+import multiprocessing
 import os
 import sys
 from datetime import datetime
-from ui import Application
-import ttkbootstrap as ttk
 
+from logconfig import add_logging_arguments, setup_logging as setup_log_queue, verbosity_level
 
-def setup_logging():
-    """Настраивает логирование программы."""
-    # Создаем директорию для логов, если ее нет
-    logs_dir = "logs"
-    if not os.path.exists(logs_dir):
-        os.makedirs(logs_dir)
 
-    # Создаем имя файла лога с датой и временем
-    log_filename = os.path.join(logs_dir, f"app_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.log")
+def setup_logging(verbose=0, fmt='text', log_filename=None):
+    """
+    Настраивает логирование программы.
 
-    # Настраиваем логирование
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_filename, encoding='utf-8'),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
+    Записи выводятся в файл и на консоль отдельным потоком, поэтому интерфейс
+    и обработка не ждут записи на диск.
+
+    Args:
+        verbose (int, optional): Подробность: 0 - сведения, 1 и больше - отладка
+        fmt (str, optional): Формат записей: 'text' или 'json'
+        log_filename (str, optional): Файл лога. По умолчанию - новый файл в папке logs/
+    """
+    if log_filename is None:
+        # Создаем директорию для логов, если ее нет
+        logs_dir = "logs"
+        if not os.path.exists(logs_dir):
+            os.makedirs(logs_dir)
+
+        # Создаем имя файла лога с датой и временем
+        extension = 'jsonl' if fmt == 'json' else 'log'
+        log_filename = os.path.join(logs_dir, f"app_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.{extension}")
+
+    # Без консоли (pythonw) sys.stdout равен None, и записи идут только в файл
+    setup_log_queue(verbosity_level(verbose, logging.INFO), log_filename, sys.stdout, fmt)
 
     logging.info("Запуск программы обработки висячих предлогов")
     logging.info(f"Логи сохраняются в: {log_filename}")
 
 
+def parse_args(argv=None):
+    """Разбирает аргументы командной строки (подробность и формат логов)."""
+    parser = argparse.ArgumentParser(description="Обработка висячих предлогов и дат в DOCX документах")
+    add_logging_arguments(parser)
+    # Неизвестные аргументы (например, от упаковщика приложения) пропускаем
+    args, _ = parser.parse_known_args(argv)
+    return args
+
+
 def main():
     """Основная функция запуска программы."""
     # Настраиваем логирование
-    setup_logging()
+    args = parse_args()
+    setup_logging(args.verbose, args.log_format, args.log_file)
 
     try:
         # Запускаем UI приложение
         logging.info("Инициализация пользовательского интерфейса")
+        import ttkbootstrap as ttk
+        from ui import Application
+
         root = ttk.Window(themename="superhero")  # Темная тема
         root.title("Обработка висячих предлогов")
         app = Application(root)
@@ -60,4 +84,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # Нужно для пула процессов пакетной обработки в собранном приложении под Windows
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
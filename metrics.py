@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Модуль метрик обработки.
+Собирает по каждому файлу время этапов, объем прочитанных и записанных данных,
+число обработанных частей и замен, и передает записи в подключаемый приемник.
+"""
+
+import json
+import math
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def worker_peak_memory():
+    """
+    Возвращает пиковый объем памяти текущего процесса в байтах за все время его работы.
+
+    Рабочий процесс пула обрабатывает много файлов подряд, поэтому значение
+    относится не к последнему файлу, а к самому тяжелому из обработанных этим
+    процессом до сих пор.
+
+    Returns:
+        int: Пиковый RSS процесса или None, если платформа его не сообщает
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # В macOS значение в байтах, в Linux - в килобайтах
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def percentile(values, fraction):
+    """
+    Вычисляет перцентиль методом ближайшего ранга.
+
+    Args:
+        values (list): Значения
+        fraction (float): Доля от 0.0 до 1.0 (0.95 - 95-й перцентиль)
+
+    Returns:
+        float: Значение перцентиля или None для пустого списка
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(fraction * len(ordered)))
+    return ordered[rank - 1]
+
+
+class FileMetrics:
+    """
+    Метрики обработки одного файла.
+
+    Время этапов накапливается, поэтому этап, выполняемый несколько раз
+    (например, обработка каждой части с текстом), учитывается суммарно.
+    Объект можно передавать между процессами.
+    """
+
+    def __init__(self, input_file, output_file=None):
+        self.input_file = str(input_file)
+        self.output_file = str(output_file) if output_file is not None else None
+        self.stages = {}
+        self.total = 0.0
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.parts_processed = 0
+        self.replacements = {}
+        # Пиковый RSS рабочего процесса за все время его работы (worker_peak_memory), а не этого файла
+        self.worker_peak_memory = None
+        # Документ сохранен без перепаковки, так как заменять нечего: 'copy' или 'link'
+        self.unchanged = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """Замеряет время блока кода и добавляет его к этапу name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    def add_part_counts(self, part_counts):
+        """Учитывает число замен по частям документа."""
+        self.parts_processed += len(part_counts)
+        for counts in part_counts.values():
+            for rule, count in counts.items():
+                self.replacements[rule] = self.replacements.get(rule, 0) + count
+
+    def to_dict(self):
+        """Возвращает запись метрик в виде словаря для сериализации."""
+        return {
+            'input_file': self.input_file,
+            'output_file': self.output_file,
+            'total': round(self.total, 6),
+            'stages': {name: round(seconds, 6) for name, seconds in self.stages.items()},
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'parts_processed': self.parts_processed,
+            'replacements': dict(self.replacements),
+            'worker_peak_memory': self.worker_peak_memory,
+            'unchanged': self.unchanged,
+            'error': self.error,
+        }
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class MetricsSink:
+    """Приемник метрик. Подклассы переопределяют emit и при необходимости close."""
+
+    def emit(self, metrics):
+        """Принимает метрики очередного файла (FileMetrics)."""
+        raise NotImplementedError
+
+    def close(self):
+        """Освобождает ресурсы приемника."""
+
+
+class CallbackSink(MetricsSink):
+    """Передает метрики каждого файла в функцию обратного вызова."""
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def emit(self, metrics):
+        self.callback(metrics)
+
+
+class JsonLinesSink(MetricsSink):
+    """Дописывает метрики каждого файла отдельной строкой JSON в файл."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def emit(self, metrics):
+        self._file.write(json.dumps(metrics.to_dict(), ensure_ascii=False) + '\n')
+
+    def close(self):
+        self._file.close()
+
+
+class MetricsAggregator(MetricsSink):
+    """Накапливает метрики в памяти и строит сводку по пакету."""
+
+    def __init__(self):
+        self.records = []
+
+    def emit(self, metrics):
+        self.records.append(metrics)
+
+    def summary(self):
+        """
+        Возвращает сводку по всем принятым файлам.
+
+        Returns:
+            dict: Число файлов, ошибок и файлов без изменений, перцентили времени обработки файла (p50, p95, max),
+                  суммарное время этапов, объем данных, число замен по правилам
+                  и наибольший пиковый объем памяти рабочих процессов
+        """
+        latencies = [record.total for record in self.records if record.error is None]
+        stages = {}
+        replacements = {}
+        for record in self.records:
+            for name, seconds in record.stages.items():
+                stages[name] = stages.get(name, 0.0) + seconds
+            for rule, count in record.replacements.items():
+                replacements[rule] = replacements.get(rule, 0) + count
+        peaks = [record.worker_peak_memory for record in self.records if record.worker_peak_memory is not None]
+        return {
+            'files': len(self.records),
+            'errors': sum(1 for record in self.records if record.error is not None),
+            'unchanged': sum(1 for record in self.records if record.unchanged is not None),
+            'latency_p50': percentile(latencies, 0.5),
+            'latency_p95': percentile(latencies, 0.95),
+            'latency_max': max(latencies) if latencies else None,
+            'stages': stages,
+            'bytes_read': sum(record.bytes_read for record in self.records),
+            'bytes_written': sum(record.bytes_written for record in self.records),
+            'replacements': replacements,
+            'worker_peak_memory': max(peaks) if peaks else None,
+        }
+
+
+class TeeSink(MetricsSink):
+    """Передает метрики сразу в несколько приемников."""
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def emit(self, metrics):
+        for sink in self.sinks:
+            sink.emit(metrics)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Модуль учета прогресса пакетной обработки.
+Рабочие потоки отправляют события в потокобезопасную очередь, а интерфейс
+забирает накопленное состояние с фиксированной частотой, независимо от того,
+как быстро завершаются файлы.
+"""
+
+import queue
+import time
+from collections import deque, namedtuple
+
+# Состояние прогресса для отображения. files_per_second и eta (в секундах)
+# равны None, пока скорость еще не известна; listing - файлы еще ищутся, и total может вырасти
+ProgressState = namedtuple('ProgressState',
+                           ['done', 'total', 'status', 'info', 'files_per_second', 'eta', 'listing'])
+
+# За какой период (в секундах) считается скорость обработки
+RATE_WINDOW = 10.0
+
+
+class ProgressTracker:
+    """
+    Сборщик событий прогресса от рабочих потоков.
+
+    Методы set_status(), set_info(), file_found(), listing_done() и file_done()
+    можно вызывать из любого потока.
+    Метод poll() вызывается из потока интерфейса: он разбирает все накопившиеся
+    события разом и возвращает только последнее состояние.
+    """
+
+    def __init__(self, total=None, clock=time.monotonic):
+        """
+        Args:
+            total (int, optional): Общее число файлов в пакете. None - файлы еще ищутся,
+                                   и о каждом найденном сообщает file_found().
+            clock (callable, optional): Источник времени в секундах
+        """
+        self.listing = total is None
+        self.total = total or 0
+        self.done = 0
+        self.status = None
+        self.info = None
+        self._clock = clock
+        self._events = queue.SimpleQueue()
+        # Моменты завершения файлов за последние RATE_WINDOW секунд: (время, число готовых)
+        self._history = deque([(clock(), 0)])
+
+    def set_status(self, text):
+        """Задает текст строки состояния."""
+        self._events.put(('status', text))
+
+    def set_info(self, text):
+        """Задает текст с информацией о процессе."""
+        self._events.put(('info', text))
+
+    def file_found(self):
+        """Отмечает, что найден еще один файл для обработки."""
+        self._events.put(('found', None))
+
+    def listing_done(self):
+        """Отмечает, что поиск файлов закончен."""
+        self._events.put(('listed', None))
+
+    def file_done(self, info=None):
+        """Отмечает завершение очередного файла."""
+        self._events.put(('done', info))
+
+    def poll(self):
+        """
+        Разбирает накопившиеся события.
+
+        Returns:
+            ProgressState: Текущее состояние или None, если новых событий не было
+        """
+        changed = False
+        while True:
+            try:
+                kind, value = self._events.get_nowait()
+            except queue.Empty:
+                break
+            changed = True
+            if kind == 'status':
+                self.status = value
+            elif kind == 'info':
+                self.info = value
+            elif kind == 'found':
+                self.total += 1
+            elif kind == 'listed':
+                self.listing = False
+            else:
+                self.done += 1
+                if value is not None:
+                    self.info = value
+
+        if not changed:
+            return None
+
+        now = self._clock()
+        if self._history[-1][1] != self.done:
+            self._history.append((now, self.done))
+        while len(self._history) > 2 and now - self._history[0][0] > RATE_WINDOW:
+            self._history.popleft()
+        return ProgressState(self.done, self.total, self.status, self.info, *self._rate(now), self.listing)
+
+    def _rate(self, now):
+        """Возвращает скорость обработки в файлах в секунду и оценку оставшегося времени."""
+        start_time, start_done = self._history[0]
+        elapsed = now - start_time
+        if elapsed <= 0 or self.done == start_done:
+            return None, None
+        files_per_second = (self.done - start_done) / elapsed
+        # Пока файлы ищутся, оставшееся время неизвестно
+        eta = None if self.listing else (self.total - self.done) / files_per_second
+        return files_per_second, eta
+
+
+def format_duration(seconds):
+    """Форматирует длительность в виде м:сс или ч:мм:сс."""
+    seconds = int(round(seconds))
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Модуль отчетов анализа.
+Сводит результаты анализа документов (analyze_batch) в отчет CSV или JSON:
+сколько замен будет сделано в каждом файле по правилам и по предлогам
+и какие файлы уже обработаны.
+"""
+
+import csv
+import json
+import os
+from collections import Counter
+
+from logic import RULE_NAMES, STATUS_CLEAN, STATUS_PENDING, STATUS_PROCESSED
+
+# Поддерживаемые форматы отчета
+REPORT_FORMATS = ('csv', 'json')
+
+# Префикс столбцов CSV с числом замен после отдельных предлогов
+PREPOSITION_COLUMN_PREFIX = 'prep:'
+
+# Состояние файла, который не удалось проанализировать
+STATUS_ERROR = 'error'
+
+
+def report_format(path):
+    """Определяет формат отчета по расширению файла (по умолчанию CSV)."""
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+    return extension if extension in REPORT_FORMATS else 'csv'
+
+
+def file_entry(result):
+    """
+    Преобразует результат анализа файла в запись отчета.
+
+    Args:
+        result (AnalysisResult): Результат анализа файла
+
+    Returns:
+        dict: Запись отчета
+    """
+    entry = {'file': str(result.input_file)}
+    if result.error is not None:
+        entry.update(status=STATUS_ERROR, error=str(result.error))
+        return entry
+    analysis = result.analysis
+    entry.update(
+        status=analysis.status,
+        replacements=analysis.replacements,
+        counts=analysis.counts,
+        already_processed=dict(analysis.processed),
+        prepositions=dict(analysis.prepositions.most_common()),
+        parts=analysis.part_counts,
+    )
+    return entry
+
+
+def summarize(entries):
+    """
+    Подводит итог по записям отчета.
+
+    Returns:
+        dict: Число файлов по состояниям, общее число замен по правилам и по предлогам
+    """
+    statuses = Counter(entry['status'] for entry in entries)
+    counts = dict.fromkeys(RULE_NAMES, 0)
+    processed = dict.fromkeys(RULE_NAMES, 0)
+    prepositions = Counter()
+    for entry in entries:
+        if entry['status'] == STATUS_ERROR:
+            continue
+        for rule in RULE_NAMES:
+            counts[rule] += entry['counts'].get(rule, 0)
+            processed[rule] += entry['already_processed'].get(rule, 0)
+        prepositions.update(entry['prepositions'])
+    return {
+        'files': len(entries),
+        'statuses': {status: statuses.get(status, 0)
+                     for status in (STATUS_PENDING, STATUS_PROCESSED, STATUS_CLEAN, STATUS_ERROR)},
+        'replacements': sum(counts.values()),
+        'counts': counts,
+        'already_processed': processed,
+        'prepositions': dict(prepositions.most_common()),
+    }
+
+
+def write_report(entries, path, fmt=None):
+    """
+    Записывает отчет анализа.
+
+    Args:
+        entries (list): Записи отчета (file_entry)
+        path (str): Путь к файлу отчета
+        fmt (str, optional): 'csv' или 'json'. По умолчанию - по расширению файла.
+
+    Returns:
+        dict: Итог отчета (summarize)
+    """
+    fmt = fmt or report_format(path)
+    if fmt not in REPORT_FORMATS:
+        raise ValueError(f"Неизвестный формат отчета: {fmt}")
+    summary = summarize(entries)
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if fmt == 'json':
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'summary': summary, 'files': entries}, f, ensure_ascii=False, indent=2)
+        return summary
+
+    # В CSV отдельный столбец для каждого встретившегося предлога, от частых к редким
+    preposition_columns = list(summary['prepositions'])
+    fieldnames = ['file', 'status', 'replacements'] + list(RULE_NAMES) \
+        + [f'already_processed:{rule}' for rule in RULE_NAMES] \
+        + [PREPOSITION_COLUMN_PREFIX + word for word in preposition_columns] + ['error']
+
+    # utf-8-sig, чтобы Excel верно открыл русские имена файлов и предлоги
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for entry in entries:
+            row = {'file': entry['file'], 'status': entry['status'], 'error': entry.get('error', '')}
+            if entry['status'] != STATUS_ERROR:
+                row['replacements'] = entry['replacements']
+                for rule in RULE_NAMES:
+                    row[rule] = entry['counts'].get(rule, 0)
+                    row[f'already_processed:{rule}'] = entry['already_processed'].get(rule, 0)
+                for word in preposition_columns:
+                    row[PREPOSITION_COLUMN_PREFIX + word] = entry['prepositions'].get(word, 0)
+            writer.writerow(row)
+    return summary
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Модуль типографских правил.
+
+Каждое правило регистрируется в реестре RULES и описывает регулярное выражение
+и замены для его групп. Typographer (logic.py) объединяет все включенные правила
+в одно выражение, поэтому текст просматривается за один проход, сколько бы правил
+ни было включено. Какие правила включены и с какими параметрами, задается
+в JSON файле (RULES_FILE) рядом со списком предлогов.
+"""
+
+import json
+import re
+
+# Неразрывный пробел
+NON_BREAKING_SPACE = chr(160)  # Символ NO-BREAK SPACE (Unicode 00A0)
+
+# Длинное тире
+EM_DASH = '—'
+
+# Файл с настройками правил, лежит рядом с prepositions.json
+RULES_FILE = "rules.json"
+
+# Единицы измерения, перед которыми ставится неразрывный пробел. Однобуквенные
+# предлоги ("с", "в", "к") сюда не входят: иначе "5 с друзьями" было бы принято
+# за число с единицей, и пробел после предлога остался бы обычным. Не входят
+# и многозначные сокращения: "т" (т.е., т.к.), "м" (м. - метро), "в." (век)
+DEFAULT_UNITS = (
+    'мм', 'см', 'дм', 'км', 'мг', 'г', 'кг', 'мл', 'л',
+    'мин', 'ч', 'сут.', 'г.', 'гг.',
+    '%', '‰', '°', '°C', 'руб.', 'коп.', '₽', '$', '€',
+    'тыс.', 'млн', 'млрд', 'шт.', 'экз.', 'чел.', 'стр.',
+    'Вт', 'кВт', 'МВт', 'Гц', 'Кб', 'Мб', 'Гб', 'КБ', 'МБ', 'ГБ',
+)
+
+# Маркер конца слова в префиксном дереве
+_TRIE_END = ''
+
+# Реестр правил в порядке их регистрации: {имя: RuleDefinition}
+RULES = {}
+
+
+class Rule:
+    """
+    Скомпилированное правило.
+
+    Выражение правила размечает заменяемые фрагменты обычными (неименованными)
+    группами; для каждой группы задана замена. Группа, которая не участвовала
+    в совпадении, пуста или уже совпадает с заменой, не меняется. Обратные
+    ссылки и именованные группы в выражении правила не допускаются: правила
+    объединяются в одно выражение, и номера групп в нем сдвигаются.
+    """
+
+    def __init__(self, pattern, replacements, max_length):
+        """
+        Args:
+            pattern (str): Регулярное выражение правила
+            replacements (tuple): Замена для каждой группы выражения по порядку
+            max_length (int): Наибольшая длина совпадения вместе с символами, которые
+                              выражение проверяет после него (опережающая проверка)
+
+        Raises:
+            ValueError: Если число групп выражения не совпадает с числом замен
+        """
+        compiled = re.compile(pattern)
+        if compiled.groupindex:
+            raise ValueError(f"Именованные группы в правиле не допускаются: {pattern}")
+        if compiled.groups != len(replacements):
+            raise ValueError(f"Правило {pattern}: групп {compiled.groups}, замен {len(replacements)}")
+        self.pattern = pattern
+        self.replacements = tuple(replacements)
+        self.max_length = max_length
+
+
+class RuleDefinition:
+    """Правило в реестре: имя, описание, включено ли по умолчанию, параметры и построитель."""
+
+    def __init__(self, name, title, enabled, options, build):
+        self.name = name
+        self.title = title
+        self.enabled = enabled
+        self.options = options
+        self.build = build
+
+
+def register_rule(name, title, enabled=True, **options):
+    """
+    Регистрирует построитель правила.
+
+    Построитель вызывается как build(prepositions, months, options) и возвращает
+    Rule или None, если правилу нечего искать (например, пустой список слов).
+
+    Args:
+        name (str): Имя правила (ключ в счетчиках замен и в файле настроек)
+        title (str): Описание правила для логов и отчетов
+        enabled (bool, optional): Включено ли правило по умолчанию
+        **options: Параметры правила и их значения по умолчанию
+    """
+    def decorator(build):
+        if name in RULES:
+            raise ValueError(f"Правило {name} уже зарегистрировано")
+        RULES[name] = RuleDefinition(name, title, enabled, options, build)
+        return build
+    return decorator
+
+
+def build_word_pattern(words):
+    """
+    Строит регулярное выражение для списка слов в виде префиксного дерева.
+
+    Общие начала слов выносятся за скобки ("из", "из-за", "из-под" -> "из(?:-(?:за|под))?"),
+    поэтому стоимость сопоставления почти не растет с размером списка. Более длинное
+    продолжение всегда пробуется первым, а ветви упорядочены по алфавиту, так что
+    результат не зависит от порядка слов во входном наборе.
+
+    Args:
+        words (iterable): Непустой набор слов
+
+    Returns:
+        str: Регулярное выражение (без захватывающих групп)
+    """
+    trie = {}
+    for word in words:
+        if not word:
+            continue
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[_TRIE_END] = True
+    return _trie_node_pattern(trie)
+
+
+def _trie_node_pattern(node):
+    """Рекурсивно строит регулярное выражение для узла префиксного дерева."""
+    leaves = []
+    branches = []
+    for char in sorted(key for key in node if key != _TRIE_END):
+        child = node[char]
+        if len(child) == 1 and _TRIE_END in child:
+            # Слово заканчивается на этом символе: такие окончания объединяем в класс символов
+            leaves.append(re.escape(char))
+        else:
+            branches.append(re.escape(char) + _trie_node_pattern(child))
+
+    if leaves:
+        branches.append(leaves[0] if len(leaves) == 1 else '[' + ''.join(leaves) + ']')
+
+    if not branches:
+        return ''
+    if len(branches) > 1:
+        body = '(?:' + '|'.join(branches) + ')'
+    elif leaves:
+        # Одиночный символ или класс символов не нужно заключать в группу
+        body = branches[0]
+    else:
+        body = branches[0]
+        if _TRIE_END in node:
+            body = '(?:' + body + ')'
+
+    if _TRIE_END in node:
+        # Жадный квантификатор: сначала пробуем более длинное слово
+        return body + '?'
+    return body
+
+
+@register_rule('preposition', "пробел после предлога")
+def preposition_rule(prepositions, months, options):
+    """Пробел после предлога: "в доме"."""
+    if not prepositions:
+        return None
+    return Rule(r'\b' + build_word_pattern(prepositions) + r'(\s)', (NON_BREAKING_SPACE,),
+                max(map(len, prepositions)) + 1)
+
+
+@register_rule('date', "пробелы в дате")
+def date_rule(prepositions, months, options):
+    """Пробелы в датах формата "26 января 1994": число + пробел + месяц + пробел + год."""
+    if not months:
+        return None
+    return Rule(r'\b\d{1,2}(\s)' + build_word_pattern(months) + r'(\s)\d{4}\b',
+                (NON_BREAKING_SPACE, NON_BREAKING_SPACE), 2 + 1 + max(map(len, months)) + 1 + 4)
+
+
+@register_rule('initials', "инициалы перед фамилией", enabled=False)
+def initials_rule(prepositions, months, options):
+    """
+    Пробелы после инициалов перед фамилией: "А. С. Пушкин", "А.С. Пушкин".
+
+    Нужны имя и отчество: одна заглавная буква с точкой ("витамин C. Затем",
+    "пункт А. Далее") чаще оказывается концом предложения, чем инициалом.
+    """
+    return Rule(r'\b[А-ЯЁA-Z]\.(\s?)[А-ЯЁA-Z]\.(\s)(?=[А-ЯЁA-Z][а-яёa-z])',
+                (NON_BREAKING_SPACE, NON_BREAKING_SPACE), 2 + 1 + 2 + 1 + 2)
+
+
+@register_rule('number_sign', "пробел после № и §")
+def number_sign_rule(prepositions, months, options):
+    """Пробел между знаком номера или параграфа и числом: "№ 5", "§ 12", "№№ 3"."""
+    return Rule(r'[№§]{1,2}(\s)(?=\d)', (NON_BREAKING_SPACE,), 2 + 1 + 1)
+
+
+@register_rule('unit', "пробел между числом и единицей измерения", enabled=False, units=DEFAULT_UNITS)
+def unit_rule(prepositions, months, options):
+    """Пробел между числом и единицей измерения: "5 кг", "1994 г.", "20 %"."""
+    units = [unit for unit in options['units'] if unit]
+    if not units:
+        return None
+    # Число проверяется назад только на одну цифру, поэтому длина совпадения
+    # не зависит от длины числа. После единицы не должно идти продолжение
+    # сокращения ("т.е.", "г.о."): точка и сразу буква
+    return Rule(r'(?<=\d)(\s)' + build_word_pattern(units) + r'(?!\w|\.[^\W\d_])', (NON_BREAKING_SPACE,),
+                1 + max(map(len, units)) + 2)
+
+
+@register_rule('dash', "тире после слова", enabled=False)
+def dash_rule(prepositions, months, options):
+    """
+    Дефис или короткое тире между словами заменяется длинным тире,
+    а пробел перед ним - неразрывным: "Москва - столица" -> "Москва — столица".
+    """
+    return Rule(r'(?<=[^\W\d_])(\s)([-–—])(?=\s)', (NON_BREAKING_SPACE, EM_DASH), 1 + 1 + 1)
+
+
+def normalize_rules(rules=None):
+    """
+    Дополняет настройки правил значениями по умолчанию и проверяет их.
+
+    Args:
+        rules (dict, optional): Настройки {имя правила: {"enabled": bool, параметр: значение}}.
+                                Правила и параметры, которых нет в настройках, берутся
+                                из реестра. None - все правила по умолчанию.
+
+    Returns:
+        dict: Полные настройки всех зарегистрированных правил в порядке реестра.
+              Списки в параметрах отсортированы, поэтому одинаковые наборы правил
+              дают одинаковые настройки.
+
+    Raises:
+        ValueError: Если правило или параметр неизвестны или значение неверного типа
+    """
+    rules = rules or {}
+    if not isinstance(rules, dict):
+        raise ValueError("Настройки правил должны быть объектом JSON {имя правила: параметры}")
+    unknown = set(rules) - set(RULES)
+    if unknown:
+        raise ValueError(f"Неизвестные правила: {', '.join(sorted(unknown))}")
+
+    normalized = {}
+    for name, definition in RULES.items():
+        settings = rules.get(name) or {}
+        if not isinstance(settings, dict):
+            raise ValueError(f"Параметры правила {name} должны быть объектом JSON")
+        unknown = set(settings) - set(definition.options) - {'enabled'}
+        if unknown:
+            raise ValueError(f"Неизвестные параметры правила {name}: {', '.join(sorted(unknown))}")
+        enabled = settings.get('enabled', definition.enabled)
+        if not isinstance(enabled, bool):
+            raise ValueError(f"Параметр enabled правила {name} должен быть true или false")
+        options = {'enabled': enabled}
+        for option, default in definition.options.items():
+            value = settings.get(option, default)
+            if isinstance(default, (list, tuple)):
+                if not isinstance(value, (list, tuple)) or not all(isinstance(item, str) for item in value):
+                    raise ValueError(f"Параметр {option} правила {name} должен быть списком строк")
+                value = sorted(set(value))
+            options[option] = value
+        normalized[name] = options
+    return normalized
+
+
+def load_prepositions_file(path):
+    """
+    Загружает список предлогов из JSON файла.
+
+    Args:
+        path (str): Путь к JSON файлу со списком строк
+
+    Returns:
+        set: Множество предлогов
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        words = json.load(f)
+    if not isinstance(words, list) or not all(isinstance(word, str) for word in words):
+        raise ValueError(f"Файл {path} должен содержать JSON список строк")
+    return set(words)
+
+
+def load_rules_file(path):
+    """
+    Загружает настройки правил из JSON файла.
+
+    Файл содержит объект {имя правила: {"enabled": true/false, параметр: значение}};
+    правила, которых в нем нет, используют настройки по умолчанию.
+
+    Args:
+        path (str): Путь к JSON файлу
+
+    Returns:
+        dict: Настройки правил (normalize_rules)
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        rules = json.load(f)
+    return normalize_rules(rules)
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Локальный HTTP сервис обработки DOCX документов.
+Принимает документ в теле POST запроса и возвращает обработанный документ.
+Обработка идет в заранее запущенном пуле процессов с уже скомпилированными правилами.
+
+Примеры:
+    python server.py --port 8765 --jobs 4
+    curl --data-binary @report.docx http://127.0.0.1:8765/process -o report_fixed.docx
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import sys
+import threading
+import time
+from collections import Counter, deque
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from batch import TASKS_PER_WORKER, create_pool, default_jobs, process_document
+from logconfig import add_logging_arguments, setup_logging, verbosity_level
+from logic import MONTHS, PREPOSITIONS
+from metrics import percentile
+from rules import load_prepositions_file, load_rules_file
+
+# Адрес по умолчанию: сервис доступен только с этой машины
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Наибольший размер загружаемого документа по умолчанию, в мегабайтах
+DEFAULT_MAX_UPLOAD_MB = 100
+
+# Тип содержимого DOCX документа
+DOCX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+
+# Размер блока при отправке результата
+RESPONSE_CHUNK_SIZE = 256 * 1024
+
+# Тело отклоненного запроса до такого размера вычитывается, чтобы сохранить соединение;
+# при большем размере соединение закрывается
+DISCARD_BODY_LIMIT = 1024 * 1024
+
+# По скольким последним запросам считаются перцентили времени обработки
+LATENCY_WINDOW = 1000
+
+# Коды завершения
+EXIT_OK = 0
+EXIT_USAGE = 2
+
+
+class ServiceStats:
+    """Потокобезопасные счетчики сервиса для /metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self.responses = Counter()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.replacements = Counter()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, status, latency=None, bytes_in=0, bytes_out=0, part_counts=None):
+        """Учитывает завершенный запрос."""
+        with self._lock:
+            self.responses[int(status)] += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            if latency is not None:
+                self._latencies.append(latency)
+            for counts in (part_counts or {}).values():
+                self.replacements.update(counts)
+
+    def render(self, in_flight, capacity):
+        """
+        Формирует метрики в текстовом формате Prometheus.
+
+        Args:
+            in_flight (int): Число запросов в обработке и в очереди пула
+            capacity (int): Наибольшее число таких запросов
+
+        Returns:
+            str: Текст метрик
+        """
+        with self._lock:
+            latencies = list(self._latencies)
+            lines = [
+                '# TYPE docx_requests_total counter',
+                *(f'docx_requests_total{{status="{status}"}} {count}'
+                  for status, count in sorted(self.responses.items())),
+                '# TYPE docx_bytes_received_total counter',
+                f'docx_bytes_received_total {self.bytes_in}',
+                '# TYPE docx_bytes_sent_total counter',
+                f'docx_bytes_sent_total {self.bytes_out}',
+                '# TYPE docx_replacements_total counter',
+                *(f'docx_replacements_total{{rule="{rule}"}} {count}'
+                  for rule, count in sorted(self.replacements.items())),
+            ]
+        lines += [
+            '# TYPE docx_in_flight gauge',
+            f'docx_in_flight {in_flight}',
+            '# TYPE docx_capacity gauge',
+            f'docx_capacity {capacity}',
+            '# TYPE docx_uptime_seconds gauge',
+            f'docx_uptime_seconds {time.time() - self.started:.3f}',
+            '# TYPE docx_latency_seconds summary',
+        ]
+        for quantile in (0.5, 0.95, 0.99):
+            value = percentile(latencies, quantile)
+            if value is not None:
+                lines.append(f'docx_latency_seconds{{quantile="{quantile}"}} {value:.6f}')
+        lines.append(f'docx_latency_seconds_count {len(latencies)}')
+        return '\n'.join(lines) + '\n'
+
+
+class ProcessingServer(ThreadingHTTPServer):
+    """
+    HTTP сервер с пулом рабочих процессов.
+
+    Число одновременно принятых документов ограничено: когда все места заняты,
+    новые запросы сразу получают ответ 429, а не копятся в памяти.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, pool, max_pending, max_upload_size):
+        """
+        Args:
+            address (tuple): (хост, порт)
+            pool (ProcessPoolExecutor): Пул, созданный create_pool()
+            max_pending (int): Наибольшее число документов в обработке и в очереди пула
+            max_upload_size (int): Наибольший размер документа в байтах
+        """
+        super().__init__(address, RequestHandler)
+        self.pool = pool
+        self.max_pending = max_pending
+        self.max_upload_size = max_upload_size
+        self.stats = ServiceStats()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+
+    def try_acquire(self):
+        """Занимает место для документа; False, если свободных мест нет."""
+        if not self._slots.acquire(blocking=False):
+            return False
+        with self._pending_lock:
+            self._pending += 1
+        return True
+
+    def release(self):
+        """Освобождает место, занятое try_acquire()."""
+        with self._pending_lock:
+            self._pending -= 1
+        self._slots.release()
+
+    @property
+    def pending(self):
+        return self._pending
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов: POST /process, GET /metrics, GET /health."""
+
+    server_version = 'DocxTypographer/1.0'
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело ответа уходят отдельными записями; без этого ответ задерживается алгоритмом Нейгла
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            body = self.server.stats.render(self.server.pending, self.server.max_pending).encode('utf-8')
+            self._send_body(HTTPStatus.OK, body, 'text/plain; version=0.0.4; charset=utf-8')
+        elif self.path == '/health':
+            self._send_body(HTTPStatus.OK, b'ok\n', 'text/plain; charset=utf-8')
+        else:
+            self._send_error(HTTPStatus.NOT_FOUND, "Неизвестный адрес")
+
+    def do_POST(self):
+        if self.path != '/process':
+            self._send_error(HTTPStatus.NOT_FOUND, "Неизвестный адрес", close=True)
+            return
+
+        length = self.headers.get('Content-Length')
+        if length is None or not length.isdigit():
+            self._send_error(HTTPStatus.LENGTH_REQUIRED, "Нужен заголовок Content-Length", close=True)
+            return
+        length = int(length)
+        if length > self.server.max_upload_size:
+            self._send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                             f"Документ больше {self.server.max_upload_size} байт", close=True)
+            return
+
+        # Место занимаем до обработки тела: при перегрузке отказ почти ничего не стоит
+        if not self.server.try_acquire():
+            close = length > DISCARD_BODY_LIMIT
+            if not close:
+                self.rfile.read(length)
+            self._send_error(HTTPStatus.TOO_MANY_REQUESTS, "Сервис перегружен, повторите запрос позже",
+                             close=close, headers={'Retry-After': '1'})
+            return
+
+        start_time = time.perf_counter()
+        try:
+            data = self.rfile.read(length)
+            if len(data) != length:
+                self._send_error(HTTPStatus.BAD_REQUEST, "Тело запроса обрезано", close=True)
+                return
+            try:
+                result, part_counts = self.server.pool.submit(process_document, data).result()
+            except ValueError as e:
+                self._send_error(HTTPStatus.BAD_REQUEST, str(e))
+                return
+            except Exception as e:
+                logging.error(f"Ошибка обработки документа: {e}", exc_info=e)
+                self._send_error(HTTPStatus.INTERNAL_SERVER_ERROR, "Ошибка обработки документа")
+                return
+        finally:
+            self.server.release()
+
+        replacements = sum(sum(counts.values()) for counts in part_counts.values())
+        self._send_body(HTTPStatus.OK, result, DOCX_CONTENT_TYPE,
+                        headers={'X-Replacements': str(replacements)},
+                        latency=time.perf_counter() - start_time, bytes_in=length, part_counts=part_counts)
+
+    def _send_body(self, status, body, content_type, headers=None, latency=None, bytes_in=0, part_counts=None):
+        """Отправляет ответ с телом, блоками по RESPONSE_CHUNK_SIZE."""
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        view = memoryview(body)
+        for offset in range(0, len(body), RESPONSE_CHUNK_SIZE):
+            self.wfile.write(view[offset:offset + RESPONSE_CHUNK_SIZE])
+        self.server.stats.record(status, latency, bytes_in, len(body), part_counts)
+
+    def _send_error(self, status, message, close=False, headers=None):
+        """Отправляет ошибку в виде JSON; close - закрыть соединение (тело запроса не прочитано)."""
+        if close:
+            self.close_connection = True
+            headers = dict(headers or {}, Connection='close')
+        body = json.dumps({'error': message}, ensure_ascii=False).encode('utf-8')
+        self._send_body(status, body, 'application/json; charset=utf-8', headers)
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} - {format % args}")
+
+
+def start_pool(jobs, prepositions=None, months=None, rules=None):
+    """
+    Создает пул процессов и дожидается запуска всех рабочих процессов.
+
+    Returns:
+        ProcessPoolExecutor: Пул с уже скомпилированными правилами
+    """
+    pool = create_pool(jobs, prepositions, months, rules)
+    # Пул запускает процессы по мере надобности; пустые задачи запускают их сразу,
+    # и первые запросы не ждут запуска процесса и компиляции правил
+    for future in [pool.submit(time.sleep, 0.01) for _ in range(jobs)]:
+        future.result()
+    return pool
+
+
+def parse_args(argv=None):
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(
+        description="Локальный HTTP сервис: заменяет пробелы после предлогов и в датах на неразрывные."
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"адрес (по умолчанию: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"порт (по умолчанию: {DEFAULT_PORT})")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=default_jobs(),
+        help="число рабочих процессов (по умолчанию: число ядер)"
+    )
+    parser.add_argument(
+        "--max-pending", type=int,
+        help=f"сколько документов принимать одновременно, остальным - ответ 429 "
+             f"(по умолчанию: {TASKS_PER_WORKER} на процесс)"
+    )
+    parser.add_argument(
+        "--max-upload-mb", type=int, default=DEFAULT_MAX_UPLOAD_MB,
+        help=f"наибольший размер документа в мегабайтах (по умолчанию: {DEFAULT_MAX_UPLOAD_MB})"
+    )
+    parser.add_argument(
+        "--prepositions-file",
+        help="JSON файл со списком предлогов (по умолчанию используется встроенный список)"
+    )
+    parser.add_argument(
+        "--rules-file",
+        help="JSON файл с настройками правил (какие правила включены и их параметры)"
+    )
+    parser.add_argument("-q", "--quiet", action="store_true", help="выводить только ошибки")
+    add_logging_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("число процессов должно быть не меньше 1")
+    if args.max_pending is None:
+        args.max_pending = args.jobs * TASKS_PER_WORKER
+    if args.max_pending < 1 or args.max_upload_mb < 1:
+        parser.error("--max-pending и --max-upload-mb должны быть не меньше 1")
+    return args
+
+
+def main(argv=None):
+    """
+    Точка входа HTTP сервиса.
+
+    Returns:
+        int: Код завершения
+    """
+    args = parse_args(argv)
+
+    setup_logging(logging.ERROR if args.quiet else verbosity_level(args.verbose), args.log_file, sys.stderr,
+                  args.log_format)
+
+    prepositions = PREPOSITIONS
+    if args.prepositions_file:
+        try:
+            prepositions = load_prepositions_file(args.prepositions_file)
+        except (OSError, ValueError) as e:
+            print(f"Не удалось загрузить список предлогов: {e}", file=sys.stderr)
+            return EXIT_USAGE
+
+    rules = None
+    if args.rules_file:
+        try:
+            rules = load_rules_file(args.rules_file)
+        except (OSError, ValueError) as e:
+            print(f"Не удалось загрузить настройки правил: {e}", file=sys.stderr)
+            return EXIT_USAGE
+
+    with start_pool(args.jobs, prepositions, MONTHS, rules) as pool:
+        server = ProcessingServer((args.host, args.port), pool, args.max_pending, args.max_upload_mb * 1024 * 1024)
+        if not args.quiet:
+            print(f"Сервис запущен: http://{args.host}:{server.server_port}/process "
+                  f"({args.jobs} процессов, до {args.max_pending} документов одновременно)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Тесты пакетной обработки: восстановление после аварийного завершения рабочего процесса.
+
+Запуск:
+    python -m pytest -q tests
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch import TASKS_PER_WORKER, _run_tasks
+
+
+def crash_on(value, crash_value):
+    """Задача рабочего процесса: завершает процесс без исключения на значении crash_value."""
+    if value == crash_value:
+        os._exit(1)
+    return value * 2
+
+
+class BrokenPoolTest(unittest.TestCase):
+
+    def run_tasks(self, values, crash_value):
+        queue = iter([((value,), None) for value in values])
+        return list(_run_tasks(crash_on, queue, 2, (None, None, None, None), None, crash_value))
+
+    def test_crashed_task_is_reported_and_rest_completes(self):
+        values = list(range(100))
+        outcomes = self.run_tasks(values, 3)
+
+        # Каждая задача возвращается ровно один раз
+        self.assertEqual(sorted(task[0] for task, _, _ in outcomes), values)
+        errors = {task[0]: error for task, error, _ in outcomes if error is not None}
+        self.assertIn(3, errors)
+        for error in errors.values():
+            self.assertIsInstance(error, BrokenProcessPool)
+        # С ошибкой возвращаются только задачи, поданные в сломанный пул; остальные
+        # выполнены новым пулом
+        self.assertLessEqual(len(errors), 2 * TASKS_PER_WORKER)
+        self.assertNotIn(values[-1], errors)
+        for task, error, result in outcomes:
+            if error is None:
+                self.assertEqual(result, task[0] * 2)
+
+    def test_without_crash(self):
+        outcomes = self.run_tasks(range(10), None)
+        self.assertEqual(sorted(result for _, _, result in outcomes), [value * 2 for value in range(10)])
+        self.assertTrue(all(error is None for _, error, _ in outcomes))
+
+
+if __name__ == '__main__':
+    unittest.main()
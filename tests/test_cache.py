@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Тесты кэша повторной обработки: проверка актуальности записей и вытеснение
+по числу записей и по объему.
+
+Запуск:
+    python -m pytest -q tests
+    python -m unittest discover tests
+"""
+
+import itertools
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache
+from cache import ProcessingCache
+
+FINGERPRINT = 'rules-a'
+
+
+class CacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.folder = self._tmp.name
+        self.cache = ProcessingCache(os.path.join(self.folder, cache.CACHE_FILENAME))
+        self.addCleanup(self.cache.close)
+
+    def write(self, name, data):
+        path = os.path.join(self.folder, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def shift_mtime(self, path, delta_ns=10 ** 9):
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + delta_ns))
+
+    def count(self):
+        return self.cache._connection.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def cached_sources(self):
+        rows = self.cache._connection.execute("SELECT source_path FROM entries ORDER BY source_path")
+        return [os.path.basename(row[0]) for row in rows]
+
+
+class FreshnessTest(CacheTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.source = self.write('source.docx', b'source data')
+        self.output = self.write('output.docx', b'output data')
+        self.cache.record(self.source, self.output, FINGERPRINT)
+
+    def test_unchanged_files_are_fresh(self):
+        self.assertTrue(self.cache.is_fresh(self.source, self.output, FINGERPRINT))
+
+    def test_unknown_source_is_not_fresh(self):
+        other = self.write('other.docx', b'source data')
+        self.assertFalse(self.cache.is_fresh(other, self.output, FINGERPRINT))
+
+    def test_same_content_with_new_mtime_is_fresh(self):
+        # Файл скопирован заново: время другое, содержимое то же - сверка по хэшу
+        self.shift_mtime(self.source)
+        with mock.patch('cache.file_hash', wraps=cache.file_hash) as file_hash:
+            self.assertTrue(self.cache.is_fresh(self.source, self.output, FINGERPRINT))
+            self.assertEqual(file_hash.call_count, 1)
+            # Новое время записано, повторная проверка обходится без хэша
+            self.assertTrue(self.cache.is_fresh(self.source, self.output, FINGERPRINT))
+            self.assertEqual(file_hash.call_count, 1)
+
+    def test_same_size_with_new_content_is_not_fresh(self):
+        self.write('source.docx', b'SOURCE DATA')
+        self.shift_mtime(self.source)
+        self.assertFalse(self.cache.is_fresh(self.source, self.output, FINGERPRINT))
+
+    def test_changed_size_is_not_fresh(self):
+        self.write('source.docx', b'longer source data')
+        self.assertFalse(self.cache.is_fresh(self.source, self.output, FINGERPRINT))
+
+    def test_changed_fingerprint_is_not_fresh(self):
+        self.assertFalse(self.cache.is_fresh(self.source, self.output, 'rules-b'))
+
+    def test_changed_version_is_not_fresh(self):
+        with mock.patch('cache.__version__', '0.0.0'):
+            self.assertFalse(self.cache.is_fresh(self.source, self.output, FINGERPRINT))
+
+    def test_other_output_path_is_not_fresh(self):
+        other = self.write('other_output.docx', b'output data')
+        self.assertFalse(self.cache.is_fresh(self.source, other, FINGERPRINT))
+
+    def test_modified_output_is_not_fresh(self):
+        self.write('output.docx', b'edited by user')
+        self.assertFalse(self.cache.is_fresh(self.source, self.output, FINGERPRINT))
+
+    def test_touched_output_is_not_fresh(self):
+        self.shift_mtime(self.output)
+        self.assertFalse(self.cache.is_fresh(self.source, self.output, FINGERPRINT))
+
+    def test_deleted_output_is_not_fresh(self):
+        os.remove(self.output)
+        self.assertFalse(self.cache.is_fresh(self.source, self.output, FINGERPRINT))
+
+    def test_entries_survive_reopen(self):
+        self.cache.close()
+        self.cache = ProcessingCache(self.cache.path)
+        self.assertTrue(self.cache.is_fresh(self.source, self.output, FINGERPRINT))
+
+
+class EvictionTest(CacheTestCase):
+
+    def record_sources(self, count):
+        """Записывает count исходников; last_used растет в порядке записи."""
+        output = self.write('output.docx', b'output data')
+        names = [f'source_{i:04d}.docx' for i in range(count)]
+        with mock.patch('cache.time.time', side_effect=itertools.count(1000)):
+            for name in names:
+                self.cache.record(self.write(name, name.encode()), output, FINGERPRINT)
+        return names
+
+    def test_max_entries_evicts_least_recently_used(self):
+        self.cache.max_entries = 5
+        names = self.record_sources(8)
+        self.cache.flush()
+        self.assertEqual(self.cached_sources(), names[3:])
+
+    def test_used_entry_is_kept(self):
+        self.cache.max_entries = 3
+        names = self.record_sources(4)
+        output = os.path.join(self.folder, 'output.docx')
+        with mock.patch('cache.time.time', return_value=5000):
+            self.assertTrue(self.cache.is_fresh(os.path.join(self.folder, names[0]), output, FINGERPRINT))
+        self.cache.flush()
+        self.assertEqual(self.cached_sources(), [names[0], names[2], names[3]])
+
+    def test_max_bytes_evicts_least_recently_used(self):
+        names = self.record_sources(400)
+        self.cache.flush()
+        used = self.cache.used_bytes()
+
+        self.cache.max_bytes = used // 2
+        self.cache.flush()
+
+        remaining = self.cached_sources()
+        self.assertTrue(0 < len(remaining) < len(names))
+        # Удалены самые старые записи, оставшиеся - самые свежие
+        self.assertEqual(remaining, names[len(names) - len(remaining):])
+        self.assertLessEqual(self.cache.used_bytes(), self.cache.max_bytes)
+
+    def test_under_max_bytes_nothing_is_evicted(self):
+        names = self.record_sources(20)
+        self.cache.flush()
+        self.assertEqual(self.cached_sources(), names)
+
+
+if __name__ == '__main__':
+    unittest.main()
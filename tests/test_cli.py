@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Тесты консольного интерфейса: коды завершения и вывод ошибок.
+
+Запуск:
+    python -m pytest -q tests
+    python -m unittest discover tests
+"""
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cli
+from benchmarks.docx_factory import build_docx
+from logconfig import stop_logging
+
+
+class ExitCodeTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.folder = tmp.name
+        self.output_dir = os.path.join(tmp.name, 'out')
+        self.valid = os.path.join(tmp.name, 'valid.docx')
+        build_docx(self.valid, document_size=4 * 1024)
+        self.corrupt = os.path.join(tmp.name, 'corrupt.docx')
+        with open(self.corrupt, 'wb') as f:
+            f.write(b'not a zip archive')
+
+    def run_cli(self, *args):
+        """Запускает cli.main в текущем процессе; возвращает (код, stdout, stderr)."""
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+            try:
+                code = cli.main([*args, '-o', self.output_dir, '-j', '1'])
+            finally:
+                # Выводит оставшиеся записи лога в перехваченный stderr
+                stop_logging()
+        return code, stdout.getvalue(), stderr.getvalue()
+
+    def test_success(self):
+        code, stdout, _ = self.run_cli(self.valid)
+        self.assertEqual(code, cli.EXIT_OK)
+        self.assertIn(self.valid, stdout)
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, 'valid.docx')))
+
+    def test_failed_file(self):
+        code, _, _ = self.run_cli(self.valid, self.corrupt)
+        self.assertEqual(code, cli.EXIT_FAILURES)
+        self.assertTrue(os.path.exists(os.path.join(self.output_dir, 'valid.docx')))
+
+    def test_failed_file_in_analysis(self):
+        code, _, _ = self.run_cli(self.corrupt, '--analyze')
+        self.assertEqual(code, cli.EXIT_FAILURES)
+
+    def test_no_inputs_found(self):
+        empty = os.path.join(self.folder, 'empty')
+        os.mkdir(empty)
+        code, _, stderr = self.run_cli(empty, os.path.join(self.folder, '*.doc'))
+        self.assertEqual(code, cli.EXIT_USAGE)
+        self.assertIn(empty, stderr)
+
+    def test_missing_file(self):
+        # Отдельный файл передается обработке как есть, его отсутствие - ошибка обработки
+        code, _, _ = self.run_cli(os.path.join(self.folder, 'missing.docx'))
+        self.assertEqual(code, cli.EXIT_FAILURES)
+
+    def test_bad_prepositions_file(self):
+        prepositions_file = os.path.join(self.folder, 'prepositions.json')
+        with open(prepositions_file, 'w', encoding='utf-8') as f:
+            f.write('{not json')
+        code, _, _ = self.run_cli(self.valid, '--prepositions-file', prepositions_file)
+        self.assertEqual(code, cli.EXIT_USAGE)
+
+    def test_failure_reported_once(self):
+        # Без --quiet ошибка выводится записью лога, с --quiet - строкой ОШИБКА
+        for args in ((), ('--quiet',), ('--analyze',), ('--analyze', '--quiet')):
+            with self.subTest(args=args):
+                _, _, stderr = self.run_cli(self.corrupt, *args)
+                lines = [line for line in stderr.splitlines() if self.corrupt in line]
+                self.assertEqual(len(lines), 1, stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
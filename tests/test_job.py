@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Тесты управляемых заданий: журнал завершенных файлов, остановка и продолжение.
+
+Запуск:
+    python -m pytest -q tests
+    python -m unittest discover tests
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.docx_factory import build_docx
+from job import JOURNAL_FILENAME, BatchJob
+
+FILE_COUNT = 3
+
+
+class BatchJobTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.output_dir = os.path.join(tmp.name, 'out')
+        self.tasks = []
+        for i in range(FILE_COUNT):
+            source = os.path.join(tmp.name, f'doc_{i}.docx')
+            build_docx(source, document_size=4 * 1024)
+            self.tasks.append((source, os.path.join(self.output_dir, f'doc_{i}.docx')))
+        self.journal_path = os.path.join(self.output_dir, JOURNAL_FILENAME)
+
+    def run_job(self, cancel_after=None, resume=True):
+        """Выполняет задание в текущем процессе; при cancel_after останавливает его после стольких файлов."""
+        job = BatchJob(self.tasks, self.output_dir, jobs=1, resume=resume)
+        results = []
+        for result in job.run():
+            results.append(result)
+            if cancel_after is not None and len(results) == cancel_after:
+                job.cancel()
+        return job, results
+
+    def journal_entries(self):
+        with open(self.journal_path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f][1:]
+
+    def test_success_removes_journal(self):
+        job, results = self.run_job()
+        self.assertEqual(len(results), FILE_COUNT)
+        self.assertTrue(all(result.error is None and not result.skipped for result in results))
+        self.assertFalse(os.path.exists(self.journal_path))
+        self.assertEqual(job.resumed, 0)
+
+    def test_cancel_keeps_journal(self):
+        job, results = self.run_job(cancel_after=1)
+        self.assertTrue(job.cancelled)
+        self.assertEqual(len(results), 1)
+        entries = self.journal_entries()
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['input'], os.path.abspath(results[0].input_file))
+        self.assertIn('source_hash', entries[0])
+
+    def test_resume_skips_done_files(self):
+        self.run_job(cancel_after=1)
+        job, results = self.run_job()
+        self.assertEqual(job.resumed, 1)
+        self.assertEqual([result.skipped for result in results], [True] + [False] * (FILE_COUNT - 1))
+        self.assertTrue(all(result.error is None for result in results))
+        self.assertFalse(os.path.exists(self.journal_path))
+
+    def test_resume_disabled_processes_all_files(self):
+        self.run_job(cancel_after=1)
+        job, results = self.run_job(resume=False)
+        self.assertEqual(job.resumed, 0)
+        self.assertFalse(any(result.skipped for result in results))
+
+    def test_changed_source_is_processed_again(self):
+        self.run_job(cancel_after=1)
+        build_docx(self.tasks[0][0], document_size=8 * 1024)
+        job, results = self.run_job()
+        self.assertEqual(job.resumed, 0)
+        self.assertFalse(any(result.skipped for result in results))
+
+    def test_deleted_output_is_processed_again(self):
+        self.run_job(cancel_after=1)
+        os.remove(self.tasks[0][1])
+        job, results = self.run_job()
+        self.assertEqual(job.resumed, 0)
+        self.assertTrue(os.path.exists(self.tasks[0][1]))
+
+    def test_truncated_last_line_is_ignored(self):
+        self.run_job(cancel_after=2)
+        # Аварийное завершение во время записи: последняя строка обрезана
+        with open(self.journal_path, 'rb+') as f:
+            f.truncate(os.path.getsize(self.journal_path) - 10)
+        job, results = self.run_job()
+        self.assertEqual(job.resumed, 1)
+        self.assertEqual([result.skipped for result in results], [True] + [False] * (FILE_COUNT - 1))
+
+    def test_corrupted_last_line_is_ignored(self):
+        self.run_job(cancel_after=1)
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write('{"input": "\x00garbage')
+        job, results = self.run_job()
+        self.assertEqual(job.resumed, 1)
+        self.assertEqual(len(results), FILE_COUNT)
+        self.assertFalse(os.path.exists(self.journal_path))
+
+    def test_journal_with_other_rules_is_ignored(self):
+        self.run_job(cancel_after=1)
+        with open(self.journal_path, encoding='utf-8') as f:
+            lines = f.readlines()
+        lines[0] = json.dumps({'fingerprint': 'other', 'version': '0.0.0'}) + '\n'
+        with open(self.journal_path, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+        job, results = self.run_job()
+        self.assertEqual(job.resumed, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
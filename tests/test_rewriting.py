@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Тесты перезаписи документов: потоковая обработка XML, копирование членов архива
+без перепаковки и предварительная проверка документа.
+
+Запуск:
+    python -m pytest -q tests
+    python -m unittest discover tests
+"""
+
+import io
+import os
+import random
+import sys
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logic
+from archive import DocxPackage, MappedFile, copy_member_raw
+from benchmarks.docx_factory import CONTENT_TYPES_XML, DOCUMENT_FOOTER, DOCUMENT_HEADER, ROOT_RELS_XML
+from logic import MONTHS, PREPOSITIONS, RULE_NAMES, Typographer, XmlTextRewriter, has_candidates, process_xml
+
+# Слова и знаки, из которых собираются случайные абзацы: предлоги, даты, инициалы,
+# номера, единицы измерения и тире, чтобы срабатывали все правила
+WORDS = ('в', 'во', 'из', 'из-за', 'и', 'не', 'дом', 'Москва', '26', 'января', '1994', 'г.',
+         'А.', 'С.', 'Пушкин', '№', '§', '5', 'кг', '%', '-', '—', 'word', ' ', '\xa0')
+
+# Разделители между словами: обычный и неразрывный пробел или их отсутствие
+SEPARATORS = (' ', '\xa0', '', ' ')
+
+# Все правила включены, в том числе выключенные по умолчанию
+ALL_RULES = {rule: {'enabled': True} for rule in RULE_NAMES}
+
+
+def random_document(rng, separators=SEPARATORS):
+    """Строит document.xml из случайных абзацев, разбитых на run-ы, с разрывами и разделителями."""
+    paragraphs = []
+    for _ in range(rng.randint(1, 6)):
+        runs = []
+        for _ in range(rng.randint(0, 20)):
+            kind = rng.random()
+            if kind < 0.1:
+                runs.append('<w:r><w:tab/></w:r>')
+            elif kind < 0.15:
+                runs.append('<w:r><w:t/></w:r>')
+            else:
+                text = ''.join(rng.choice(WORDS) + rng.choice(separators) for _ in range(rng.randint(0, 5)))
+                runs.append(f'<w:r><w:rPr><w:b/></w:rPr><w:t xml:space="preserve">{text}</w:t></w:r>')
+        paragraphs.append('<w:p><w:pPr/>' + ''.join(runs) + '</w:p>')
+    return DOCUMENT_HEADER + ''.join(paragraphs) + DOCUMENT_FOOTER
+
+
+def rewrite_in_chunks(xml, typographer, window, rng):
+    """Обрабатывает XML потоково, подавая его кусками случайной длины."""
+    rewriter = XmlTextRewriter(typographer, window)
+    output = []
+    position = 0
+    while position < len(xml):
+        size = rng.randint(1, 40)
+        output.append(rewriter.feed(xml[position:position + size]))
+        position += size
+    output.append(rewriter.finish())
+    return ''.join(output), rewriter.counts
+
+
+def docx_bytes(document_xml):
+    """Собирает минимальный DOCX архив в памяти."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr('[Content_Types].xml', CONTENT_TYPES_XML)
+        docx.writestr('_rels/.rels', ROOT_RELS_XML)
+        docx.writestr('word/document.xml', document_xml)
+    return buffer.getvalue()
+
+
+class _NonSeekable(io.RawIOBase):
+    """Поток только на запись без seek: ZipFile пишет в него части с дескриптором данных."""
+
+    def __init__(self, target):
+        self.target = target
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.target.write(data)
+
+
+class StreamingRewriterTest(unittest.TestCase):
+    """Потоковая обработка дает тот же результат, что и обработка части целиком."""
+
+    def check_equivalence(self, typographer, seed):
+        rng = random.Random(seed)
+        for _ in range(300):
+            xml = random_document(rng)
+            expected = process_xml(xml, typographer)
+            for window in (None, 1, 16, 50, 200, 4096):
+                with self.subTest(window=window):
+                    self.assertEqual(rewrite_in_chunks(xml, typographer, window, rng), expected)
+
+    def test_default_rules(self):
+        self.check_equivalence(Typographer(PREPOSITIONS, MONTHS), 1)
+
+    def test_all_rules(self):
+        self.check_equivalence(Typographer(PREPOSITIONS, MONTHS, ALL_RULES), 2)
+
+
+class CopyMemberRawTest(unittest.TestCase):
+    """Члены архива копируются байт в байт и читаются из выходного архива."""
+
+    @classmethod
+    def setUpClass(cls):
+        # Данные разной сжимаемости: текст сжимается deflate, случайные байты - нет
+        cls.contents = {
+            'stored.bin': (os.urandom(200 * 1024), zipfile.ZIP_STORED),
+            'deflated.xml': (b'<w:t>text</w:t>' * 20000, zipfile.ZIP_DEFLATED),
+            'deflated-random.bin': (os.urandom(100 * 1024), zipfile.ZIP_DEFLATED),
+        }
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as archive:
+            for name, (data, compress_type) in cls.contents.items():
+                archive.writestr(name, data, compress_type=compress_type)
+            # Член с расширенными полями ZIP64 в локальном заголовке
+            cls.contents['zip64.xml'] = (b'<w:p/>' * 10000, zipfile.ZIP_DEFLATED)
+            info = zipfile.ZipInfo('zip64.xml')
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, 'w', force_zip64=True) as member:
+                member.write(cls.contents['zip64.xml'][0])
+        cls.source = buffer.getvalue()
+
+        # Архив, записанный в поток без seek: размеры и CRC каждого члена - в дескрипторе данных
+        buffer = io.BytesIO()
+        cls.descriptor_contents = {
+            'descriptor-stored.bin': (os.urandom(50 * 1024), zipfile.ZIP_STORED),
+            'descriptor-deflated.xml': (b'<w:r/>' * 10000, zipfile.ZIP_DEFLATED),
+        }
+        with zipfile.ZipFile(_NonSeekable(buffer), 'w') as archive:
+            for name, (data, compress_type) in cls.descriptor_contents.items():
+                archive.writestr(name, data, compress_type=compress_type)
+        cls.descriptor_source = buffer.getvalue()
+
+    def copy_all(self, source, contents, mapped_path=None):
+        """Копирует все члены архива и проверяет результат."""
+        if mapped_path is not None:
+            with open(mapped_path, 'wb') as f:
+                f.write(source)
+            stream = MappedFile(mapped_path)
+        else:
+            stream = io.BytesIO(source)
+        output = io.BytesIO()
+        with zipfile.ZipFile(stream, 'r') as zin, zipfile.ZipFile(output, 'w') as zout:
+            infos = zin.infolist()
+            for info in infos:
+                copy_member_raw(zin, zout, info)
+        stream.close()
+
+        with zipfile.ZipFile(io.BytesIO(output.getvalue())) as result:
+            self.assertIsNone(result.testzip())
+            self.assertEqual(result.namelist(), [info.filename for info in infos])
+            for info in infos:
+                copied = result.getinfo(info.filename)
+                data, compress_type = contents[info.filename]
+                self.assertEqual(copied.compress_type, compress_type)
+                self.assertEqual(copied.compress_size, info.compress_size)
+                self.assertEqual(copied.CRC, info.CRC)
+                self.assertEqual(result.read(info.filename), data)
+
+    def test_stored_deflated_and_zip64(self):
+        with zipfile.ZipFile(io.BytesIO(self.source)) as archive:
+            self.assertEqual(archive.getinfo('zip64.xml').extract_version, zipfile.ZIP64_VERSION)
+        self.copy_all(self.source, self.contents)
+
+    def test_data_descriptor(self):
+        with zipfile.ZipFile(io.BytesIO(self.descriptor_source)) as archive:
+            for info in archive.infolist():
+                self.assertTrue(info.flag_bits & 0x08)
+        self.copy_all(self.descriptor_source, self.descriptor_contents)
+
+    def test_from_mapped_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'source.zip')
+            self.copy_all(self.source, self.contents, path)
+            self.copy_all(self.descriptor_source, self.descriptor_contents, path)
+
+
+class ExactOutputTest(unittest.TestCase):
+    """Обработка дает заранее известный XML, как целиком, так и потоково по одному символу."""
+
+    def check(self, paragraphs, expected, replacements):
+        typographer = Typographer(PREPOSITIONS, MONTHS)
+        xml = DOCUMENT_HEADER + paragraphs + DOCUMENT_FOOTER
+        expected = DOCUMENT_HEADER + expected + DOCUMENT_FOOTER
+        output, counts = process_xml(xml, typographer)
+        self.assertEqual(output, expected)
+        self.assertEqual(counts['preposition'], replacements)
+        for window in (None, 1):
+            rewriter = XmlTextRewriter(typographer, window)
+            streamed = ''.join(rewriter.feed(char) for char in xml) + rewriter.finish()
+            self.assertEqual(streamed, expected)
+
+    def test_preposition_and_space_in_different_runs(self):
+        self.check(
+            '<w:p><w:r><w:t>в</w:t></w:r><w:r><w:t xml:space="preserve"> доме</w:t></w:r></w:p>',
+            '<w:p><w:r><w:t>в</w:t></w:r><w:r><w:t xml:space="preserve">\xa0доме</w:t></w:r></w:p>',
+            1,
+        )
+
+    def test_space_at_end_of_run_with_properties_in_next(self):
+        self.check(
+            '<w:p><w:r><w:t xml:space="preserve">из-за </w:t></w:r>'
+            '<w:r><w:rPr><w:b/></w:rPr><w:t>дождя</w:t></w:r></w:p>',
+            '<w:p><w:r><w:t xml:space="preserve">из-за\xa0</w:t></w:r>'
+            '<w:r><w:rPr><w:b/></w:rPr><w:t>дождя</w:t></w:r></w:p>',
+            1,
+        )
+
+    def test_tab_and_break_split_text(self):
+        # Предлог и пробел разделены табуляцией или переносом строки: это не один фрагмент текста
+        for separator in ('<w:tab/>', '<w:br/>', '<w:cr/>'):
+            with self.subTest(separator=separator):
+                paragraph = f'<w:p><w:r><w:t>в</w:t>{separator}<w:t xml:space="preserve"> доме</w:t></w:r></w:p>'
+                self.check(paragraph, paragraph, 0)
+
+    def test_paragraph_boundary_splits_text(self):
+        paragraphs = ('<w:p><w:r><w:t>в</w:t></w:r></w:p>'
+                      '<w:p><w:r><w:t xml:space="preserve"> доме</w:t></w:r></w:p>')
+        self.check(paragraphs, paragraphs, 0)
+
+    def test_markup_outside_text_unchanged(self):
+        # Атрибуты, закладки и коды полей содержат те же слова, но не меняются
+        markup = ('<w:p w:rsidR="в доме"><w:pPr><w:pStyle w:val="в доме"/></w:pPr>'
+                  '<w:bookmarkStart w:id="0" w:name="в доме"/>'
+                  '<w:r><w:fldChar w:fldCharType="begin"/></w:r>'
+                  '<w:r><w:instrText xml:space="preserve"> HYPERLINK "в доме" \\o "к дому" </w:instrText></w:r>'
+                  '<w:r><w:fldChar w:fldCharType="separate"/></w:r>')
+        self.check(
+            markup + '<w:r><w:t xml:space="preserve">и в доме</w:t></w:r><w:bookmarkEnd w:id="0"/></w:p>',
+            markup + '<w:r><w:t xml:space="preserve">и\xa0в\xa0доме</w:t></w:r><w:bookmarkEnd w:id="0"/></w:p>',
+            2,
+        )
+
+
+class HasCandidatesTest(unittest.TestCase):
+    """Предварительная проверка не пропускает документы, которые обработка изменила бы."""
+
+    def check_no_misses(self, typographer, seed):
+        rng = random.Random(seed)
+        for _ in range(500):
+            # Часть документов - с уже неразрывными пробелами между словами
+            xml = random_document(rng, SEPARATORS if rng.random() < 0.7 else ('\xa0', ''))
+            _, counts = process_xml(xml, typographer)
+            if not any(counts.values()):
+                continue
+            data = docx_bytes(xml)
+            for chunk_size in (7, 31, 1024, 1024 * 1024):
+                with self.subTest(chunk_size=chunk_size), \
+                        mock.patch.object(logic, 'STREAM_CHUNK_SIZE', chunk_size), \
+                        DocxPackage(io.BytesIO(data), 'test.docx') as package:
+                    self.assertTrue(has_candidates(package, typographer), xml)
+
+    def test_default_rules(self):
+        self.check_no_misses(Typographer(PREPOSITIONS, MONTHS), 3)
+
+    def test_all_rules(self):
+        self.check_no_misses(Typographer(PREPOSITIONS, MONTHS, ALL_RULES), 4)
+
+    def test_clean_document(self):
+        xml = DOCUMENT_HEADER + '<w:p><w:r><w:t>Quarterly revenue: 1234.56</w:t></w:r></w:p>' + DOCUMENT_FOOTER
+        with DocxPackage(io.BytesIO(docx_bytes(xml)), 'test.docx') as package:
+            self.assertFalse(has_candidates(package, Typographer(PREPOSITIONS, MONTHS)))
+
+
+if __name__ == '__main__':
+    unittest.main()
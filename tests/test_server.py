@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Тесты HTTP сервиса: обработка документа, отказы при ошибочном запросе и перегрузке.
+
+Запуск:
+    python -m pytest -q tests
+    python -m unittest discover tests
+"""
+
+import http.client
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.docx_factory import build_docx
+from server import DOCX_CONTENT_TYPE, ProcessingServer, start_pool
+
+MAX_UPLOAD_SIZE = 1024 * 1024
+
+
+class ProcessingServerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = start_pool(1)
+        cls.server = ProcessingServer(('127.0.0.1', 0), cls.pool, 1, MAX_UPLOAD_SIZE)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'document.docx')
+            build_docx(path, document_size=8 * 1024)
+            with open(path, 'rb') as f:
+                cls.document = f.read()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.thread.join()
+        cls.pool.shutdown()
+
+    def request(self, method, path, body=None, headers=None):
+        """Выполняет запрос; возвращает (ответ, тело)."""
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.server_port, timeout=30)
+        self.addCleanup(connection.close)
+        connection.request(method, path, body, headers or {})
+        response = connection.getresponse()
+        return response, response.read()
+
+    def test_process_document(self):
+        response, body = self.request('POST', '/process', self.document)
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.getheader('Content-Type'), DOCX_CONTENT_TYPE)
+        self.assertGreater(int(response.getheader('X-Replacements')), 0)
+        with zipfile.ZipFile(io.BytesIO(body)) as archive:
+            document_xml = archive.read('word/document.xml').decode('utf-8')
+        self.assertIn('в\xa0Москве', document_xml)
+
+    def test_invalid_document(self):
+        response, body = self.request('POST', '/process', b'not a docx')
+        self.assertEqual(response.status, 400)
+        self.assertIn('error', json.loads(body))
+
+    def test_too_large_document(self):
+        # Отказ приходит по заголовку, до отправки тела: сервер не читает тело и закрывает соединение
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.server_port, timeout=30)
+        self.addCleanup(connection.close)
+        connection.putrequest('POST', '/process')
+        connection.putheader('Content-Length', str(MAX_UPLOAD_SIZE + 1))
+        connection.endheaders()
+        response = connection.getresponse()
+        self.assertEqual(response.status, 413)
+        self.assertEqual(response.getheader('Connection'), 'close')
+
+    def test_missing_content_length(self):
+        connection = http.client.HTTPConnection('127.0.0.1', self.server.server_port, timeout=30)
+        self.addCleanup(connection.close)
+        connection.putrequest('POST', '/process')
+        connection.endheaders()
+        self.assertEqual(connection.getresponse().status, 411)
+
+    def test_overloaded(self):
+        # Единственное место занято, как будто другой документ еще обрабатывается
+        self.assertTrue(self.server.try_acquire())
+        try:
+            response, body = self.request('POST', '/process', self.document)
+        finally:
+            self.server.release()
+        self.assertEqual(response.status, 429)
+        self.assertEqual(response.getheader('Retry-After'), '1')
+        self.assertIn('error', json.loads(body))
+
+        response, _ = self.request('POST', '/process', self.document)
+        self.assertEqual(response.status, 200)
+
+    def test_health(self):
+        response, body = self.request('GET', '/health')
+        self.assertEqual(response.status, 200)
+        self.assertEqual(body, b'ok\n')
+
+    def test_metrics(self):
+        self.request('GET', '/health')
+        response, body = self.request('GET', '/metrics')
+        self.assertEqual(response.status, 200)
+        self.assertIn('docx_requests_total{status="200"}', body.decode('utf-8'))
+        self.assertIn('docx_capacity 1', body.decode('utf-8'))
+
+    def test_unknown_path(self):
+        response, _ = self.request('GET', '/unknown')
+        self.assertEqual(response.status, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Тесты наблюдения за папкой: ожидание дозаписи файлов по подставному времени.
+
+Запуск:
+    python -m pytest -q tests
+    python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from watch import FolderWatcher
+
+SETTLE_TIME = 2.0
+
+
+class SettleTest(unittest.TestCase):
+    """FolderWatcher._scan(now) получает время аргументом, поэтому часы здесь - просто числа."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.folder = tmp.name
+        self.watcher = FolderWatcher(self.folder, settle_time=SETTLE_TIME, use_cache=False)
+        self.mtime_ns = 10 ** 18
+
+    def write(self, name, data=b'docx data'):
+        """Записывает файл; каждая запись получает новое время изменения."""
+        path = os.path.join(self.folder, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        self.mtime_ns += 10 ** 9
+        os.utime(path, ns=(self.mtime_ns, self.mtime_ns))
+        return path
+
+    def ready(self, now):
+        return [path for path, _ in self.watcher._scan(now)]
+
+    def test_file_ready_after_settle_time(self):
+        path = self.write('report.docx')
+        self.assertEqual(self.ready(100.0), [])
+        self.assertEqual(self.ready(100.0 + SETTLE_TIME / 2), [])
+        self.assertEqual(self.ready(100.0 + SETTLE_TIME), [path])
+        # Файл отдан один раз
+        self.assertEqual(self.ready(100.0 + 2 * SETTLE_TIME), [])
+
+    def test_changing_file_restarts_timer(self):
+        path = self.write('report.docx')
+        self.ready(100.0)
+        self.write('report.docx', b'more docx data')
+        self.assertEqual(self.ready(101.5), [])
+        self.assertEqual(self.ready(103.0), [])
+        self.assertEqual(self.ready(101.5 + SETTLE_TIME), [path])
+
+    def test_touched_file_restarts_timer(self):
+        # Размер тот же, изменилось только время изменения
+        path = self.write('report.docx')
+        self.ready(100.0)
+        self.write('report.docx')
+        self.assertEqual(self.ready(101.0), [])
+        self.assertEqual(self.ready(100.0 + SETTLE_TIME), [])
+        self.assertEqual(self.ready(101.0 + SETTLE_TIME), [path])
+
+    def test_processed_version_is_not_returned_again(self):
+        path = self.write('report.docx')
+        self.ready(100.0)
+        (_, signature), = self.watcher._scan(100.0 + SETTLE_TIME)
+        # Так run() и _worker() отмечают обработанную версию
+        self.watcher._done[path] = signature
+        self.assertEqual(self.ready(200.0), [])
+        self.assertEqual(self.ready(300.0), [])
+
+        self.write('report.docx', b'new version')
+        self.assertEqual(self.ready(300.0), [])
+        self.assertEqual(self.ready(300.0 + SETTLE_TIME), [path])
+
+    def test_queued_file_is_not_returned(self):
+        path = self.write('report.docx')
+        self.watcher._queued.add(path)
+        self.assertEqual(self.ready(100.0), [])
+        self.assertEqual(self.ready(100.0 + SETTLE_TIME), [])
+        self.assertEqual(self.watcher._settling, {})
+
+    def test_deleted_file_is_forgotten(self):
+        path = self.write('report.docx')
+        self.ready(100.0)
+        os.remove(path)
+        self.assertEqual(self.ready(100.0 + SETTLE_TIME), [])
+        self.assertEqual(self.watcher._settling, {})
+
+    def test_only_top_level_docx_files(self):
+        path = self.write('report.docx')
+        self.write('~$report.docx')
+        self.write('notes.txt')
+        os.mkdir(os.path.join(self.folder, 'nested'))
+        self.write(os.path.join('nested', 'inner.docx'))
+        os.mkdir(os.path.join(self.folder, 'folder.docx'))
+        self.ready(100.0)
+        self.assertEqual(self.ready(100.0 + SETTLE_TIME), [path])
+
+    def test_output_named_by_basename(self):
+        path = self.write('report.docx')
+        self.assertEqual(self.watcher._output_path(path),
+                         os.path.join(self.folder, 'output_files', 'report.docx'))
+
+
+if __name__ == '__main__':
+    unittest.main()
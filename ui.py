@@ -8,7 +8,6 @@
 
 import os
 import threading
-import zipfile
 import ttkbootstrap as ttk
 from tkinter import filedialog, messagebox, StringVar
 from ttkbootstrap.constants import *
@@ -16,12 +15,21 @@ import logging
 from pathlib import Path
 import json
 
-# Импортируем функцию из logic.py
-from logic import fix_hanging_prepositions_and_dates, MONTHS
+# Импортируем функции из logic.py. Пакетная обработка (пул процессов, кэш SQLite)
+# загружается в рабочем потоке при первом запуске обработки, чтобы не задерживать
+# появление окна
+from logic import MONTHS, ProcessingCancelled, format_counts
+from discovery import iter_tasks
+from metrics import MetricsAggregator
+from progress import ProgressTracker, format_duration
+from rules import RULES_FILE, load_rules_file
 
 # Файл для хранения списка предлогов
 PREPOSITIONS_FILE = "prepositions.json"
 
+# Период обновления прогресса в интерфейсе, мс (10 кадров в секунду)
+PROGRESS_POLL_INTERVAL = 100
+
 
 # Загрузка списка предлогов из JSON-файла
 def load_prepositions():
@@ -47,6 +55,20 @@ def load_prepositions():
         return set()
 
 
+# Загрузка настроек правил из JSON-файла рядом со списком предлогов
+def load_rules():
+    if not os.path.exists(RULES_FILE):
+        # Без файла используются настройки правил по умолчанию
+        return None
+    try:
+        rules = load_rules_file(RULES_FILE)
+        logging.info(f"Загружены настройки правил из файла {RULES_FILE}")
+        return rules
+    except (OSError, ValueError) as e:
+        logging.error(f"Ошибка при загрузке настроек правил, используются значения по умолчанию: {e}")
+        return None
+
+
 # Сохранение списка предлогов в JSON-файл
 def save_prepositions(prepositions_set):
     try:
@@ -73,17 +95,31 @@ class Application:
         self.progress_var = ttk.DoubleVar()
         self.status_var = StringVar(value="Готов к работе")
         self.files_processed = 0
-        self.total_files = 0
+        # События прогресса от рабочего потока; None, когда обработка не идет
+        self.progress = None
+        # Текущее пакетное задание (пауза, остановка); None, когда обработка не идет
+        self.job = None
+        # Поток обработки; окно закрывается только после его завершения
+        self.worker_thread = None
+        # Окно закрывается: итог обработки не показывается
+        self.closing = False
 
         # Загружаем список предлогов из JSON
         self.prepositions = load_prepositions()
         self.months = list(MONTHS)
+        # Настройки правил из rules.json; None - правила по умолчанию
+        self.rules = load_rules()
+        # Число процессов для пакетной обработки; None - по числу ядер
+        self.jobs = None
         logging.info(f"Загружено предлогов: {len(self.prepositions)}, месяцев: {len(self.months)}")
 
         # Создаем интерфейс
         self.create_ui()
         logging.info("Пользовательский интерфейс создан")
 
+        # При закрытии окна останавливаем задание, чтобы не оставлять недописанных файлов
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
     def create_ui(self):
         """Создает элементы пользовательского интерфейса."""
         # Создаем статусбар внизу приложения
@@ -107,6 +143,27 @@ class Application:
         )
         status_label.pack(side=LEFT, padx=5)
 
+        # Кнопки управления заданием, активны только во время обработки
+        self.stop_button = ttk.Button(
+            status_frame,
+            text="Остановить",
+            command=self.stop_processing,
+            bootstyle="danger-outline",
+            state=DISABLED,
+            width=12
+        )
+        self.stop_button.pack(side=RIGHT, padx=5)
+
+        self.pause_button = ttk.Button(
+            status_frame,
+            text="Пауза",
+            command=self.toggle_pause,
+            bootstyle="secondary-outline",
+            state=DISABLED,
+            width=12
+        )
+        self.pause_button.pack(side=RIGHT, padx=5)
+
         # Создаем основной контейнер с вкладками
         notebook = ttk.Notebook(self.root)
         notebook.pack(fill=BOTH, expand=YES, padx=10, pady=(10, 0))
@@ -162,7 +219,7 @@ class Application:
                 "на неразрывные пробелы, чтобы избежать 'висячих предлогов'\n"
                 "в конце строки. Также обрабатываются даты, заменяя пробелы в\n"
                 "сочетаниях числа и месяца на неразрывные. Обработанные файлы\n"
-                "сохраняются в папке 'output_files'."
+                "сохраняются в папке 'output_files' с той же структурой папок."
             ),
             font=("Arial", 10),
             justify="left"
@@ -320,159 +377,223 @@ class Application:
             folder_path = filedialog.askdirectory()
             if folder_path:
                 logging.info(f"Выбрана папка: {folder_path}")
-
-                # Обновляем информацию о процессе
-                self.process_info.config(text=f"Поиск .docx файлов в папке...\nПожалуйста, подождите")
-                self.root.update_idletasks()
-
-                # Получаем список .docx файлов
-                docx_files = self.get_docx_files(folder_path)
-
-                if not docx_files:
-                    messagebox.showwarning("Предупреждение", "В папке нет .docx файлов")
-                    self.process_info.config(text=f"Файлы .docx не найдены")
-                    logging.warning(f"В папке {folder_path} не найдено .docx файлов")
-                    return
-
-                # Показываем количество найденных файлов
-                self.process_info.config(text=f"Найдено файлов .docx: {len(docx_files)}\nНачинаем обработку...")
-                self.root.update_idletasks()
-
-                self.process_files(docx_files)
+                self.process_folder(folder_path)
         except Exception as e:
             logging.error(f"Ошибка при выборе папки: {e}", exc_info=True)
             messagebox.showerror("Ошибка", f"Не удалось выбрать папку: {e}")
             self.process_info.config(text=f"Ошибка: {str(e)}")
 
-    def get_docx_files(self, folder_path):
-        """Получает список .docx файлов из папки (без рекурсии)."""
-        docx_files = []
-
-        # Только файлы в выбранной папке (без подпапок)
-        docx_files = [os.path.join(folder_path, f) for f in os.listdir(folder_path)
-                      if os.path.isfile(os.path.join(folder_path, f)) and f.endswith(".docx")]
+    def set_job_controls(self, enabled):
+        """Включает или выключает кнопки управления заданием."""
+        state = NORMAL if enabled else DISABLED
+        self.pause_button.config(text="Пауза", state=state)
+        self.stop_button.config(state=state)
 
-        # Логируем общее количество найденных файлов
-        logging.info(f"Всего найдено файлов в папке {folder_path}: {len(docx_files)}")
-
-        return docx_files
-
-    def update_progress(self, file_progress):
-        """Обновляет прогресс обработки файлов."""
-        # Вычисляем общий прогресс: (завершенные файлы + прогресс текущего) / всего файлов
-        overall_progress = (self.files_processed + file_progress) / self.total_files
-        self.progress_var.set(overall_progress * 100)
-
-        # Обновляем статус
-        current_file = self.files_processed + 1
-        self.status_var.set(f"Обработка файла {current_file} из {self.total_files} ({int(file_progress * 100)}%)")
-
-        # Обновляем UI
-        self.root.update_idletasks()
+    def toggle_pause(self):
+        """Приостанавливает или продолжает текущее задание."""
+        if self.job is None or self.job.cancelled:
+            return
+        if self.job.paused:
+            self.job.resume()
+            self.pause_button.config(text="Пауза")
+            self.process_info.config(text="Обработка продолжена")
+            logging.info("Обработка продолжена")
+        else:
+            self.job.pause()
+            self.pause_button.config(text="Продолжить")
+            self.process_info.config(text="Пауза: начатые файлы остановятся на ближайшем этапе")
+            logging.info("Обработка приостановлена")
+
+    def stop_processing(self):
+        """Останавливает текущее задание; завершенные файлы сохраняются."""
+        if self.job is None or self.job.cancelled:
+            return
+        self.job.cancel()
+        self.set_job_controls(False)
+        self.process_info.config(text="Остановка обработки...")
+        logging.info("Обработка остановлена пользователем")
+
+    def on_close(self):
+        """
+        Закрывает окно, останавливая текущее задание.
+
+        Окно закрывается, когда поток обработки завершится: рабочие процессы
+        успевают удалить недописанные файлы, а поток - передать итог в интерфейс.
+        """
+        if self.job is not None:
+            self.job.cancel()
+        if self.worker_thread is None or not self.worker_thread.is_alive():
+            self.root.destroy()
+            return
+        if not self.closing:
+            self.closing = True
+            self.set_job_controls(False)
+            self.process_info.config(text="Остановка обработки перед закрытием...")
+            logging.info("Закрытие окна: ожидание остановки обработки")
+        self.root.after(PROGRESS_POLL_INTERVAL, self.on_close)
+
+    def process_worker(self, tasks, output_dir):
+        """
+        Рабочая функция для обработки файлов в отдельном потоке.
+
+        Args:
+            tasks (iterable): Пары (исходный файл, выходной файл). Может быть генератором,
+                              который еще ищет файлы.
+            output_dir (str): Папка для выходных файлов
+        """
+        from batch import default_jobs
+        from cache import open_cache
+        from job import BatchJob
 
-    def process_worker(self, files):
-        """Рабочая функция для обработки файлов в отдельном потоке."""
         errors = []
         successful_files = 0
+        job = None
+        cache = None
+        jobs = self.jobs or default_jobs()
 
-        # Получаем общую директорию для всех файлов
-        folder_path = os.path.dirname(files[0]) if len(files) == 1 else os.path.dirname(os.path.commonpath(files))
+        try:
+            # Создаем основную директорию для выходных файлов
+            os.makedirs(output_dir, exist_ok=True)
+            logging.info(f"Папка для выходных файлов: {output_dir}")
+
+            progress = self.progress
+            progress.set_status(f"Обработка файлов ({jobs} процессов)")
+
+            def counted(tasks):
+                """Сообщает о каждом найденном файле, пока идет поиск."""
+                for task in tasks:
+                    progress.file_found()
+                    yield task
+                progress.listing_done()
+
+            # Файлы распределяются по пулу процессов, результаты приходят по мере готовности
+            # Кэш в папке результатов позволяет не обрабатывать повторно неизменившиеся файлы
+            cache = open_cache(output_dir)
+            aggregator = MetricsAggregator()
+            if progress.listing:
+                tasks = counted(tasks)
+            # Журнал задания в папке результатов позволяет продолжить остановленную обработку
+            job = BatchJob(tasks, output_dir, self.prepositions, self.months, jobs, cache, aggregator,
+                           rules=self.rules)
+            self.job = job
+            if self.closing:
+                # Окно начали закрывать, пока задание создавалось
+                job.cancel()
+            self.root.after(0, self.set_job_controls, True)
+            for result in job.run():
+                file_path = result.input_file
+
+                if isinstance(result.error, ProcessingCancelled):
+                    # Файл прерван остановкой: не ошибка, при следующем запуске он будет обработан
+                    continue
+                elif result.skipped:
+                    successful_files += 1
+                    logging.debug(f"Файл не изменился, обработка пропущена: {file_path}")
+                    info = f"Файл не изменился, обработка пропущена:\n{os.path.basename(file_path)}"
+                elif result.error is None and result.metrics is not None and result.metrics.unchanged:
+                    successful_files += 1
+                    logging.debug(f"Заменять нечего, файл сохранен без изменений: {result.output_file}")
+                    info = f"Заменять нечего, файл сохранен без изменений:\n{os.path.basename(file_path)}"
+                elif result.error is None:
+                    successful_files += 1
+                    logging.debug(f"Файл успешно обработан: {result.output_file}")
+                    info = f"Файл успешно обработан:\n{os.path.basename(file_path)}"
+                else:
+                    if isinstance(result.error, FileNotFoundError):
+                        error_message = f"Файл не найден: {file_path}"
+                        logging.error(error_message)
+                    elif isinstance(result.error, PermissionError):
+                        error_message = f"Нет доступа к файлу или файл открыт: {file_path}"
+                        logging.error(error_message)
+                    elif isinstance(result.error, ValueError):
+                        error_message = f"Ошибка формата файла: {str(result.error)}"
+                        logging.error(error_message)
+                    else:
+                        error_message = f"Ошибка обработки файла {os.path.basename(file_path)}: {str(result.error)}"
+                        logging.error(error_message, exc_info=result.error)
+                    errors.append(error_message)
+                    info = f"Ошибка: {error_message}"
+
+                # Интерфейс заберет состояние при очередном опросе, сколько бы файлов ни завершилось
+                progress.file_done(info)
+
+            summary = aggregator.summary()
+            if summary['latency_p50'] is not None:
+                logging.info(f"Время обработки файла: p50 {summary['latency_p50']:.3f} с, "
+                             f"p95 {summary['latency_p95']:.3f} с; замены по правилам: "
+                             f"{format_counts(summary['replacements'])}")
+        except Exception as e:
+            # Ошибка самого задания (папка результатов, кэш, пул процессов): обработка
+            # прерывается, но интерфейс все равно получает итог и разблокируется
+            error_message = f"Ошибка обработки: {e}"
+            logging.error(error_message, exc_info=True)
+            errors.append(error_message)
+        finally:
+            if cache is not None:
+                cache.close()
+            cancelled = job is not None and job.cancelled
+            self.root.after(0, lambda: self.processing_complete(successful_files, errors, cancelled))
+
+    def poll_progress(self):
+        """Переносит накопленное состояние прогресса в интерфейс и планирует следующий опрос."""
+        if self.progress is None:
+            return
+        state = self.progress.poll()
+        if state is not None:
+            self.show_progress(state)
+        self.root.after(PROGRESS_POLL_INTERVAL, self.poll_progress)
+
+    def show_progress(self, state):
+        """Отображает состояние прогресса."""
+        self.files_processed = state.done
+        if state.info is not None:
+            self.process_info.config(text=state.info)
+        if state.done == 0:
+            if state.status is not None:
+                self.status_var.set(state.status)
+            return
 
-        # Создаем основную директорию для выходных файлов
-        output_dir = os.path.join(folder_path, "output_files")
-        os.makedirs(output_dir, exist_ok=True)
+        status = f"Обработано файлов {state.done} из {state.total}"
+        if state.listing:
+            status += " (поиск файлов продолжается)"
+        if state.files_per_second is not None:
+            status += f" · {state.files_per_second:.1f} файл/с"
+            if state.eta is not None and state.done < state.total:
+                status += f" · осталось {format_duration(state.eta)}"
+        self.status_var.set(status)
+        self.progress_var.set(state.done / state.total * 100)
+
+    def processing_complete(self, successful_files, errors, cancelled=False):
+        """Вызывается после завершения обработки всех файлов или остановки задания."""
+        if self.closing:
+            # Окно закрывается после остановки: итог не показываем
+            self.progress = None
+            self.job = None
+            return
+        # Показываем последнее состояние и останавливаем опрос прогресса
+        state = self.progress.poll()
+        if state is not None:
+            self.show_progress(state)
+        self.progress = None
+        self.job = None
+        self.set_job_controls(False)
 
-        logging.info(f"Папка с исходными файлами: {folder_path}")
-        logging.info(f"Папка для выходных файлов: {output_dir}")
-
-        for i, file_path in enumerate(files):
-            try:
-                logging.info(f"Начало обработки файла: {file_path}")
-
-                # Обновляем информацию о текущем файле
-                current_file_info = f"Обработка файла {i + 1} из {len(files)}:\n{os.path.basename(file_path)}"
-                self.root.after(0, lambda info=current_file_info: self.process_info.config(text=info))
-                self.root.after(0, lambda i=i: self.status_var.set(f"Обработка файла {i + 1} из {len(files)}"))
-
-                # Обновляем прогресс перед началом обработки файла
-                current_progress = i / len(files)
-                self.root.after(0, lambda p=current_progress: self.progress_var.set(p * 100))
-
-                # Определяем выходной путь
-                output_path = os.path.join(output_dir, os.path.basename(file_path))
-                logging.info(f"Выходной путь: {output_path}")
-
-                # Проверяем, можно ли открыть файл как DOCX
-                try:
-                    # Это дополнительная проверка на возможность открытия файла
-                    with zipfile.ZipFile(file_path, 'r') as zip_check:
-                        # Проверяем наличие необходимых файлов в DOCX
-                        if not 'word/document.xml' in zip_check.namelist():
-                            raise ValueError("Файл DOCX поврежден или имеет неверную структуру")
-                except (zipfile.BadZipFile, zipfile.LargeZipFile):
-                    raise ValueError(
-                        f"Файл {os.path.basename(file_path)} не является валидным DOCX файлом или поврежден")
-
-                # Вызываем функцию обработки с колбэком прогресса
-                def progress_callback(file_progress):
-                    # Пересчитываем общий прогресс: часть от текущего файла
-                    file_part = 1.0 / len(files)
-                    overall_progress = (i / len(files)) + (file_progress * file_part)
-                    self.root.after(0, lambda p=overall_progress:
-                    self.status_var.set(f"Обработка файла {i + 1} из {len(files)} ({int(file_progress * 100)}%)"))
-                    self.root.after(0, lambda p=overall_progress: self.progress_var.set(p * 100))
-
-                # Вызываем функцию обработки
-                fix_hanging_prepositions_and_dates(
-                    file_path,
-                    output_path,
-                    self.prepositions,
-                    self.months,
-                    progress_callback
-                )
-
-                self.files_processed += 1
-                successful_files += 1
-                logging.info(f"Файл успешно обработан: {output_path}")
-
-                # Обновляем информацию о успешной обработке
-                success_info = f"Файл успешно обработан:\n{os.path.basename(file_path)}"
-                self.root.after(0, lambda info=success_info: self.process_info.config(text=info))
-
-            except FileNotFoundError:
-                error_message = f"Файл не найден: {file_path}"
-                errors.append(error_message)
-                logging.error(error_message)
-                # Обновляем информацию об ошибке
-                self.root.after(0, lambda msg=error_message: self.process_info.config(text=f"Ошибка: {msg}"))
-
-            except PermissionError:
-                error_message = f"Нет доступа к файлу или файл открыт: {file_path}"
-                errors.append(error_message)
-                logging.error(error_message)
-                # Обновляем информацию об ошибке
-                self.root.after(0, lambda msg=error_message: self.process_info.config(text=f"Ошибка: {msg}"))
-
-            except ValueError as e:
-                error_message = f"Ошибка формата файла: {str(e)}"
-                errors.append(error_message)
-                logging.error(error_message)
-                # Обновляем информацию об ошибке
-                self.root.after(0, lambda msg=error_message: self.process_info.config(text=f"Ошибка: {msg}"))
-
-            except Exception as e:
-                error_message = f"Ошибка обработки файла {os.path.basename(file_path)}: {str(e)}"
-                errors.append(error_message)
-                logging.error(error_message, exc_info=True)
-                # Обновляем информацию об ошибке
-                self.root.after(0, lambda msg=error_message: self.process_info.config(text=f"Ошибка: {msg}"))
-
-        self.root.after(0, lambda: self.processing_complete(successful_files, errors))
-
-    def processing_complete(self, successful_files, errors):
-        """Вызывается после завершения обработки всех файлов."""
         # Показываем сообщение о результатах обработки
-        if len(errors) > 0:
+        if cancelled:
+            message = f"Обработка остановлена. Обработано файлов: {successful_files}"
+            if errors:
+                message += f", с ошибками: {len(errors)}"
+            messagebox.showinfo(
+                "Обработка остановлена",
+                message + "\n\nПовторная обработка той же папки продолжится с места остановки."
+            )
+            self.process_info.config(text=message)
+            logging.info(message)
+        elif successful_files == 0 and not errors:
+            messagebox.showwarning("Предупреждение", "В папке нет .docx файлов")
+            self.process_info.config(text="Файлы .docx не найдены")
+            logging.warning("Не найдено .docx файлов для обработки")
+        elif len(errors) > 0:
             # Если есть ошибки, но были успешные файлы
             if successful_files > 0:
                 message = f"Обработано успешно: {successful_files} файлов\n\nОшибки ({len(errors)}):\n"
@@ -504,27 +625,57 @@ class Application:
         self.status_var.set("Готов к работе")
         self.progress_var.set(0)
         self.files_processed = 0
-        self.total_files = 0
 
     def process_files(self, files):
         """Обрабатывает файлы и сохраняет результат в output_files/."""
         if not files:
             return
 
+        # Получаем общую директорию для всех файлов
+        folder_path = os.path.dirname(files[0]) if len(files) == 1 else os.path.dirname(os.path.commonpath(files))
+        logging.info(f"Папка с исходными файлами: {folder_path}")
+        output_dir = os.path.join(folder_path, "output_files")
+
+        tasks = [(file_path, os.path.join(output_dir, os.path.basename(file_path))) for file_path in files]
+        logging.info(f"Подготовка к обработке {len(files)} файлов")
+        self.start_processing(tasks, output_dir, len(files))
+
+    def process_folder(self, folder_path):
+        """
+        Обрабатывает .docx файлы в папке и во всех вложенных папках.
+
+        Файлы ищутся по мере того, как пул процессов забирает задачи, поэтому
+        обработка начинается до окончания поиска. Результаты сохраняются в
+        output_files внутри папки с той же структурой вложенных папок.
+        """
+        output_dir = os.path.join(folder_path, "output_files")
+        logging.info(f"Поиск .docx файлов в папке {folder_path}")
+        self.start_processing(iter_tasks(folder_path, output_dir), output_dir)
+
+    def start_processing(self, tasks, output_dir, total=None):
+        """
+        Запускает обработку в отдельном потоке.
+
+        Args:
+            tasks (iterable): Пары (исходный файл, выходной файл)
+            output_dir (str): Папка для выходных файлов
+            total (int, optional): Число файлов, если оно известно заранее
+        """
         # Инициализируем переменные прогресса
         self.progress_var.set(0)
         self.files_processed = 0
-        self.total_files = len(files)
+        self.progress = ProgressTracker(total)
 
         # Обновляем статус и информацию о процессе
-        self.status_var.set(f"Подготовка к обработке {len(files)} файлов...")
-        self.process_info.config(text=f"Подготовка к обработке {len(files)} файлов...")
-        logging.info(f"Подготовка к обработке {len(files)} файлов")
+        message = f"Подготовка к обработке {total} файлов..." if total else "Поиск .docx файлов..."
+        self.status_var.set(message)
+        self.process_info.config(text=message)
 
         # Запускаем обработку в отдельном потоке
-        worker_thread = threading.Thread(
+        self.worker_thread = threading.Thread(
             target=self.process_worker,
-            args=(files,),
+            args=(tasks, output_dir),
             daemon=True
         )
-        worker_thread.start()
\ No newline at end of file
+        self.worker_thread.start()
+        self.root.after(PROGRESS_POLL_INTERVAL, self.poll_progress)
\ No newline at end of file
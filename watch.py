@@ -0,0 +1,507 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Режим наблюдения за папкой.
+Находит новые и измененные DOCX файлы, дожидается, пока их перестанут записывать,
+и обрабатывает в пуле процессов. Результаты сохраняются в output_files.
+Просматриваются только файлы в самой папке, вложенные папки не просматриваются.
+
+Примеры:
+    python watch.py //server/incoming
+    python watch.py incoming/ -o processed/ --jobs 4 --stats-file watch_stats.json
+"""
+
+import argparse
+import asyncio
+import ctypes
+import ctypes.util
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from batch import collect_result, create_pool, default_jobs, process_file
+from cache import open_cache
+from discovery import DOCX_SUFFIXES, is_temporary_file
+from logconfig import add_logging_arguments, setup_logging, verbosity_level
+from logic import MONTHS, PREPOSITIONS, get_typographer
+from metrics import JsonLinesSink
+from rules import load_prepositions_file, load_rules_file
+
+# Как часто просматривать папку, в секундах
+WATCH_POLL_INTERVAL = 2.0
+
+# Сколько секунд размер и время изменения файла должны не меняться, чтобы считать его дописанным
+WATCH_SETTLE_TIME = 2.0
+
+# Как часто выводить статистику, в секундах
+STATS_INTERVAL = 60.0
+
+# За какой период считается пропускная способность, в секундах
+THROUGHPUT_WINDOW = 60.0
+
+# Коды завершения
+EXIT_OK = 0
+EXIT_USAGE = 2
+
+# События inotify, после которых стоит просмотреть папку (см. <sys/inotify.h>)
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_WATCH_EVENTS = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+
+
+class _Inotify:
+    """
+    Уведомления inotify об изменениях в папке (только Linux).
+
+    Служат лишь для того, чтобы просмотреть папку сразу, а не по таймеру:
+    в сетевых папках уведомления о чужих изменениях не приходят, поэтому
+    периодический просмотр остается в любом случае.
+    """
+
+    def __init__(self, folder):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), _IN_WATCH_EVENTS) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch: {folder}")
+
+    def drain(self):
+        """Вычитывает накопившиеся события; их содержимое не нужно."""
+        try:
+            while os.read(self.fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """
+    Наблюдение за папкой с DOCX файлами.
+
+    Папка просматривается по таймеру и, если доступен inotify, сразу после изменений.
+    Просматриваются только файлы в самой папке: вложенные папки (в том числе
+    папка результатов по умолчанию) не просматриваются, и результат сохраняется
+    в output_dir под именем исходного файла. Файл ставится в очередь, когда его
+    размер и время изменения не меняются settle_time секунд. Каждая версия файла
+    обрабатывается один раз; с кэшем в папке результатов это сохраняется и между
+    перезапусками. Обработка идет в пуле процессов, а обращения к кэшу (проверка
+    актуальности может считать хэш всего файла) - в отдельном потоке, поэтому
+    цикл событий не блокируется.
+    """
+
+    def __init__(self, folder, output_dir=None, prepositions=None, months=None, jobs=None,
+                 poll_interval=WATCH_POLL_INTERVAL, settle_time=WATCH_SETTLE_TIME, use_inotify=True,
+                 use_cache=True, metrics_sink=None, memory_budget=None, rules=None):
+        """
+        Args:
+            folder (str): Папка, за которой ведется наблюдение
+            output_dir (str, optional): Папка для результатов. По умолчанию - output_files внутри folder.
+            prepositions (iterable, optional): Список предлогов. По умолчанию используется PREPOSITIONS.
+            months (iterable, optional): Список месяцев. По умолчанию используется MONTHS.
+            jobs (int, optional): Число рабочих процессов. По умолчанию - число ядер.
+            poll_interval (float, optional): Период просмотра папки в секундах
+            settle_time (float, optional): Сколько секунд файл не должен меняться перед обработкой
+            use_inotify (bool, optional): Использовать inotify, если он доступен
+            use_cache (bool, optional): Пропускать файлы с актуальной записью в кэше
+            metrics_sink (MetricsSink, optional): Приемник метрик по каждому обработанному файлу
+            memory_budget (int, optional): Примерный предел памяти на обработку одного файла в байтах
+            rules (dict, optional): Настройки правил (rules.normalize_rules). По умолчанию - из реестра правил.
+        """
+        self.folder = folder
+        self.output_dir = output_dir or os.path.join(folder, 'output_files')
+        self.prepositions = set(prepositions) if prepositions is not None else None
+        self.months = set(months) if months is not None else None
+        self.jobs = jobs or default_jobs()
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.use_inotify = use_inotify
+        self.use_cache = use_cache
+        self.metrics_sink = metrics_sink
+        self.memory_budget = memory_budget
+        self.rules = rules
+        self.fingerprint = get_typographer(self.prepositions, self.months, self.rules).fingerprint
+
+        self.processed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.in_flight = 0
+        # Файлы, которые еще записываются: путь -> (подпись, когда подпись стала такой)
+        self._settling = {}
+        # Подписи уже обработанных версий файлов: путь -> (размер, время изменения)
+        self._done = {}
+        # Файлы в очереди или в обработке
+        self._queued = set()
+        # Моменты завершения файлов за последние THROUGHPUT_WINDOW секунд
+        self._completions = deque()
+        self._queue = None
+        self._cache = None
+        # Поток, в котором открыт кэш: соединение SQLite можно использовать только в нем
+        self._cache_executor = None
+        self._stop = None
+        self._wake = None
+
+    def stats(self):
+        """
+        Возвращает текущую статистику наблюдения.
+
+        Returns:
+            dict: Глубина очереди, число файлов в работе, ожидающих дозаписи,
+                  обработанных, пропущенных и с ошибками, и пропускная способность
+        """
+        self._trim_completions(time.monotonic())
+        return {
+            'queue_depth': self._queue.qsize() if self._queue is not None else 0,
+            'in_flight': self.in_flight,
+            'settling': len(self._settling),
+            'processed': self.processed,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'files_per_minute': len(self._completions) * 60.0 / THROUGHPUT_WINDOW,
+        }
+
+    def stop(self):
+        """Останавливает наблюдение; можно вызывать из обработчика сигнала в цикле событий."""
+        if self._stop is not None:
+            self._stop.set()
+            self._wake.set()
+
+    async def run(self, stats_callback=None):
+        """
+        Наблюдает за папкой до вызова stop().
+
+        Args:
+            stats_callback (callable, optional): Вызывается со словарем stats() каждые STATS_INTERVAL секунд
+        """
+        loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self._wake = asyncio.Event()
+        self._queue = asyncio.Queue()
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._cache_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='watch-cache')
+        self._cache = await self._in_cache_thread(open_cache, self.output_dir) if self.use_cache else None
+        inotify = self._open_inotify(loop)
+        logging.info(f"Наблюдение за папкой {self.folder}, результаты в {self.output_dir}")
+
+        next_stats = time.monotonic() + STATS_INTERVAL
+        try:
+            with create_pool(self.jobs, self.prepositions, self.months, self.rules, self.memory_budget) as pool:
+                workers = [asyncio.create_task(self._worker(pool)) for _ in range(self.jobs)]
+                try:
+                    while not self._stop.is_set():
+                        now = time.monotonic()
+                        for path, signature in self._scan(now):
+                            if self._cache is not None and await self._in_cache_thread(
+                                    self._cache.is_fresh, path, self._output_path(path), self.fingerprint):
+                                self._done[path] = signature
+                                self.skipped += 1
+                                continue
+                            self._queued.add(path)
+                            self._queue.put_nowait(path)
+
+                        if now >= next_stats:
+                            next_stats = now + STATS_INTERVAL
+                            self._report_stats(stats_callback)
+
+                        # Пока файлы дописываются, просматриваем папку чаще
+                        timeout = self.poll_interval
+                        if self._settling:
+                            timeout = min(timeout, self.settle_time / 2)
+                        try:
+                            await asyncio.wait_for(self._wake.wait(), timeout)
+                        except asyncio.TimeoutError:
+                            pass
+                        self._wake.clear()
+                finally:
+                    for worker in workers:
+                        worker.cancel()
+                    await asyncio.gather(*workers, return_exceptions=True)
+        finally:
+            if inotify is not None:
+                loop.remove_reader(inotify.fd)
+                inotify.close()
+            if self._cache is not None:
+                await self._in_cache_thread(self._cache.close)
+            self._cache_executor.shutdown()
+            self._report_stats(stats_callback)
+
+    async def _in_cache_thread(self, func, *args):
+        """Выполняет функцию в потоке кэша, не блокируя цикл событий."""
+        return await asyncio.get_running_loop().run_in_executor(self._cache_executor, func, *args)
+
+    def _open_inotify(self, loop):
+        """Подписывается на изменения в папке, если это возможно."""
+        if not self.use_inotify or not sys.platform.startswith('linux'):
+            return None
+        try:
+            inotify = _Inotify(self.folder)
+        except (OSError, AttributeError) as e:
+            logging.info(f"inotify недоступен, папка просматривается по таймеру: {e}")
+            return None
+
+        def on_event():
+            inotify.drain()
+            self._wake.set()
+
+        loop.add_reader(inotify.fd, on_event)
+        return inotify
+
+    def _scan(self, now):
+        """
+        Просматривает папку и возвращает файлы, готовые к обработке.
+
+        Args:
+            now (float): Текущее время по time.monotonic()
+
+        Актуальность результата в кэше здесь не проверяется: это делает run()
+        в потоке кэша.
+
+        Returns:
+            list: Пары (путь, подпись) файлов, которые перестали меняться и еще
+                  не обработаны в этой версии
+        """
+        ready = []
+        present = set()
+        try:
+            entries = list(os.scandir(self.folder))
+        except OSError as e:
+            logging.error(f"Не удалось просмотреть папку {self.folder}: {e}")
+            return ready
+
+        for entry in entries:
+            name = entry.name
+            # Пропускаем файлы блокировки Word (~$имя.docx), временные и скрытые файлы
+            if is_temporary_file(name) or not name.lower().endswith(DOCX_SUFFIXES):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except OSError:
+                continue
+
+            path = entry.path
+            present.add(path)
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if path in self._queued or self._done.get(path) == signature:
+                self._settling.pop(path, None)
+                continue
+
+            previous = self._settling.get(path)
+            if previous is None or previous[0] != signature:
+                # Новый файл или файл все еще записывается
+                self._settling[path] = (signature, now)
+                continue
+            if now - previous[1] < self.settle_time:
+                continue
+
+            del self._settling[path]
+            ready.append((path, signature))
+
+        # Забываем удаленные файлы
+        for path in list(self._settling):
+            if path not in present:
+                del self._settling[path]
+        for path in list(self._done):
+            if path not in present:
+                del self._done[path]
+        return ready
+
+    async def _worker(self, pool):
+        """Берет файлы из очереди и обрабатывает их в пуле процессов."""
+        loop = asyncio.get_running_loop()
+        with_hashes = self._cache is not None
+        while True:
+            path = await self._queue.get()
+            output_file = self._output_path(path)
+            try:
+                # Подпись берем до обработки: если файл изменится во время нее, он будет обработан снова
+                stat = os.stat(path)
+                signature = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                signature = None
+
+            self.in_flight += 1
+            try:
+                outcome = await loop.run_in_executor(pool, process_file, path, output_file, with_hashes)
+                error = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                outcome, error = None, e
+            finally:
+                self.in_flight -= 1
+                self._queued.discard(path)
+                self._queue.task_done()
+
+            self._done[path] = signature
+            result = await self._in_cache_thread(collect_result, path, output_file, error, outcome,
+                                                 self.fingerprint, self._cache, self.metrics_sink)
+            self._completions.append(time.monotonic())
+            if result.error is None:
+                self.processed += 1
+                logging.info(f"Файл обработан: {path} -> {output_file}")
+            else:
+                self.failed += 1
+                logging.error(f"Ошибка обработки файла {path}: {result.error}")
+            if self._cache is not None:
+                await self._in_cache_thread(self._cache.flush)
+
+    def _output_path(self, path):
+        """Возвращает путь к результату обработки файла."""
+        return os.path.join(self.output_dir, os.path.basename(path))
+
+    def _trim_completions(self, now):
+        while self._completions and now - self._completions[0] > THROUGHPUT_WINDOW:
+            self._completions.popleft()
+
+    def _report_stats(self, stats_callback):
+        stats = self.stats()
+        logging.info(f"Очередь: {stats['queue_depth']}, в работе: {stats['in_flight']}, "
+                     f"дописываются: {stats['settling']}, обработано: {stats['processed']}, "
+                     f"пропущено: {stats['skipped']}, ошибок: {stats['failed']}, "
+                     f"файлов в минуту: {stats['files_per_minute']:.1f}")
+        if stats_callback is not None:
+            stats_callback(stats)
+
+
+def parse_args(argv=None):
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(
+        description="Наблюдает за папкой и обрабатывает новые и измененные DOCX документы."
+    )
+    parser.add_argument("folder", help="папка, за которой ведется наблюдение")
+    parser.add_argument(
+        "-o", "--output-dir",
+        help="папка для обработанных файлов (по умолчанию: output_files внутри наблюдаемой папки)"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=default_jobs(),
+        help="число рабочих процессов (по умолчанию: число ядер)"
+    )
+    parser.add_argument(
+        "--prepositions-file",
+        help="JSON файл со списком предлогов (по умолчанию используется встроенный список)"
+    )
+    parser.add_argument(
+        "--rules-file",
+        help="JSON файл с настройками правил (какие правила включены и их параметры)"
+    )
+    parser.add_argument(
+        "--poll-interval", type=float, default=WATCH_POLL_INTERVAL,
+        help=f"период просмотра папки в секундах (по умолчанию: {WATCH_POLL_INTERVAL:g})"
+    )
+    parser.add_argument(
+        "--settle-time", type=float, default=WATCH_SETTLE_TIME,
+        help=f"сколько секунд файл не должен меняться перед обработкой (по умолчанию: {WATCH_SETTLE_TIME:g})"
+    )
+    parser.add_argument(
+        "--no-inotify", action="store_true",
+        help="не использовать inotify, только периодический просмотр папки"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="не использовать кэш в папке результатов"
+    )
+    parser.add_argument(
+        "--metrics",
+        help="файл JSON Lines для метрик по каждому файлу"
+    )
+    parser.add_argument(
+        "--stats-file",
+        help="JSON файл, в который периодически записывается статистика наблюдения"
+    )
+    parser.add_argument(
+        "-q", "--quiet", action="store_true",
+        help="выводить только ошибки"
+    )
+    add_logging_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.jobs < 1:
+        parser.error("число процессов должно быть не меньше 1")
+    if args.poll_interval <= 0 or args.settle_time < 0:
+        parser.error("период просмотра должен быть больше 0, время ожидания - не меньше 0")
+    if not os.path.isdir(args.folder):
+        parser.error(f"папка не найдена: {args.folder}")
+    return args
+
+
+def write_stats_file(path, stats):
+    """Атомарно записывает статистику в JSON файл."""
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(stats, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+def main(argv=None):
+    """
+    Точка входа режима наблюдения.
+
+    Returns:
+        int: Код завершения
+    """
+    args = parse_args(argv)
+
+    setup_logging(logging.ERROR if args.quiet else verbosity_level(args.verbose, logging.INFO), args.log_file,
+                  sys.stderr, args.log_format)
+
+    prepositions = PREPOSITIONS
+    if args.prepositions_file:
+        try:
+            prepositions = load_prepositions_file(args.prepositions_file)
+        except (OSError, ValueError) as e:
+            print(f"Не удалось загрузить список предлогов: {e}", file=sys.stderr)
+            return EXIT_USAGE
+
+    rules = None
+    if args.rules_file:
+        try:
+            rules = load_rules_file(args.rules_file)
+        except (OSError, ValueError) as e:
+            print(f"Не удалось загрузить настройки правил: {e}", file=sys.stderr)
+            return EXIT_USAGE
+
+    metrics_sink = JsonLinesSink(args.metrics) if args.metrics else None
+    watcher = FolderWatcher(args.folder, args.output_dir, prepositions, MONTHS, args.jobs,
+                            args.poll_interval, args.settle_time, not args.no_inotify,
+                            not args.no_cache, metrics_sink, rules=rules)
+    stats_callback = (lambda stats: write_stats_file(args.stats_file, stats)) if args.stats_file else None
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, watcher.stop)
+            except (NotImplementedError, RuntimeError):
+                # Windows: остановка по Ctrl+C через KeyboardInterrupt
+                pass
+        await watcher.run(stats_callback)
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if metrics_sink is not None:
+            metrics_sink.close()
+    return EXIT_OK
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())